@@ -27,7 +27,6 @@ from cadnano import app
 from model.document import Document
 from model.encoder import encode
 from model.decoder import decode
-from model.enum import StrandType
 from model.enum import LatticeType
 from views.documentwindow import DocumentWindow
 from views.pathview.pathhelixgroup import PathHelixGroup
@@ -133,6 +132,7 @@ class DocumentController():
         self._document = doc
         doc.setController(self)
         doc.partAdded.connect(self.docPartAddedEvent)
+        doc.undoMemoryUseChanged.connect(self.undoMemoryUseChangedSlot)
         for p in doc.parts():
             self.docPartAddedEvent(p)
 
@@ -168,6 +168,12 @@ class DocumentController():
         # The title changes to include [*] on modification
         self.win.setWindowTitle(self.documentTitle())
 
+    def undoMemoryUseChangedSlot(self, memoryUse):
+        """Shows how much memory the undo history holds in the status
+        bar"""
+        self.win.statusbar.showMessage("Undo history: %.1f MB" %\
+                                       (memoryUse / (1024. * 1024.)))
+
     def newClicked(self):
         """Create a new document window"""
         # Will create a new Document object and will be
@@ -439,18 +445,8 @@ class DocumentController():
         self.win.pathController.setActivePath(self.pathHelixGroup)
         self.win.actionFrame.triggered.connect(self.pathHelixGroup.zoomToFit)
 
-        for vh in part.getVirtualHelices():
-            xos = vh.get3PrimeXovers(StrandType.Scaffold)
-            for xo in xos:
-                toBase = (xo[1][0], xo[1][2])
-                self.pathHelixGroup.createXoverItem(
-                                            xo[0], toBase, StrandType.Scaffold)
-            xos = vh.get3PrimeXovers(StrandType.Staple)
-            for xo in xos:
-                toBase = (xo[1][0], xo[1][2])
-                self.pathHelixGroup.createXoverItem(
-                                            xo[0], toBase, StrandType.Staple)
-        # end for
+        for fromBase, toBase in part.xovers():
+            self.pathHelixGroup.createXoverItem(fromBase, toBase)
         self.setActivePart(part)
 
     # end def
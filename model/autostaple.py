@@ -0,0 +1,170 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+
+"""
+autostaple.py
+Created by Shawn Douglas on 2011-05-10.
+
+Computes the staple layout DNAPart.autoStaple installs, without touching
+the part. Each helix's staple strand is cleared and laid over the
+scaffold's segments, then every potential staple crossover whose two
+bases are still free gets installed, visiting helices and crossovers in
+the same order the one-command-per-edit implementation did so that the
+result is identical.
+
+The work happens on copies of the staple linkage columns (see
+StrandArray.linkageSnapshot), keyed by helix storage id, which
+DNAPart.AutoStapleCommand then swaps in with StrandArray.replaceLinkage.
+"""
+
+from .enum import StrandType
+from .strandarray import NO_HELIX
+
+class _Layout(object):
+    """The staple linkage of a set of helices under construction"""
+    def __init__(self, vhelices):
+        super(_Layout, self).__init__()
+        self.cols = {}  # storage id -> [fiveH, fiveIdx, threeH, threeIdx]
+        self.d3 = {}  # storage id -> 1 if the staple runs 5' to 3' else -1
+        for vh in vhelices:
+            snap = vh._strand(StrandType.Staple).linkageSnapshot()
+            self.cols[vh._storageId] = list(snap[:4])
+            fiveTo3 = vh.directionOfStrandIs5to3(StrandType.Staple)
+            self.d3[vh._storageId] = 1 if fiveTo3 else -1
+
+    def set3(self, h, i, toH, toI):
+        """Base._set3Prime: (toH, toI) becomes the 3' neighbor of (h, i),
+        leaving whatever either one was linked to on that side"""
+        fiveH, fiveIdx, threeH, threeIdx = self.cols[h]
+        oldH = threeH[i]
+        if oldH != NO_HELIX:
+            self.cols[oldH][0][threeIdx[i]] = NO_HELIX
+        toFiveH, toFiveIdx = self.cols[toH][0], self.cols[toH][1]
+        oldH = toFiveH[toI]
+        if oldH != NO_HELIX:
+            self.cols[oldH][2][toFiveIdx[toI]] = NO_HELIX
+        toFiveH[toI], toFiveIdx[toI] = h, i
+        threeH[i], threeIdx[i] = toH, toI
+
+    def unlink3(self, h, i):
+        threeH, threeIdx = self.cols[h][2], self.cols[h][3]
+        if threeH[i] != NO_HELIX:
+            self.cols[threeH[i]][0][threeIdx[i]] = NO_HELIX
+            threeH[i] = NO_HELIX
+
+    def unlink5(self, h, i):
+        fiveH, fiveIdx = self.cols[h][0], self.cols[h][1]
+        if fiveH[i] != NO_HELIX:
+            self.cols[fiveH[i]][2][fiveIdx[i]] = NO_HELIX
+            fiveH[i] = NO_HELIX
+
+    def isEmpty(self, h, i):
+        cols = self.cols[h]
+        return cols[0][i] == NO_HELIX and cols[2][i] == NO_HELIX
+
+    def isFree(self, h, i):
+        """StrandArray.isFreeForXover: occupied and no crossover on
+        either side"""
+        fiveH, fiveIdx, threeH, threeIdx = self.cols[h]
+        d3 = self.d3[h]
+        if fiveH[i] == NO_HELIX and threeH[i] == NO_HELIX:
+            return False
+        if threeH[i] != NO_HELIX and\
+           (threeH[i] != h or threeIdx[i] != i + d3):
+            return False
+        if fiveH[i] != NO_HELIX and\
+           (fiveH[i] != h or fiveIdx[i] != i - d3):
+            return False
+        return True
+
+    def clear(self, h, numBases):
+        """legacyClearStrand(Staple, 1, numBases - 1): cuts every linkage
+        of the helix except those leaving its first and last base
+        outward. Returns the (first, last) range of bases this emptied."""
+        d3 = self.d3[h]
+        # Base i's linkage on its right is its 3' one on a 5'->3' strand
+        unlinkR = self.unlink3 if d3 == 1 else self.unlink5
+        unlinkL = self.unlink5 if d3 == 1 else self.unlink3
+        unlinkR(h, 0)
+        for i in xrange(1, numBases - 1):
+            unlinkL(h, i)
+            unlinkR(h, i)
+        unlinkL(h, numBases - 1)
+        first, last = 0, numBases - 1
+        if not self.isEmpty(h, first):
+            first += 1
+        if not self.isEmpty(h, last):
+            last -= 1
+        return (first, last)
+
+    def connect(self, h, i):
+        """Joins base i to its natural right neighbor"""
+        if self.d3[h] == 1:
+            self.set3(h, i, h, i + 1)
+        else:
+            self.set3(h, i + 1, h, i)
+
+def stapleLayout(part, vhelices):
+    """
+    Returns (layout, emptied). layout maps each helix in vhelices to the
+    (fiveHelix, fiveIdx, threeHelix, threeIdx) staple linkage columns
+    autoStaple gives it; emptied maps it to the (first, last) range of
+    bases that clearing the staple strand emptied, whose staple
+    sequences and loops autoStaple erases.
+    """
+    layout = _Layout(vhelices)
+    emptied = {}
+    for vh in vhelices:
+        h, numBases = vh._storageId, vh.numBases()
+        emptied[vh] = layout.clear(h, numBases)
+        # Copy the scaffold strand's segments (and join abutting ones)
+        inSegment = [False] * numBases
+        for segStart, segEnd in vh._strand(StrandType.Scaffold).segments(False):
+            for i in xrange(int(segStart), int(segEnd) + 1):
+                inSegment[i] = True
+        for i in xrange(numBases - 1):
+            if inSegment[i] and inSegment[i + 1]:
+                layout.connect(h, i)
+    # Crossovers leave from the side where each helix has its 3' ends, so
+    # each one is considered once (see potentialCrossoverLists)
+    for vh in vhelices:
+        h = vh._storageId
+        facingRight = not vh.directionOfStrandIs5to3(StrandType.Staple)
+        table = part.potentialCrossoverIndices(StrandType.Staple, facingRight)
+        neighbors = vh.neighbors()
+        for p in xrange(len(neighbors)):
+            neighbor = neighbors[p]
+            if not neighbor:
+                continue
+            toH = neighbor._storageId
+            if toH not in layout.cols:
+                continue
+            for idx in table[p]:
+                if layout.isFree(h, idx) and layout.isFree(toH, idx):
+                    layout.set3(h, idx, toH, idx)
+    ret = {}
+    for vh in vhelices:
+        ret[vh] = tuple(layout.cols[vh._storageId])
+    return (ret, emptied)
@@ -25,7 +25,7 @@
 base.py
 Created by Shawn Douglas on 2011-02-08.
 """
-from .enum import StrandType
+from .enum import StrandType, BaseFlags
 from random import Random
 from views import styles
 prng = Random()
@@ -36,21 +36,63 @@ util.qtWrapImport('QtGui', globals(), [ 'QColor'])
 
 class Base(object):
     """
-    A POD class that lives in the private API of virtualhelix.
+    A lightweight view that lives in the private API of virtualhelix.
     (Why not put it inside VirtualHelix? Because it's already quite crowded)
     Provides information about which bases are connected to which other bases.
+    The data itself is stored in the StrandArray of the owning VirtualHelix;
+    a Base just names (vhelix, strandtype, index) and is created on demand
+    by indexing a strand, so two Bases are equal iff they name the same base.
     """
+    __slots__ = ('_vhelix', '_strandtype', '_n')
+
     def __init__(self, vhelix, strandtype, index):
         super(Base, self).__init__()
-        self._5pBase = None
-        self._3pBase = None
-        self._color = None
         self._vhelix = vhelix
         self._strandtype = strandtype
         self._n = index
-        self._floatingXoverDestination = None
-        self._strandLength = 0
-        self._sequence = " "
+
+    def __eq__(self, other):
+        return isinstance(other, Base) and\
+               self._n == other._n and\
+               self._vhelix is other._vhelix and\
+               self._strandtype == other._strandtype
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._vhelix), self._strandtype, self._n))
+
+    def _strandArray(self):
+        return self._vhelix._strand(self._strandtype)
+
+    def _flags(self):
+        return self._vhelix._strand(self._strandtype)._flags[self._n]
+
+    # The old POD ivars survive as properties backed by the strand arrays
+    def _get5pBaseIvar(self):
+        return self._strandArray()._fivePrimeTarget(self._n)
+    def _set5pBaseIvar(self, base):
+        self._strandArray()._setFivePrimeTarget(self._n, base)
+    _5pBase = property(_get5pBaseIvar, _set5pBaseIvar)
+
+    def _get3pBaseIvar(self):
+        return self._strandArray()._threePrimeTarget(self._n)
+    def _set3pBaseIvar(self, base):
+        self._strandArray()._setThreePrimeTarget(self._n, base)
+    _3pBase = property(_get3pBaseIvar, _set3pBaseIvar)
+
+    def _getColorIvar(self):
+        return self._strandArray()._colorAt(self._n)
+    def _setColorIvar(self, color):
+        self._strandArray()._setColorAt(self._n, color)
+    _color = property(_getColorIvar, _setColorIvar)
+
+    def _getSequenceIvar(self):
+        return self._strandArray()._sequenceAt(self._n)
+    def _setSequenceIvar(self, seq):
+        self._strandArray()._setSequenceAt(self._n, seq)
+    _sequence = property(_getSequenceIvar, _setSequenceIvar)
 
     def __str__(self):
         fiveTo3 = self._vhelix.directionOfStrandIs5to3(self._strandtype)
@@ -213,7 +255,10 @@ class Base(object):
             return self._3pBase
         else:
             return self._5pBase
-        
+
+    # Assigning _3pBase/_5pBase below goes through the StrandArray, which
+    # keeps the oligo index and the part's crossover registry in step
+    # with the linkage.
     def _set5Prime(self, toBase):
         """Only VirtualHelix should call this method. Returns l
         such that self._unset5Prime(toBase, *l) undoes this command."""
@@ -235,12 +280,6 @@ class Base(object):
         self._vhelix.setHasBeenModified()
         if toBase:
             toBase._vhelix.setHasBeenModified()
-        part = self._vhelix.part()
-        if part:
-            self.isXoverCreated5p([self])
-            part.basesModified.add(self)
-            part.basesModified.add(toOld3)
-            part.basesModified.add(fromOld5)
         return (fromOld5, toOld3)
 
     def _unset5Prime(self, toBase, fromOld5, toOld3):
@@ -254,12 +293,6 @@ class Base(object):
             fromOld5._vhelix.setHasBeenModified()
         if toBase:
             toBase._vhelix.setHasBeenModified()
-        part = self._vhelix.part()
-        if part:
-            self.isXoverCreated5p([fromOld5, toOld3])
-            part.basesModified.add(self)
-            part.basesModified.add(toOld3)
-            part.basesModified.add(fromOld5)
         self._vhelix.setHasBeenModified()
 
     def _set3Prime(self, toBase):
@@ -282,12 +315,6 @@ class Base(object):
             fromOld3._vhelix.setHasBeenModified()
         if toBase:
             toBase._vhelix.setHasBeenModified()
-        part = self._vhelix.part()
-        if part:
-            self.isXoverCreated3p([self])
-            part.basesModified.add(self)
-            part.basesModified.add(toOld5)
-            part.basesModified.add(fromOld3)
         self._vhelix.setHasBeenModified()
         return (fromOld3, toOld5)
 
@@ -302,35 +329,8 @@ class Base(object):
             fromOld3._vhelix.setHasBeenModified()
         if toBase:
             toBase._vhelix.setHasBeenModified()
-        part = self._vhelix.part()
-        if part:
-            self.isXoverCreated3p([toOld5,fromOld3])
-            part.basesModified.add(self)
-            part.basesModified.add(toOld5)
-            part.basesModified.add(fromOld3)
         self._vhelix.setHasBeenModified()
     # end def
-    
-    
-    def isXoverCreated3p(self, bases):
-        # print "I got called 3"
-        for base in bases:
-            if base != None:
-                if base._hasCrossover3p() and not base.floatingXoverDestination():
-                    self._vhelix.part().createXover.emit((base.vhelix(), base._n) ,\
-                                                        (base._3pBase.vhelix(), base._3pBase._n), \
-                                                        base._strandtype )
-                    break
-                    
-    def isXoverCreated5p(self, bases):
-        # print "I got called 5"
-        for base in bases:
-            if base != None:
-                if base._hasCrossover5p(): # that means base is a 3 prime end
-                    self._vhelix.part().createXover.emit((base._5pBase.vhelix(), base._5pBase._n) , \
-                                                        (base.vhelix(), base._n), \
-                                                        base._strandtype )
-                    break
 
     def vhelix(self):
         return self._vhelix
@@ -367,31 +367,30 @@ class Base(object):
         if self._strandtype == StrandType.Scaffold:
             # return QColor(44, 51, 141)
             return styles.bluestroke
-        if self._color == None:
-            self._color = QColor()
-        return self._color
+        color = self._color
+        if color == None:
+            return QColor()
+        return color
 
+    # The predicates below read the flag byte cached by the StrandArray
+    # (see BaseFlags) instead of chasing neighbor Bases
     def isEmpty(self):
-        return self._5pBase == None and \
-               self._3pBase == None
+        return not self._flags() & (BaseFlags.Raw5p | BaseFlags.Raw3p)
 
     def is5primeEnd(self):
         """Return True if no 5pBase, but 3pBase exists."""
-        return self._hasNeighbor3p() and not self._hasNeighbor5p()
+        f = self._flags() & (BaseFlags.Has5p | BaseFlags.Has3p)
+        return f == BaseFlags.Has3p
 
     def is3primeEnd(self):
         """Return True if no 3pBase, but 5pBase exists."""
-        return self._hasNeighbor5p() and not self._hasNeighbor3p()
+        f = self._flags() & (BaseFlags.Has5p | BaseFlags.Has3p)
+        return f == BaseFlags.Has5p
 
     def _neighbor5p(self):
-        n = self._5pBase
-        if n and n.floatingXoverDestination():
-            return None
-        return n
+        return self._5pBase
 
     def _neighbor3p(self):
-        if self.floatingXoverDestination():
-            return None
         return self._3pBase
 
     def _neighborR(self):
@@ -426,128 +425,86 @@ class Base(object):
 
     # A neighbor base is one that is connected to the base represented
     # by self through a phosphate linkage
-    # When a crossover is being forcibly created (right click pencil tool
-    # or left click force tool) the base being dragged from is considered
-    # to have a "floating" destination that causes _hasNeighbor3p (and one
-    # of _hasNeighbor{L,R}) to return True but will still show up as None
-    # if _neighbor3p is called.
     def _hasNeighbor5p(self):
-        retv = self._neighbor5p() != None
-        return retv
+        return bool(self._flags() & BaseFlags.Has5p)
 
     def _hasNeighbor3p(self):
-        retv = self._neighbor3p() != None or\
-               self.floatingXoverDestination() != None
-        return retv
+        return bool(self._flags() & BaseFlags.Has3p)
 
     def _hasNeighborR(self):
         if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            return self._neighbor3p() != None or\
-                   self.floatingXoverDestination() != None
+            return bool(self._flags() & BaseFlags.Has3p)
         else:
-            return self._neighbor5p() != None
+            return bool(self._flags() & BaseFlags.Has5p)
 
     def _hasNeighborL(self):
         if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            return self._neighbor5p() != None or\
-                   self.floatingXoverDestination() != None
+            return bool(self._flags() & BaseFlags.Has5p)
         else:
-            return self._neighbor3p() != None
+            return bool(self._flags() & BaseFlags.Has3p)
 
     # A segment is a connection between a base and its neighbor
     # base on the same strand
+    def _isAtEdge(self, rightEdge):
+        if rightEdge:
+            return self._n == len(self._vhelix._strand(self._strandtype)) - 1
+        return self._n == 0
+
     def _connectsToNat5p(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
-            return self._neighbor5p() == guiLeftNeighbor
-        else:
-            guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
-            return self._neighbor5p() == guiRightNeighbor
+        # At the edge of the helix there is no natural neighbor, so a
+        # base without a 5' neighbor "connects" to it
+        f = self._flags()
+        if f & BaseFlags.Nat5p:
+            return True
+        fiveTo3 = self._vhelix.directionOfStrandIs5to3(self._strandtype)
+        return not f & BaseFlags.Has5p and self._isAtEdge(not fiveTo3)
 
     def _connectsToNat3p(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
-            return self._neighbor3p() == guiRightNeighbor
-        else:
-            guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
-            return self._neighbor3p() == guiLeftNeighbor
+        f = self._flags()
+        if f & BaseFlags.Nat3p:
+            return True
+        fiveTo3 = self._vhelix.directionOfStrandIs5to3(self._strandtype)
+        return not f & BaseFlags.Has3p and self._isAtEdge(fiveTo3)
 
     def _connectsToNatR(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
-        if not guiRightNeighbor:
-            return False
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            return self._neighbor3p() == guiRightNeighbor
-        else:
-            return self._neighbor5p() == guiRightNeighbor
+        return bool(self._flags() & BaseFlags.NatR)
 
     def _connectsToNatL(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
-        if not guiLeftNeighbor:
-            return False
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            return self._neighbor5p() == guiLeftNeighbor
-        else:
-            return self._neighbor3p() == guiLeftNeighbor
+        return bool(self._flags() & BaseFlags.NatL)
 
     # A crossover is a connection between a base and a base
     # that isn't its neighbor on the same strand
     def _hasCrossover5p(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
-            return self._neighbor5p() not in (None, guiLeftNeighbor)
-        else:
-            guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
-            return self._neighbor5p() not in (None, guiRightNeighbor)
+        f = self._flags() & (BaseFlags.Has5p | BaseFlags.Nat5p)
+        return f == BaseFlags.Has5p
 
     def _hasCrossover3p(self):
-        if self.floatingXoverDestination():
-            return True
-        strnd = self._vhelix._strand(self._strandtype)
-        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
-            return self._neighbor3p() not in (None, guiRightNeighbor)
-        else:
-            guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
-            return self._neighbor3p() not in (None, guiLeftNeighbor)
+        f = self._flags() & (BaseFlags.Has3p | BaseFlags.Nat3p)
+        return f == BaseFlags.Has3p
 
     def _hasCrossoverR(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        guiRightNeighbor = strnd[self._n+1] if self._n<len(strnd)-1 else None
         if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            if self.floatingXoverDestination():
-                return True
-            return self._neighbor3p() not in (None, guiRightNeighbor)
+            return self._hasCrossover3p()
         else:
-            return self._neighbor5p() not in (None, guiRightNeighbor)
+            return self._hasCrossover5p()
 
     def _hasCrossoverL(self):
-        strnd = self._vhelix._strand(self._strandtype)
-        guiLeftNeighbor = strnd[self._n-1] if self._n>0 else None
         if self._vhelix.directionOfStrandIs5to3(self._strandtype):
-            return self._neighbor5p() not in (None, guiLeftNeighbor)
+            return self._hasCrossover5p()
         else:
-            if self.floatingXoverDestination():
-                return True
-            return self._neighbor3p() not in (None, guiLeftNeighbor)
+            return self._hasCrossover3p()
 
     def isEnd(self):
-        if self._hasNeighbor5p() and\
-           not self._hasNeighbor3p():
+        f = self._flags() & (BaseFlags.Has5p | BaseFlags.Has3p)
+        if f == BaseFlags.Has5p:
             return 3
-        if self._hasNeighbor3p() and\
-           not self._hasNeighbor5p():
+        if f == BaseFlags.Has3p:
             return 5
         return False
 
     def isStrand(self):
-        return self._5pBase != None and\
-               self._3pBase != None
+        f = self._flags() & (BaseFlags.Raw5p | BaseFlags.Raw3p)
+        return f == BaseFlags.Raw5p | BaseFlags.Raw3p
 
     def partId(self):
         """docstring for partNum"""
@@ -558,17 +515,8 @@ class Base(object):
         next base does not match the same for this base."""
         return self._hasCrossover3p() or self._hasCrossover5p()
 
-    def floatingXoverDestination(self):
-        """When a force crossover is being added, a crossover
-        is displayed from the 3' end to the location of the mouse.
-        That's called a floating crossover and its QPoint destination
-        (the location of the mouse) is returned by this method."""
-        return self._floatingXoverDestination
-
     def is3primeXover(self):
         """Return True if no 3pBase, but 5pBase exists."""
-        if self._floatingXoverDestination:
-            return True
         if self._3pBase != None:
             if self.vhelixNum() != self._3pBase.vhelixNum():
                 return True
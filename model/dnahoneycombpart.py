@@ -33,6 +33,9 @@ class DNAHoneycombPart(DNAPart):
     stapR = Crossovers.honeycombStapRight
     _activeSlice = step
     _majorGridLine = step/3
+    # (row, col) offsets of the neighbors in directions p0, p1, p2
+    _neighborOffsetsEven = ((0, 1), (-1, 0), (0, -1))
+    _neighborOffsetsOdd = ((0, -1), (1, 0), (0, 1))
     
     def crossSectionType(self):
         """Returns the cross-section type of the DNA part."""
@@ -23,16 +23,26 @@
 # http://www.opensource.org/licenses/mit-license.php
 from exceptions import NotImplementedError
 import json
+import os
+from cadnano import ignoreEnv
 from .part import Part
 from .virtualhelix import VirtualHelix
+from .xoverregistry import XoverRegistry
+from .occupancymap import OccupancyMap
+from .oligoindex import OligoIndex
+from .strandarray import applyScaffoldSequence, colorOligos
+from .autostaple import stapleLayout
+from .undodelta import snapshotMemory
 from .enum import LatticeType, StrandType
 from heapq import *
+from array import array
 import copy
+from contextlib import contextmanager
 from views import styles
 
 import util
 # import Qt stuff into the module namespace with PySide, PyQt4 independence
-util.qtWrapImport('QtCore', globals(), ['QObject', 'pyqtSignal'])
+util.qtWrapImport('QtCore', globals(), ['QObject', 'pyqtSignal', 'QTimer'])
 util.qtWrapImport('QtGui', globals(), [ 'QUndoCommand'])
 
 class DNAPart(Part):
@@ -43,25 +53,27 @@ class DNAPart(Part):
         virtualHelixAtCoordsChanged(row, col)  # the VH at row, col will
             * change its idnum (the dnapart owns the idnum)
             * change its virtualhelix object (maybe from or to None)
+        virtualHelicesAtCoordsChanged(coordsList)  # Same, for every
+            (row, col) in coordsList at once (addVirtualHelicesAt)
         persistentDataChanged()  # The saveable data contained in the receiver
                                  # will or did change. This means one of
-            * virtualHelixAtCoordsChanged was triggered
+            * virtualHelix(ces)AtCoordsChanged was triggered
             * dimensionsWillChange was triggered
             * basesModified was emitted by some child VH
         selectionWillChange()
+        xoversChanged(added, removed)
     """
-    # object 1 is the tuple (3 prime vhelix, index), 
-    # object 2 is the (5 prime vhelix, index)
-    # int is the strandtype
-    createXover = pyqtSignal(object, object, int)
-    # object 1 is (3'vhelix, 3'strandType, 3'index)
-    # object 2 is (QPointF)destination
-    # if the floating Xover is being destroyed,
-    #  object 1 is None
-    #  object 2 is None
-    updateFloatingXover = pyqtSignal(object, object)
+    # added and removed are lists of crossovers, each of the form
+    # ((3'vhelix, strandType, 3'index), (5'vhelix, strandType, 5'index))
+    # (see XoverRegistry)
+    xoversChanged = pyqtSignal(object, object)
     
     _selectAllBehavior = True  # Always select all helices in part
+    # basesModified and xoversChanged are queued and emitted together
+    # when control returns to the event loop (see flushNotifications)
+    deferNotifications = True
+    if os.environ.get('CADNANO_SYNC_NOTIFICATIONS', False) and not ignoreEnv():
+        deferNotifications = False
     # Bases are always added and removed in multiples of the
     # addition/removal unit
     def selectAllBehavior(self):
@@ -88,25 +100,46 @@ class DNAPart(Part):
         self._scaffolds = []
         self._selection = list()
         self._coordToVirtualHelix = {}  # (row,col) -> VirtualHelix
+        # vh -> getVirtualHelixNeighbors(vh), kept up to date by
+        # AddHelixCommand, and the value of _neighborsVersion when
+        # that list last changed
+        self._neighbors = {}
+        self._neighborsVersions = {}
+        self._neighborsVersion = 0
         
         # Abstract
         if self._selectAllBehavior:
             self.virtualHelixAtCoordsChanged.connect(self.updateSelectionFromVHChange)
+            self.virtualHelicesAtCoordsChanged.connect(self.updateSelectionFromVHsChange)
 
         # This variable is directly used and entirely managed by
         # virtualhelix for consolidation of basesModified signals.
         self.basesModifiedVHs = set()
-
-        # We also keep track of the specific bases that were modified
-        # so that we can efficiently recalculate strand lengths.
-        # self.basesModified is cleared by and ONLY by dnapart's
-        # recalculateStrandLengths method.
-        self.basesModified = set()
-        self.numTimesStrandLengthsRecalcd = 0
+        # See transaction()
+        self._transactionDepth = 0
+        self._transactionPoliceVHs = set()
+        # The model.preview.Preview whose edit is being applied, if any
+        self._preview = None
+        # Fires once per event loop iteration that had changes to report
+        self._notificationTimer = QTimer(self)
+        self._notificationTimer.setSingleShot(True)
+        self._notificationTimer.setInterval(0)
+        self._notificationTimer.timeout.connect(self.flushNotifications)
+        # Also managed by virtualhelix (through its StrandArrays), which
+        # flushes it along with the basesModified signals.
+        self._xoverRegistry = XoverRegistry(self)
+        # Which bases are occupied, kept current the same way
+        self._occupancy = OccupancyMap(self)
+        # The oligos through the bases of our helices
+        self._oligoIndex = OligoIndex()
+        # (latticeType, strandType, facingRight, numBases) ->
+        # potentialCrossoverIndices; cleared when the dimensions change
+        self._potentialXoverCache = {}
 
         # Event propagation
         
         self.virtualHelixAtCoordsChanged.connect(self.persistentDataChangedEvent)
+        self.virtualHelicesAtCoordsChanged.connect(self.persistentDataChangedEvent)
         self.dimensionsWillChange.connect(self.persistentDataChangedEvent)
         self.dimensionsDidChange.connect(self.ensureActiveBaseIsWithinNewDims)
     
@@ -117,7 +150,9 @@ class DNAPart(Part):
     def destroy(self):
         if self._selectAllBehavior == True:
             self.virtualHelixAtCoordsChanged.disconnect(self.updateSelectionFromVHChange)
+            self.virtualHelicesAtCoordsChanged.disconnect(self.updateSelectionFromVHsChange)
         self.virtualHelixAtCoordsChanged.disconnect(self.persistentDataChangedEvent)
+        self.virtualHelicesAtCoordsChanged.disconnect(self.persistentDataChangedEvent)
         self.dimensionsWillChange.disconnect(self.persistentDataChangedEvent)
     # end def
 
@@ -165,28 +200,159 @@ class DNAPart(Part):
         return self.coordinateParityEven(vh.coord())
 
     def getVirtualHelixNeighbors(self, vhref):
-        neighbors = []
+        """
+        Returns a list with the helix next to vhref in each direction p
+        of the lattice (None where there is no helix), so neighbors[p]
+        is the neighbor in direction p. The order and presence of Nones
+        is important; if you need the indices of available directions use
+        range(0, len(neighbors)). The list comes from the receiver's
+        neighbor table and must not be modified.
+        """
         vh = self.getVirtualHelix(vhref, returnNoneIfAbsent=False)
-        (r,c) = vh.coord()
-        if self.virtualHelixParityEven(vh):
-            neighbors.append(self.getVirtualHelix((r,c+1)))  # p0 neighbor (p0 is a direction)
-            neighbors.append(self.getVirtualHelix((r-1,c)))  # p1 neighbor
-            neighbors.append(self.getVirtualHelix((r,c-1)))  # p2 neighbor
+        neighbors = self._neighbors.get(vh)
+        if neighbors == None:  # Not (or no longer) in the receiver
+            return [self.getVirtualHelix(coord)\
+                    for coord in self._neighborCoords(vh.coord())]
+        return neighbors
+
+    def neighborsVersion(self, vhref):
+        """A number that changes whenever getVirtualHelixNeighbors(vhref)
+        would return a different list, so that views can tell whether
+        what they derived from the neighbors is stale without comparing
+        lists"""
+        vh = self.getVirtualHelix(vhref, returnNoneIfAbsent=False)
+        return self._neighborsVersions.get(vh, -1)
+
+    def _neighborCoords(self, coord):
+        """The coords of the lattice positions next to coord, in the
+        order of the neighbor directions p0, p1, ... (see
+        _neighborOffsetsEven)"""
+        r, c = coord
+        if self.coordinateParityEven(coord):
+            offsets = self._neighborOffsetsEven
         else:
-            neighbors.append(self.getVirtualHelix((r,c-1)))  # p0 neighbor (p0 is a direction)
-            neighbors.append(self.getVirtualHelix((r+1,c)))  # p1 neighbor
-            neighbors.append(self.getVirtualHelix((r,c+1)))  # p2 neighbor
-        return neighbors  # Note: the order and presence of Nones is important
-        # If you need the indices of available directions use range(0,len(neighbors))
+            offsets = self._neighborOffsetsOdd
+        return [(r + dr, c + dc) for dr, dc in offsets]
+
+    def _updateNeighborTable(self, coord):
+        """Called by AddHelixCommand after a helix arrives at or leaves
+        coord. Brings the neighbor lists of coord and of the positions
+        around it up to date."""
+        self._neighborsVersion += 1
+        vh = self._coordToVirtualHelix.get(coord)
+        neighborCoords = self._neighborCoords(coord)
+        if vh != None:
+            self._neighbors[vh] = [self._coordToVirtualHelix.get(nc)\
+                                   for nc in neighborCoords]
+            self._neighborsVersions[vh] = self._neighborsVersion
+        for nc in neighborCoords:
+            n = self._coordToVirtualHelix.get(nc)
+            if n == None:
+                continue
+            # Lists are replaced rather than modified so that callers
+            # holding on to the old one aren't surprised
+            old = self._neighbors[n]
+            self._neighbors[n] = [vh if c == coord else old[p]\
+                          for p, c in enumerate(self._neighborCoords(nc))]
+            self._neighborsVersions[n] = self._neighborsVersion
 
     dimensionsWillChange = pyqtSignal(object)
     dimensionsDidChange = pyqtSignal()
-    def setDimensions(self, newDim):
-        self.dimensionsWillChange.emit(newDim)
-        self._maxRow, self._maxCol, self._maxBase = newDim
-        for n in self._numberToVirtualHelix:
-            self._numberToVirtualHelix[n].setNumBases(self._maxBase)
-        self.dimensionsDidChange.emit()
+    def setDimensions(self, newDim, undoable=True):
+        """
+        Resizes the receiver to newDim = (rows, cols, numBases), growing
+        or truncating every helix at once in a SetDimensionsCommand
+        (which only goes on the undo stack if it changes the length of
+        some helix).
+        Truncating a helix unlinks whatever was linked to the bases cut
+        off. Emits dimensionsWillChange and dimensionsDidChange once.
+        """
+        c = self.SetDimensionsCommand(self, tuple(newDim))
+        if undoable and self._numberToVirtualHelix and\
+           newDim[2] != self._maxBase:
+            self.undoStack().push(c)
+        else:
+            c.redo()
+
+    class SetDimensionsCommand(QUndoCommand):
+        def __init__(self, dnapart, newDim):
+            super(DNAPart.SetDimensionsCommand, self).__init__()
+            self._part = dnapart
+            self._newDim = newDim
+            self._oldDim = None
+            # [(vh, loops cut off, scaffold tail, staple tail), ...] if
+            # the command truncated the helices
+            self._tails = None
+            self._discarded = False  # See discardUndoData
+
+        def _setDim(self, newDim):
+            p = self._part
+            p.dimensionsWillChange.emit(newDim)
+            p._maxRow, p._maxCol, p._maxBase = newDim
+            p._potentialXoverCache.clear()
+
+        def _didChange(self, vhs):
+            for vh in vhs:
+                vh.setHasBeenModified()
+            if vhs:
+                vhs[0].emitBasesModifiedIfNeeded()
+            self._part.dimensionsDidChange.emit()
+
+        def redo(self):
+            if self._discarded:
+                return
+            p = self._part
+            self._oldDim = p.dimensions()
+            numBases, oldNB = self._newDim[2], self._oldDim[2]
+            vhs = list(p.getVirtualHelices())
+            self._setDim(self._newDim)
+            if numBases < oldNB:
+                self._tails = []
+                for vh in vhs:
+                    loops = []
+                    for strandType in (StrandType.Scaffold, StrandType.Staple):
+                        loop = vh._loop(strandType)
+                        cut = dict((i, n) for i, n in loop.iteritems()\
+                                   if i >= numBases)
+                        for i in cut:
+                            del loop[i]
+                        loops.append(cut)
+                    self._tails.append((vh, loops,\
+                                    vh._scaffoldBases._cutTail(numBases),\
+                                    vh._stapleBases._cutTail(numBases)))
+            elif numBases > oldNB:
+                for vh in vhs:
+                    vh._scaffoldBases.resize(numBases)
+                    vh._stapleBases.resize(numBases)
+            self._didChange(vhs)
+
+        def undo(self):
+            if self._discarded:
+                return
+            p = self._part
+            numBases, oldNB = self._newDim[2], self._oldDim[2]
+            vhs = list(p.getVirtualHelices())
+            self._setDim(self._oldDim)
+            if self._tails != None:
+                for vh, loops, scafTail, stapTail in reversed(self._tails):
+                    vh._loop(StrandType.Scaffold).update(loops[0])
+                    vh._loop(StrandType.Staple).update(loops[1])
+                    vh._scaffoldBases._restoreTail(scafTail)
+                    vh._stapleBases._restoreTail(stapTail)
+                self._tails = None
+            elif numBases > oldNB:
+                for vh in vhs:
+                    vh._scaffoldBases.resize(oldNB)
+                    vh._stapleBases.resize(oldNB)
+            self._didChange(vhs)
+
+        def undoMemory(self):
+            return snapshotMemory(self._tails)
+
+        def discardUndoData(self):
+            """Leaves undo and redo doing nothing (see UndoBudget)"""
+            self._tails = None
+            self._discarded = True
 
     def majorGrid(self):
         return self._majorGridLine
@@ -195,6 +361,56 @@ class DNAPart(Part):
         """Returns the cross-section type of the DNA part."""
         return self.step
 
+    ############################# Potential Crossovers #############################
+    def potentialCrossoverIndices(self, strandType, facingRight):
+        """
+        Returns a tuple with an array of base indices for each neighbor
+        direction p (see getVirtualHelixNeighbors): the indices at which
+        any helix of the receiver could cross over to its neighbor in
+        direction p. The table only depends on the lattice, strandType,
+        facingRight and numBases, so it is built once and shared by all
+        helices.
+        """
+        numBases = self.numBases()
+        key = (self.crossSectionType(), strandType, facingRight, numBases)
+        ret = self._potentialXoverCache.get(key)
+        if ret != None:
+            return ret
+        luts = (self.scafL, self.scafR, self.stapL, self.stapR)
+        # these are the list of crossover points simplified
+        lut = luts[int(facingRight) +\
+                   2 * int(strandType == StrandType.Staple)]
+        ret = []
+        for offsets in lut:
+            ret.append(array('i', [i + j for i in xrange(0, numBases, self.step)\
+                                         for j in offsets if i + j < numBases]))
+        ret = tuple(ret)
+        self._potentialXoverCache[key] = ret
+        return ret
+
+    def potentialCrossoverLists(self, strandType, facingRight=None,\
+                                possibleOnly=False, vhs=None):
+        """
+        Batch version of VirtualHelix.potentialCrossoverList for every
+        helix in vhs (all helices by default). Returns a dict mapping each
+        helix to its [neighborVirtualHelix, index] list. facingRight=None
+        picks, for each helix, the side on which its strandType strand
+        has its 3' ends. With possibleOnly, candidates are filtered the
+        way possibleNewCrossoverAt would filter them.
+        """
+        if vhs == None:
+            vhs = self.getVirtualHelices()
+        ret = {}
+        for vh in vhs:
+            facing = facingRight
+            if facing == None:
+                facing = not vh.directionOfStrandIs5to3(strandType)
+            if possibleOnly:
+                ret[vh] = vh.possibleNewCrossoverList(facing, strandType)
+            else:
+                ret[vh] = vh.potentialCrossoverList(facing, strandType)
+        return ret
+
     ############################# Archiving/Unarchiving #############################
     def fillSimpleRep(self, sr):
         """
@@ -217,12 +433,14 @@ class DNAPart(Part):
     # finishInitWithArchivedDict, this time with all entries
     finishInitPriority = 0.0
     def finishInitWithArchivedDict(self, completeArchivedDict):
+        helices = []
         for coord, num, vh in completeArchivedDict['virtualHelices']:
             if num % 2:
                 self.highestUsedOdd = max(self.highestUsedOdd, num)
             else:
                 self.highestUsedEven = max(self.highestUsedEven, num)
-            self.addVirtualHelixAt(coord, vh, requestSpecificIdnum=num, noUndo=True)
+            helices.append((coord, vh, num))
+        self.addVirtualHelicesAt(helices, noUndo=True)
         self.setName(completeArchivedDict['name'])
 
     ############################# VirtualHelix CRUD #############################
@@ -261,6 +479,22 @@ class DNAPart(Part):
         else:
             self.undoStack().push(c)
 
+    virtualHelicesAtCoordsChanged = pyqtSignal(object)
+    def addVirtualHelicesAt(self, helices, noUndo=False):
+        """
+        Bulk addVirtualHelixAt for helices, a list of (coords, vh,
+        requestSpecificIdnum) tuples (the idnum may be None). Adds them
+        all in one undoable command that emits a single
+        virtualHelicesAtCoordsChanged instead of one
+        virtualHelixAtCoordsChanged per helix, so that loading a document
+        doesn't rebuild the views once per helix.
+        """
+        c = self.AddHelicesCommand(self, helices)
+        if noUndo:
+            c.redo()
+        else:
+            self.undoStack().push(c)
+
     def matchHelixNumberingToPhgDisplayOrder(self, phg):
         evens, odds = [], []
         for vh in phg.displayedVHs():
@@ -296,40 +530,117 @@ class DNAPart(Part):
     def getVirtualHelices(self):
         return [self._numberToVirtualHelix[n] for n in self._numberToVirtualHelix]
 
+    def xovers(self):
+        """Returns a list of all crossovers in the receiver in the form
+        ((fromVH, strandType, fromIdx), (toVH, strandType, toIdx))"""
+        return self._xoverRegistry.xovers()
+
+    def xoversBetween(self, vhA, vhB):
+        """Crossovers (in the format returned by xovers) joining vhA and
+        vhB in either direction"""
+        return self._xoverRegistry.xoversBetween(vhA, vhB)
+
+    def xoversOnHelix(self, vh):
+        return self._xoverRegistry.xoversOnHelix(vh)
+
+    def helicesChangedBetweenSlices(self, strandType, idxA, idxB):
+        """The helices that have a base at exactly one of the slices idxA
+        and idxB on strandType"""
+        return self._occupancy.helicesChangedBetween(strandType, idxA, idxB)
+
     def autoStaple(self):
+        """
+        Lays staples across from the scaffold on every helix and adds
+        every staple crossover that fits (see autostaple.stapleLayout).
+        The whole layout is computed up front and installed by a single
+        AutoStapleCommand.
+        """
         vhs = self.getVirtualHelices()
-        self.undoStack().beginMacro("Auto Staple")
-        for vh in vhs:
-            # Copy the scaffold strand's segments to the staple strand
-            vh.legacyClearStrand(StrandType.Staple, 1, vh.numBases()-1)
-            segments, ends3, ends5 = vh.getSegmentsAndEndpoints(StrandType.Scaffold)
-            for segStart, segEnd in segments:
-                vh.connectStrand(StrandType.Staple, segStart, segEnd)
-            for i in range(len(segments)-1):
-                segIEnd = segments[i][1]
-                if segIEnd + 1 == segments[i+1][0]:
-                    vh.connectStrand(StrandType.Staple, segIEnd, segIEnd + 1)
-        for vh in vhs:
-            # We only add crossovers for which vh will have the 3' end to
-            # avoid adding each crossover twice. We can do this by adding
-            # only crossovers that face left (or right) because all crossovers
-            # with 3' crossovers (or 5') will face either left or right
-            # on a given helix.
-            facingR = not vh.directionOfStrandIs5to3(StrandType.Staple)
-            pxovers = vh.potentialCrossoverList(facingR, StrandType.Staple)
-            for toVH, idx in pxovers:  # Loop through potential xovers
-                if vh.possibleNewCrossoverAt(StrandType.Staple, idx, toVH, idx):
-                    vh.installXoverFrom3To5(StrandType.Staple, idx, toVH, idx)
-        self.undoStack().endMacro()
+        with self.transaction("Auto Staple"):
+            self.undoStack().push(self.AutoStapleCommand(self, vhs))
+            for vh in vhs:
+                vh.thoughtPolice()
+
+    class AutoStapleCommand(QUndoCommand):
+        def __init__(self, dnapart, vhs):
+            super(DNAPart.AutoStapleCommand, self).__init__()
+            self._part = dnapart
+            self._vhs = vhs
+            # vh -> (staple strand snapshot, staple loops), see _snapshot
+            self._before = None
+            self._after = None
+            self._discarded = False  # See discardUndoData
+
+        def _snapshot(self):
+            st = StrandType.Staple
+            return dict((vh, (vh._strand(st).linkageSnapshot(),\
+                              dict(vh._loop(st)))) for vh in self._vhs)
+
+        def _restore(self, snapshots):
+            st = StrandType.Staple
+            for vh, (strandSnapshot, loops) in snapshots.iteritems():
+                vh._strand(st).restoreLinkageSnapshot(strandSnapshot)
+                oldLoops = vh._loop(st)
+                for idx in set(oldLoops).union(loops):
+                    if oldLoops.get(idx) != loops.get(idx):
+                        vh._setLoopAt(st, idx, loops.get(idx, 0))
+            self._emit()
+
+        def _emit(self):
+            for vh in self._vhs:
+                vh.setHasBeenModified()
+            if self._vhs:
+                self._vhs[0].emitBasesModifiedIfNeeded()
+
+        def redo(self):
+            if self._discarded:
+                return
+            self._before = self._snapshot()
+            if self._after != None:
+                self._restore(self._after)
+                return
+            st = StrandType.Staple
+            layout, emptied = stapleLayout(self._part, self._vhs)
+            for vh, columns in layout.iteritems():
+                vh._strand(st).replaceLinkage(*columns)
+            for vh, (first, last) in emptied.iteritems():
+                loops = vh._loop(st)
+                for idx in [i for i in loops if first <= i <= last]:
+                    vh._setLoopAt(st, idx, 0)
+                if first <= last:
+                    vh._strand(st).clearSequences(first, last)
+            colorOligos(self._vhs, st, self._part.palette())
+            # Redoing the command must restore these colors even if the
+            # palette has been shuffled in the meantime
+            self._after = self._snapshot()
+            self._emit()
+
+        def undo(self):
+            if self._discarded:
+                return
+            self._restore(self._before)
+
+        def undoMemory(self):
+            return snapshotMemory(self._before) + snapshotMemory(self._after)
+
+        def discardUndoData(self):
+            """Leaves undo and redo doing nothing (see UndoBudget)"""
+            self._before = self._after = None
+            self._discarded = True
 
     def autoDragAllBreakpoints(self):
         """Carryover from cadnano1. Shift+Alt+Click on activeslichandle tells
         all breakpoints to extend as far as possible."""
         vhs = self.getVirtualHelices()
-        self.undoStack().beginMacro("Auto-drag Scaffold(s)")
+        drags = []
         for vh in vhs:
-            vh.autoDragAllBreakpoints(StrandType.Scaffold)
-        self.undoStack().endMacro()
+            drags.extend((vh, idx, bound) for idx, bound in\
+                         vh.autoDragTargets(StrandType.Scaffold))
+        c = VirtualHelix.ExtendEndsCommand(StrandType.Scaffold, drags)
+        with self.transaction("Auto-drag Scaffold(s)"):
+            self.undoStack().push(c)
+            for vh in vhs:
+                vh.thoughtPolice()
     
     def indexOfRightmostNonemptyBase(self):
         """
@@ -338,30 +649,188 @@ class DNAPart(Part):
         side of the part (red left-facing arrow). This method
         returnes the new numBases that will effect that reduction.
         """
-        ret = -1
-        for vh in self.getVirtualHelices():
-            ret = max(ret, vh.indexOfRightmostNonemptyBase())
-        return ret
+        return self._occupancy.indexOfRightmostNonemptyBase()
 
-    ############################# VirtualHelix Private CRUD #############################
-    def _recalculateStrandLengths(self):
+    ############################# Sequences #############################
+    def applyScaffoldSequence(self, seqStr, undoable=True):
         """
-        Bases cache the length of the oligo they are in. This
-        method updates that cache."""
-        self.numTimesStrandLengthsRecalcd += 1
-        modifiedBases = self.basesModified
-        while modifiedBases:
-            b = modifiedBases.pop()
-            if b==None:
-                continue
-            basesConnectedToB = b._vhelix._basesConnectedTo(b._strandtype, b._n)
-            # Remove this strand from modifiedBases
-            modifiedBases.difference_update(basesConnectedToB)
-            lengthOfStrand = len(basesConnectedToB)
-            for baseInStrand in basesConnectedToB:
-                baseInStrand._strandLength = lengthOfStrand
-            b._strandLength = lengthOfStrand
+        Applies seqStr to every scaffold oligo in the receiver (each one
+        starting at its 5' end, see strandarray.applyScaffoldSequence) and
+        the complementary sequence to the staple bases across from them.
+        Undo restores a snapshot of the sequences taken beforehand.
+        """
+        c = self.ApplyScaffoldSequenceCommand(self, seqStr)
+        if undoable:
+            self.undoStack().push(c)
+        else:
+            c.redo()
+
+    class ApplyScaffoldSequenceCommand(QUndoCommand):
+        def __init__(self, dnapart, seqStr):
+            super(DNAPart.ApplyScaffoldSequenceCommand, self).__init__()
+            self._part = dnapart
+            self._seqStr = seqStr
+            self._snapshots = None
+            self._discarded = False  # See discardUndoData
+
+        def redo(self):
+            if self._discarded:
+                return
+            vhs = sorted(self._part.getVirtualHelices(),\
+                         key=lambda vh: vh.number())
+            # Both strands of every helix that gets written, one byte
+            # per base
+            self._snapshots = [(vh, vh._scaffoldBases.sequenceSnapshot(),\
+                                vh._stapleBases.sequenceSnapshot())\
+                               for vh in vhs]
+            touched = applyScaffoldSequence(vhs, self._seqStr)
+            self._snapshots = [snap for snap in self._snapshots\
+                               if snap[0] in touched]
+            for vh in touched:
+                vh.setHasBeenModified()
+            if touched:
+                touched[0].emitBasesModifiedIfNeeded()
+
+        def undo(self):
+            if self._discarded:
+                return
+            for vh, scafSnapshot, stapSnapshot in self._snapshots:
+                vh._scaffoldBases.restoreSequenceSnapshot(scafSnapshot)
+                vh._stapleBases.restoreSequenceSnapshot(stapSnapshot)
+                vh.setHasBeenModified()
+            if self._snapshots:
+                self._snapshots[0][0].emitBasesModifiedIfNeeded()
+            self._snapshots = None
+
+        def undoMemory(self):
+            return snapshotMemory(self._snapshots)
+
+        def discardUndoData(self):
+            """Leaves undo and redo doing nothing (see UndoBudget)"""
+            self._snapshots = None
+            self._discarded = True
+
+    ############################# Transactions #############################
+    @contextmanager
+    def transaction(self, description, undoable=True):
+        """
+        with part.transaction("Auto Staple"):
+            (any number of edits to the receiver's helices)
+
+        Everything pushed onto the undo stack inside the block becomes one
+        undo entry named description. thoughtPolice is deferred until the
+        block ends and then runs once per helix that asked for it, and
+        basesModified (and xoversChanged) are queued once per modified
+        helix at the end instead of after every edit (see
+        flushNotifications); undoing or redoing the entry does the same.
+        Transactions nest: only the outermost one counts. Pass
+        undoable=False for blocks made only of undoable=False edits (the
+        legacy importer), which shouldn't leave an entry on the undo
+        stack.
+        """
+        outermost = self._transactionDepth == 0
+        undoStack = self.undoStack() if undoable and outermost else None
+        if undoStack != None:
+            undoStack.beginMacro(description)
+            undoStack.push(self.BatchNotificationsCommand(self, True))
+        else:
+            self._beginBatchNotifications()
+        try:
+            yield
+            if outermost:
+                self._policeTransaction()
+        finally:
+            if undoStack != None:
+                undoStack.push(self.BatchNotificationsCommand(self, False))
+                undoStack.endMacro()
+            else:
+                self._endBatchNotifications()
+
+    def isInTransaction(self):
+        return self._transactionDepth > 0
+
+    def _deferThoughtPolice(self, vh):
+        """Called by VirtualHelix.thoughtPolice. Returns True if vh will
+        be policed when the current transaction ends (or when the
+        preview being shown is committed)."""
+        if self._preview != None:
+            self._preview._deferThoughtPolice(vh)
+            return True
+        if self._transactionDepth == 0:
+            return False
+        self._transactionPoliceVHs.add(vh)
+        return True
+
+    def _policeTransaction(self):
+        # Fixes don't ask to be policed again (police=False), so this
+        # visits every helix once
+        while self._transactionPoliceVHs:
+            vhs = sorted(self._transactionPoliceVHs, key=lambda vh: vh.number())
+            self._transactionPoliceVHs.clear()
+            for vh in vhs:
+                vh._policeDirtyRanges()
+
+    def _beginBatchNotifications(self):
+        self._transactionDepth += 1
+
+    def _endBatchNotifications(self):
+        self._transactionDepth -= 1
+        if self._transactionDepth == 0:
+            self._transactionPoliceVHs.clear()
+            self._scheduleNotifications()
 
+    ############################# Notifications #############################
+    def _scheduleNotifications(self):
+        """Called by VirtualHelix.emitBasesModifiedIfNeeded. Arranges for
+        flushNotifications to run once control gets back to the event
+        loop, unless a transaction or a preview is holding notifications
+        back."""
+        if self._transactionDepth > 0 or self._preview != None:
+            return
+        if not self.deferNotifications:
+            self.flushNotifications()
+        elif not self._notificationTimer.isActive():
+            self._notificationTimer.start()
+
+    def flushNotifications(self):
+        """Emits basesModified once on every helix marked by
+        VirtualHelix.setHasBeenModified since the last flush and hands
+        the crossover registry's changes to xoversChanged. Runs by itself
+        from the event loop; scripts and tests that need the signals
+        right away can call it directly."""
+        self._notificationTimer.stop()
+        vhs = list(self.basesModifiedVHs)
+        self.basesModifiedVHs.clear()
+        for vh in vhs:
+            vh._emitBasesModified()
+        self._xoverRegistry.flush()
+
+    class BatchNotificationsCommand(QUndoCommand):
+        """
+        Pushed at both ends of a transaction's undo macro so that undoing
+        and redoing the macro batch notifications the same way running
+        the transaction did. The opening command starts the batch on redo
+        and ends it on undo (which, in a macro, runs last); the closing
+        command does the reverse.
+        """
+        def __init__(self, dnapart, opening):
+            super(DNAPart.BatchNotificationsCommand, self).__init__()
+            self._part = dnapart
+            self._opening = opening
+
+        def redo(self):
+            if self._opening:
+                self._part._beginBatchNotifications()
+            else:
+                self._part._endBatchNotifications()
+
+        def undo(self):
+            if self._opening:
+                self._part._endBatchNotifications()
+            else:
+                self._part._beginBatchNotifications()
+
+    ############################# VirtualHelix Private CRUD #############################
     class AddHelixCommand(QUndoCommand):
         """
         Adds a helix to dnapart. Called by self.addVirtualHelixAt().
@@ -376,26 +845,71 @@ class DNAPart(Part):
 
         def redo(self, actuallyUndo=False):
             if self._vhelix:
-                newID = self._part.reserveHelixIDNumber(
-                                            parityEven=self._parity,\
-                                            requestedIDnum=self._requestedNum)
-                self._vhelix._setPart(self._part, self._coords, newID)
-                self._vhelix.basesModified.connect(self._part.persistentDataChangedEvent)
-                self._part._numberToVirtualHelix[newID] = self._vhelix
-                self._part._coordToVirtualHelix[self._coords] = self._vhelix
+                self._part._insertHelix(self._coords, self._vhelix,\
+                                        self._parity, self._requestedNum)
+                self._part.flushNotifications()
             self._part.virtualHelixAtCoordsChanged.emit(self._coords[0],\
                                                         self._coords[1])
 
         def undo(self):
-            vh = self._part.getVirtualHelix(self._coords)
-            if vh:
-                vh.basesModified.disconnect(self._part.persistentDataChangedEvent)
-                del self._part._coordToVirtualHelix[vh.coord()]
-                del self._part._numberToVirtualHelix[vh.number()]
-                self._part.recycleHelixIDNumber(vh.number())
+            self._part._removeHelixAt(self._coords)
             self._part.virtualHelixAtCoordsChanged.emit(self._coords[0],\
                                                         self._coords[1])
 
+    class AddHelicesCommand(QUndoCommand):
+        """
+        Adds a list of helices to dnapart, emitting one
+        virtualHelicesAtCoordsChanged. Called by
+        self.addVirtualHelicesAt().
+        """
+        def __init__(self, dnapart, helices):
+            super(DNAPart.AddHelicesCommand, self).__init__()
+            self._part = dnapart
+            self._helices = [(tuple(coords), vh, num,\
+                              dnapart.coordinateParityEven(coords))\
+                             for coords, vh, num in helices]
+
+        def redo(self):
+            for coords, vh, num, parity in self._helices:
+                if vh:
+                    self._part._insertHelix(coords, vh, parity, num)
+            self._part.flushNotifications()
+            self._part.virtualHelicesAtCoordsChanged.emit(\
+                                    [h[0] for h in self._helices])
+
+        def undo(self):
+            for coords, vh, num, parity in reversed(self._helices):
+                self._part._removeHelixAt(coords)
+            self._part.virtualHelicesAtCoordsChanged.emit(\
+                                    [h[0] for h in self._helices])
+
+    def _insertHelix(self, coords, vh, parityEven, requestedNum):
+        """The model side of adding vh at coords (see AddHelixCommand)"""
+        newID = self.reserveHelixIDNumber(parityEven=parityEven,\
+                                          requestedIDnum=requestedNum)
+        vh._setPart(self, coords, newID)
+        self._occupancy.addHelix(vh)
+        vh.basesModified.connect(self.persistentDataChangedEvent)
+        self._numberToVirtualHelix[newID] = vh
+        self._coordToVirtualHelix[coords] = vh
+        self._updateNeighborTable(coords)
+
+    def _removeHelixAt(self, coords):
+        """Undoes _insertHelix for the helix at coords, if any"""
+        vh = self.getVirtualHelix(coords)
+        if vh:
+            vh.basesModified.disconnect(self.persistentDataChangedEvent)
+            self._xoverRegistry.removeHelix(vh)
+            self._occupancy.removeHelix(vh)
+            vh._setOligoIndex(None)
+            self.flushNotifications()
+            del self._coordToVirtualHelix[vh.coord()]
+            del self._neighbors[vh]
+            del self._neighborsVersions[vh]
+            self._updateNeighborTable(vh.coord())
+            del self._numberToVirtualHelix[vh.number()]
+            self.recycleHelixIDNumber(vh.number())
+
 
     class RenumberHelixCommand(QUndoCommand):
         def __init__(self, dnapart, coords, newNumber):
@@ -564,6 +1078,17 @@ class DNAPart(Part):
     def selectAll(self, *args, **kwargs):
         self.setSelection(self.getVirtualHelices())
 
+    def updateSelectionFromVHsChange(self, coordsList):
+        """updateSelectionFromVHChange for a batch of coords, with a single
+        setSelection"""
+        coords = set(tuple(c) for c in coordsList)
+        s = [vh for vh in self.selection() if vh.coord() not in coords]
+        for coord in coordsList:
+            vh = self.getVirtualHelix(tuple(coord))
+            if vh:
+                s.append(vh)
+        self.setSelection(s)
+
     def updateSelectionFromVHChange(self, row, col):
         coord = (row, col)
         vh = self.getVirtualHelix(coord)
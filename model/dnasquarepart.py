@@ -33,6 +33,9 @@ class DNASquarePart(DNAPart):
     stapR = Crossovers.squareStapRight
     _activeSlice = step
     _majorGridLine = step/4
+    # (row, col) offsets of the neighbors in directions p0, p1, p2, p3
+    _neighborOffsetsEven = ((0, 1), (1, 0), (0, -1), (-1, 0))
+    _neighborOffsetsOdd = ((0, -1), (-1, 0), (0, 1), (1, 0))
 
     def crossSectionType(self):
         return LatticeType.Square
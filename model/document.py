@@ -28,10 +28,13 @@ Created by Jonathan deWerd on 2011-01-26.
 """
 
 import json
+import os
+from cadnano import ignoreEnv
 from views import styles
 from .dnahoneycombpart import DNAHoneycombPart
 from .dnasquarepart import DNASquarePart
 from .enum import LatticeType
+from .undodelta import UndoBudget
 
 import util
 # import Qt stuff into the module namespace with PySide, PyQt4 independence
@@ -39,11 +42,21 @@ util.qtWrapImport('QtCore', globals(), ['pyqtSignal', 'QObject'])
 util.qtWrapImport('QtGui', globals(), [ 'QUndoCommand'])
 
 class Document(QObject):
+    # Bytes of undo history kept before the oldest commands lose their
+    # undo data (see UndoBudget)
+    undoMemoryBudget = 256 * 1024 * 1024
+    if os.environ.get('CADNANO_UNDO_BUDGET_MB', False) and not ignoreEnv():
+        undoMemoryBudget = int(os.environ['CADNANO_UNDO_BUDGET_MB']) * 1024 * 1024
+
+    # Approximate bytes held by the undo history
+    undoMemoryUseChanged = pyqtSignal(object)
+
     def __init__(self, incompleteArchivedDict=None):
         super(Document, self).__init__()
         self._parts = []
         self._selectedPart = None
         self._controller = None
+        self._undoBudget = None
     
     def fsck(self):
         for p in self._parts:
@@ -54,6 +67,26 @@ class Document(QObject):
 
     def setController(self, cont):
         self._controller = cont
+        undoStack = self.undoStack()
+        if undoStack != None:
+            self._undoBudget = UndoBudget(undoStack, self.undoMemoryBudget)
+            self._undoBudget.memoryUseChanged.connect(\
+                                            self.undoMemoryUseChanged.emit)
+        else:
+            self._undoBudget = None
+
+    def undoMemoryUse(self):
+        """Approximate bytes held by the commands on the undo stack"""
+        if self._undoBudget == None:
+            return 0
+        return self._undoBudget.memoryUse()
+
+    def setUndoMemoryBudget(self, budget):
+        """Caps the undo history at about budget bytes by dropping the
+        oldest undo steps"""
+        self.undoMemoryBudget = budget
+        if self._undoBudget != None:
+            self._undoBudget.setBudget(budget)
 
     def addDnaHoneycombPart(self):
         """
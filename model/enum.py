@@ -65,3 +65,19 @@ class HandleOrient:
     RightUp = 1
     LeftDown = 2
     RightDown = 3
+
+
+class BaseFlags:
+    """Bits of the per-base flag byte cached by StrandArray. RAW* mirror
+    the phosphate linkage itself and HAS* are set along with them (the
+    neighbor predicates of Base read HAS*), NAT* mean connected to the
+    adjacent base on the same strand (L and R being directions in the
+    GUI)."""
+    Raw5p = 1
+    Raw3p = 2
+    Has5p = 4
+    Has3p = 8
+    Nat5p = 16
+    Nat3p = 32
+    NatL = 64
+    NatR = 128
@@ -70,45 +70,49 @@ def doc_from_legacy_dict(obj):
     #self.addVirtualHelixAt(coord, vh, requestSpecificIdnum=num, noUndo=True)
     numBases = len(obj['vstrands'][0]['scaf'])
     part.setDimensions((30, 32, numBases))
+    helices = []
     for helix in obj['vstrands']:
         row = helix['row']
         col = helix['col']
         scaf= helix['scaf']
         vh = VirtualHelix(numBases=len(scaf), idnum=helix['num'])
-        part.addVirtualHelixAt((row,col), vh, requestSpecificIdnum=helix['num'], noUndo=True)
-    helixNo, numHelixes = -1, len(obj['vstrands'])
-    for helix in obj['vstrands']:
-        helixNo += 1
-        # print "helix %i/%i (%i%%)"%(helixNo, numHelixes, helixNo*100/numHelixes)
-        vh = part.getVirtualHelix(helix['num'])
-        scaf = helix['scaf']
-        stap = helix['stap']
-        loops = helix['loop']
-        skips = helix['skip']
-        assert(len(scaf)==len(stap) and len(stap)==vh.numBases() and\
-               len(scaf)==len(loops) and len(loops)==len(skips))
-        for i in range(len(scaf)):
-            fiveVH, fiveIdx, threeVH, threeIdx = scaf[i]
-            threeVH = part.getVirtualHelix(threeVH)
-            # Installing an Xover works on the same strand
-            # as well (there is nothing inherently different
-            # between an Xover and a same-strand linkage
-            # in our current model)
-            if threeVH==-1 or threeIdx==-1:
-                continue
+        helices.append(((row,col), vh, helix['num']))
+    part.addVirtualHelicesAt(helices, noUndo=True)
+    # One basesModified per helix rather than one per linkage
+    with part.transaction("Import", undoable=False):
+        helixNo, numHelixes = -1, len(obj['vstrands'])
+        for helix in obj['vstrands']:
+            helixNo += 1
+            # print "helix %i/%i (%i%%)"%(helixNo, numHelixes, helixNo*100/numHelixes)
+            vh = part.getVirtualHelix(helix['num'])
+            scaf = helix['scaf']
+            stap = helix['stap']
+            loops = helix['loop']
+            skips = helix['skip']
+            assert(len(scaf)==len(stap) and len(stap)==vh.numBases() and\
+                   len(scaf)==len(loops) and len(loops)==len(skips))
+            for i in range(len(scaf)):
+                fiveVH, fiveIdx, threeVH, threeIdx = scaf[i]
+                threeVH = part.getVirtualHelix(threeVH)
+                # Installing an Xover works on the same strand
+                # as well (there is nothing inherently different
+                # between an Xover and a same-strand linkage
+                # in our current model)
+                if threeVH==-1 or threeIdx==-1:
+                    continue
             
-            vh.installXoverFrom3To5(StrandType.Scaffold, i, threeVH, threeIdx, undoable=False, speedy=True)
-        for i in range(len(stap)):
-            fiveVH, fiveIdx, threeVH, threeIdx = stap[i]
-            threeVH = part.getVirtualHelix(threeVH)
-            if threeVH==-1 or threeIdx==-1:
-                continue
-            vh.installXoverFrom3To5(StrandType.Staple, i, threeVH, threeIdx, undoable=False, speedy=True)
-        for baseIdx, colorNumber in helix['stap_colors']:
-            color = QColor((colorNumber>>16)&0xFF, (colorNumber>>8)&0xFF, colorNumber&0xFF)
-            vh.applyColorAt(color, StrandType.Staple, baseIdx, undoable=False)
-        for i in range(len(stap)):
-            combinedLoopSkipAmount = loops[i] + skips[i]
-            if combinedLoopSkipAmount != 0:
-                vh.installLoop(StrandType.Scaffold, i, combinedLoopSkipAmount, undoable=False)
+                vh.installXoverFrom3To5(StrandType.Scaffold, i, threeVH, threeIdx, undoable=False, speedy=True)
+            for i in range(len(stap)):
+                fiveVH, fiveIdx, threeVH, threeIdx = stap[i]
+                threeVH = part.getVirtualHelix(threeVH)
+                if threeVH==-1 or threeIdx==-1:
+                    continue
+                vh.installXoverFrom3To5(StrandType.Staple, i, threeVH, threeIdx, undoable=False, speedy=True)
+            for baseIdx, colorNumber in helix['stap_colors']:
+                color = QColor((colorNumber>>16)&0xFF, (colorNumber>>8)&0xFF, colorNumber&0xFF)
+                vh.applyColorAt(color, StrandType.Staple, baseIdx, undoable=False)
+            for i in range(len(stap)):
+                combinedLoopSkipAmount = loops[i] + skips[i]
+                if combinedLoopSkipAmount != 0:
+                    vh.installLoop(StrandType.Scaffold, i, combinedLoopSkipAmount, undoable=False)
     return doc
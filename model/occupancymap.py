@@ -0,0 +1,134 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+occupancymap.py
+Created by Shawn Douglas on 2011-06-02.
+
+Which bases of a DNAPart are occupied, as a helices x bases bitmap per
+strand, kept up to date by the StrandArrays of its helices as linkages
+change (the way they keep the XoverRegistry current).
+
+Each helix of the part gets a bit, and each base index a column: a
+python int whose bit b is set when base index of the helix with bit b
+isn't empty. The helices whose occupancy differs between two slices are
+then the bits of one XOR of two columns, which is what the slice view
+needs while the active slice is being dragged.
+"""
+
+from array import array
+from .enum import StrandType
+from .strandarray import _setMembership
+
+
+class OccupancyMap(object):
+    def __init__(self, part):
+        super(OccupancyMap, self).__init__()
+        self._part = part
+        self._bitOfHelix = {}  # vh -> bit
+        self._helixOfBit = []  # bit -> vh (None for a free bit)
+        self._freeBits = []
+        # strandType -> column (see module docstring) of each base index
+        self._columns = {StrandType.Scaffold: [], StrandType.Staple: []}
+        # Sorted indices whose column is nonzero on either strand
+        self._occupiedIdx = array('i')
+
+    ############################## Access ###############################
+    def helicesChangedBetween(self, strandType, idxA, idxB):
+        """Helices that have a base at one of the indices idxA and idxB on
+        strandType but not at the other"""
+        col = self._columns[strandType]
+        a = col[idxA] if 0 <= idxA < len(col) else 0
+        b = col[idxB] if 0 <= idxB < len(col) else 0
+        return self._helicesOf(a ^ b)
+
+    def helicesOccupiedAt(self, strandType, idx):
+        """Helices that have a base at idx on strandType"""
+        col = self._columns[strandType]
+        return self._helicesOf(col[idx] if 0 <= idx < len(col) else 0)
+
+    def indexOfRightmostNonemptyBase(self):
+        """The highest index at which any helix has a base, or -1"""
+        if not self._occupiedIdx:
+            return -1
+        return self._occupiedIdx[-1]
+
+    def _helicesOf(self, bits):
+        ret = []
+        helixOfBit = self._helixOfBit
+        while bits:
+            low = bits & -bits
+            ret.append(helixOfBit[low.bit_length() - 1])
+            bits ^= low
+        return ret
+
+    ############################## Update ###############################
+    def addHelix(self, vh):
+        """Gives vh (which just joined the part) a bit and marks its
+        nonempty bases"""
+        if vh in self._bitOfHelix:
+            return
+        if self._freeBits:
+            bit = self._freeBits.pop()
+            self._helixOfBit[bit] = vh
+        else:
+            bit = len(self._helixOfBit)
+            self._helixOfBit.append(vh)
+        self._bitOfHelix[vh] = bit
+        for strandType in (StrandType.Scaffold, StrandType.Staple):
+            for idx in vh._strand(strandType)._nonemptyIdx:
+                self.setOccupied(vh, strandType, idx, True)
+
+    def removeHelix(self, vh):
+        """Clears vh's bit everywhere (vh is leaving the part)"""
+        bit = self._bitOfHelix.get(vh)
+        if bit == None:
+            return
+        mask = 1 << bit
+        for strandType, col in self._columns.iteritems():
+            for idx in xrange(len(col)):
+                if col[idx] & mask:
+                    self.setOccupied(vh, strandType, idx, False)
+        del self._bitOfHelix[vh]
+        self._helixOfBit[bit] = None
+        self._freeBits.append(bit)
+
+    def setOccupied(self, vh, strandType, idx, occupied):
+        """Records whether base idx of vh on strandType is nonempty"""
+        bit = self._bitOfHelix.get(vh)
+        if bit == None:
+            return  # Not (or no longer) in the part
+        scaf = self._columns[StrandType.Scaffold]
+        if idx >= len(scaf):
+            if not occupied:
+                return
+            for col in self._columns.itervalues():
+                col.extend([0] * (idx + 1 - len(col)))
+        col = self._columns[strandType]
+        if occupied:
+            col[idx] |= 1 << bit
+        else:
+            col[idx] &= ~(1 << bit)
+        stap = self._columns[StrandType.Staple]
+        _setMembership(self._occupiedIdx, idx, scaf[idx] or stap[idx])
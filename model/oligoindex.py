@@ -0,0 +1,299 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+oligoindex.py
+Created by Shawn Douglas on 2011-05-04.
+
+Keeps every oligo (a maximal chain of bases joined by 3' linkages) as an
+implicit treap ordered 5' -> 3', so that joining two oligos or cutting
+one in two is O(log n) and so are the oligo length, the 5' end and the
+rank of a base within its oligo.
+
+Each DNAPart has an OligoIndex covering the helices in it, and a helix
+that isn't in a part has one of its own (see VirtualHelix._oligoIndex).
+Nodes are plain ints (StrandArray packs (helix, strand, index) into one).
+The tree links live in sparse dicts: a base that isn't linked to
+anything is a singleton tree and has no entries at all. Circular oligos
+are stored as a sequence starting at an arbitrary base, and their root
+is listed in _cyclic.
+
+Only StrandArray should call into this module. If an index is handed a
+link that doesn't fit its current state (e.g. while setConnectsFromString
+is rewriting a helix one half-linkage at a time) it marks itself dirty,
+ignores further edits and is rebuilt from the linkage arrays of its own
+helices by the next query.
+"""
+
+from random import Random
+prng = Random()
+
+
+class OligoIndex(object):
+    def __init__(self):
+        super(OligoIndex, self).__init__()
+        self._left = {}
+        self._right = {}
+        self._parent = {}
+        self._size = {}
+        self._prio = {}
+        self._cyclic = set()
+        self._dirty = False
+        # Storage ids (see strandarray.helixForStorageId) of the helices
+        # whose linkages the index is rebuilt from
+        self._helixIds = set()
+
+    ############################ Helices ################################
+    def helixIds(self):
+        return self._helixIds
+
+    def addHelix(self, helixId):
+        self._helixIds.add(helixId)
+        self.invalidate()
+
+    def removeHelix(self, helixId):
+        """Forgets a helix; its nodes (and their priorities) are dropped
+        by the rebuild that the next query does"""
+        self._helixIds.discard(helixId)
+        self.invalidate()
+
+    ######################### Treap primitives ##########################
+    def _sz(self, n):
+        if n == None:
+            return 0
+        return self._size.get(n, 1)
+
+    def _priority(self, n):
+        p = self._prio.get(n)
+        if p == None:
+            p = self._prio[n] = prng.random()
+        return p
+
+    def _setLeft(self, n, child):
+        if child == None:
+            self._left.pop(n, None)
+        else:
+            self._left[n] = child
+            self._parent[child] = n
+
+    def _setRight(self, n, child):
+        if child == None:
+            self._right.pop(n, None)
+        else:
+            self._right[n] = child
+            self._parent[child] = n
+
+    def _pull(self, n):
+        s = 1 + self._sz(self._left.get(n)) + self._sz(self._right.get(n))
+        if s == 1:
+            self._size.pop(n, None)
+        else:
+            self._size[n] = s
+
+    def _merge(self, a, b):
+        """Concatenates the sequences rooted at a and b"""
+        if a == None:
+            return b
+        if b == None:
+            return a
+        if self._priority(a) > self._priority(b):
+            self._setRight(a, self._merge(self._right.get(a), b))
+            self._pull(a)
+            return a
+        self._setLeft(b, self._merge(a, self._left.get(b)))
+        self._pull(b)
+        return b
+
+    def _split(self, t, k):
+        """Splits the sequence rooted at t into its first k nodes and the
+        rest. Returns the two roots."""
+        if t == None:
+            return (None, None)
+        l = self._left.get(t)
+        ls = self._sz(l)
+        if k <= ls:
+            a, b = self._split(l, k)
+            self._setLeft(t, b)
+            self._pull(t)
+            return (a, t)
+        a, b = self._split(self._right.get(t), k - ls - 1)
+        self._setRight(t, a)
+        self._pull(t)
+        return (t, b)
+
+    def _detach(self, root):
+        if root != None:
+            self._parent.pop(root, None)
+        return root
+
+    def root(self, n):
+        p = self._parent.get(n)
+        while p != None:
+            n = p
+            p = self._parent.get(n)
+        return n
+
+    def rank(self, n):
+        """Position of n within its sequence (0 for the first node)"""
+        r = self._sz(self._left.get(n))
+        p = self._parent.get(n)
+        while p != None:
+            if self._right.get(p) == n:
+                r += self._sz(self._left.get(p)) + 1
+            n = p
+            p = self._parent.get(n)
+        return r
+
+    def size(self, n):
+        return self._sz(self.root(n))
+
+    def first(self, n):
+        n = self.root(n)
+        l = self._left.get(n)
+        while l != None:
+            n = l
+            l = self._left.get(n)
+        return n
+
+    def isCyclic(self, n):
+        return self.root(n) in self._cyclic
+
+    def nodes(self, n):
+        """All the nodes in n's sequence, in order"""
+        ret, stack = [], []
+        t = self.root(n)
+        while stack or t != None:
+            while t != None:
+                stack.append(t)
+                t = self._left.get(t)
+            t = stack.pop()
+            ret.append(t)
+            t = self._right.get(t)
+        return ret
+
+    ######################## Incremental updates ########################
+    def isDirty(self):
+        return self._dirty
+
+    def invalidate(self):
+        """Stop tracking edits; the next query rebuilds the whole index"""
+        self._dirty = True
+
+    def link(self, a, b):
+        """b becomes the 3' neighbor of a"""
+        if self._dirty:
+            return
+        ra, rb = self.root(a), self.root(b)
+        if ra in self._cyclic or rb in self._cyclic or\
+           self.rank(a) != self._sz(ra) - 1 or self.rank(b) != 0:
+            self.invalidate()
+            return
+        if ra == rb:
+            self._cyclic.add(ra)
+        else:
+            self._detach(self._merge(ra, rb))
+
+    def cut(self, a, b):
+        """b stops being the 3' neighbor of a"""
+        if self._dirty:
+            return
+        r = self.root(a)
+        if self.root(b) != r:
+            self.invalidate()
+            return
+        ia, ib, n = self.rank(a), self.rank(b), self._sz(r)
+        if r in self._cyclic:
+            if ib != (ia + 1) % n:
+                self.invalidate()
+                return
+            self._cyclic.discard(r)
+            if ib != 0:
+                # Rotate so that b leads and a trails
+                lhs, rhs = self._split(r, ib)
+                self._detach(self._merge(self._detach(rhs),\
+                                         self._detach(lhs)))
+        else:
+            if ib != ia + 1:
+                self.invalidate()
+                return
+            lhs, rhs = self._split(r, ib)
+            self._detach(lhs)
+            self._detach(rhs)
+
+    ############################## Rebuild ##############################
+    def _build(self, seq):
+        """Builds a treap over seq (a list of nodes) in O(len(seq)) using
+        the stack construction of a Cartesian tree. Returns the root."""
+        stack = []
+        for n in seq:
+            p = self._priority(n)
+            last = None
+            while stack and self._priority(stack[-1]) < p:
+                last = stack.pop()
+            self._setLeft(n, last)
+            if stack:
+                self._setRight(stack[-1], n)
+            stack.append(n)
+        r = stack[0]
+        # Sizes, children before parents
+        order, todo = [], [r]
+        while todo:
+            n = todo.pop()
+            order.append(n)
+            for c in (self._left.get(n), self._right.get(n)):
+                if c != None:
+                    todo.append(c)
+        for n in reversed(order):
+            self._pull(n)
+        return self._detach(r)
+
+    def rebuild(self, links):
+        """links is an iterable of (a, b) pairs meaning b is the 3'
+        neighbor of a. Discards the current state (priorities included)
+        and indexes exactly those links."""
+        for d in (self._left, self._right, self._parent, self._size,\
+                  self._prio):
+            d.clear()
+        self._cyclic.clear()
+        succ = dict(links)
+        heads = set(succ)
+        heads.difference_update(succ.itervalues())
+        # A malformed linkage graph (two bases claiming the same 3'
+        # neighbor) can't be indexed faithfully; each base joins the first
+        # chain that reaches it and chains stop there rather than looping.
+        visited = set()
+        for h in sorted(heads) + sorted(succ):
+            if h in visited:
+                continue
+            seq = [h]
+            visited.add(h)
+            n = succ.get(h)
+            while n != None and n not in visited:
+                seq.append(n)
+                visited.add(n)
+                n = succ.get(n)
+            r = self._build(seq)
+            if n == h:
+                self._cyclic.add(r)
+        self._dirty = False
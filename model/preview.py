@@ -0,0 +1,131 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+preview.py
+Created by Nick Conway on 2011-05-30.
+
+Live previews of the edits path tools drag out.
+
+    preview = Preview(part)
+    preview.show(lambda: vh.connectStrand(StrandType.Staple, 3, idx))
+    ...  # (show again as the mouse moves)
+    preview.commit()  # or preview.clear()
+
+While show runs its edit, the helices of part hand out the preview in
+place of their undo stack, so the edit's commands land in the preview
+instead of on the document's undo stack. Showing another edit first
+undoes the commands of the last one. thoughtPolice is put off until
+commit and the edits don't emit basesModified; instead every helix
+whose bases differ from what the last show left behind emits
+basesPreviewed(strandType, lo, hi) for each changed run, so views only
+redraw the bases the drag changed. commit pushes the shown commands
+onto the undo stack as one macro, polices the helices they touched and
+notifies views as any other edit would.
+"""
+
+from .undodelta import UndoDelta
+
+
+class Preview(object):
+    def __init__(self, part):
+        super(Preview, self).__init__()
+        self._part = part
+        self._commands = []  # The commands of the edit being shown
+        self._description = None
+        self._macroDepth = 0
+        self._policeVHs = set()
+
+    def part(self):
+        return self._part
+
+    def isEmpty(self):
+        return not self._commands
+
+    def show(self, edit):
+        """Replaces whatever the receiver shows with the effect of
+        edit(), a callable making (undoable) edits to the part"""
+        part = self._part
+        pending = set(part.basesModifiedVHs)
+        changes = UndoDelta()
+        with changes:
+            self._revert()
+            if edit != None:
+                part._preview = self
+                try:
+                    edit()
+                finally:
+                    part._preview = None
+        # Bases modified by the preview are reported below; those that
+        # were waiting for basesModified before it keep waiting
+        part.basesModifiedVHs.intersection_update(pending)
+        part._scheduleNotifications()  # xoversChanged
+        for vh, strandType, lo, hi in changes.ranges():
+            vh.basesPreviewed.emit(strandType, lo, hi)
+
+    def clear(self):
+        """Takes back whatever the receiver shows"""
+        self.show(None)
+
+    def commit(self):
+        """Makes the edit the receiver shows one entry on the undo stack
+        and leaves the receiver empty"""
+        commands, policeVHs = self._commands, self._policeVHs
+        self._commands, self._policeVHs = [], set()
+        if not commands:
+            return
+        undoStack = self._part.undoStack()
+        undoStack.beginMacro(self._description)
+        # The commands have been applied already; redoing them (which
+        # push does) writes their deltas again and notifies views
+        for c in commands:
+            undoStack.push(c)
+        for vh in sorted(policeVHs, key=lambda vh: vh.number()):
+            vh.thoughtPolice()
+        undoStack.endMacro()
+
+    def _revert(self):
+        for c in reversed(self._commands):
+            c.undo()
+        self._commands = []
+        self._description = None
+        self._policeVHs = set()
+
+    def _deferThoughtPolice(self, vh):
+        """Called through DNAPart._deferThoughtPolice while the receiver
+        is showing an edit"""
+        self._policeVHs.add(vh)
+
+    ############ The part of the QUndoStack interface edits use ############
+    def beginMacro(self, text):
+        if self._macroDepth == 0 and self._description == None:
+            self._description = text
+        self._macroDepth += 1
+
+    def endMacro(self):
+        self._macroDepth -= 1
+
+    def push(self, command):
+        command.redo()
+        self._commands.append(command)
@@ -0,0 +1,930 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+strandarray.py
+Created by Shawn Douglas on 2011-05-02.
+
+Columnar storage for the bases of one strand of a VirtualHelix. Instead
+of one Base object per base, a StrandArray keeps parallel typed arrays
+(5' and 3' targets as (helix, index) pairs, a color index, a sequence
+byte and a byte of cached flags). Base objects are thin views that are
+created on demand by indexing into a StrandArray.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from weakref import ref
+from .enum import BaseFlags, StrandType
+from .base import Base
+
+import util
+# import Qt stuff into the module namespace with PySide, PyQt4 independence
+util.qtWrapImport('QtGui', globals(), ['QColor'])
+
+RAW5P, RAW3P = BaseFlags.Raw5p, BaseFlags.Raw3p
+HAS5P, HAS3P = BaseFlags.Has5p, BaseFlags.Has3p
+NAT5P, NAT3P = BaseFlags.Nat5p, BaseFlags.Nat3p
+NATL, NATR = BaseFlags.NatL, BaseFlags.NatR
+NO_HELIX = -1
+
+########################## Helix storage ids ############################
+# Linkages are stored as (helix storage id, index) pairs so that they
+# survive renumbering. The registry holds weak references so it doesn't
+# keep deleted helices alive, and drops the entry of a helix once it has
+# been collected.
+_helixRegistry = {}
+_nextStorageId = [0]
+
+def registerHelix(vhelix):
+    storageId = _nextStorageId[0]
+    _nextStorageId[0] += 1
+    def forget(r):
+        _helixRegistry.pop(storageId, None)
+    _helixRegistry[storageId] = ref(vhelix, forget)
+    return storageId
+
+def helixForStorageId(storageId):
+    r = _helixRegistry.get(storageId)
+    if r == None:
+        return None
+    return r()
+
+############################ Undo recording #############################
+# The UndoDeltas (see undodelta.py) that are currently recording. The
+# per-base _set* methods of StrandArray hand each base to them before
+# changing it.
+_recorders = []
+
+########################### Oligo index nodes ###########################
+# An OligoIndex identifies a base by a single int packing its helix storage
+# id, strand type and index.
+_NODE_IDX_BITS = 20
+_NODE_IDX_MASK = (1 << _NODE_IDX_BITS) - 1
+
+def _nodeBase(helixId, strandtype):
+    return ((helixId << 1) | strandtype) << _NODE_IDX_BITS
+
+def _baseForNode(node):
+    key = node >> _NODE_IDX_BITS
+    return Base(helixForStorageId(key >> 1), key & 1, node & _NODE_IDX_MASK)
+
+def _threePrimeLinks(index):
+    """Yields (node, 3' node) for every 3' linkage leaving the helices of
+    index (the linkages an OligoIndex knows about)"""
+    for helixId in list(index.helixIds()):
+        vh = helixForStorageId(helixId)
+        if vh == None:
+            continue
+        for strand in (vh._scaffoldBases, vh._stapleBases):
+            fromBase = strand._node
+            threeHelix, threeIdx = strand._threeHelix, strand._threeIdx
+            st = strand._strandtype
+            for i in xrange(len(threeHelix)):
+                h = threeHelix[i]
+                if h != NO_HELIX:
+                    yield (fromBase | i, _nodeBase(h, st) | threeIdx[i])
+
+def _sharedOligoIndex(vhA, vhB):
+    """Called when a 3' linkage joins vhA to vhB and they are indexed by
+    different OligoIndexes. The helices of an index that isn't a part's
+    move into the other index; two parts' indices are both left to be
+    rebuilt. Returns the index that tracks the linkage."""
+    for src, dst in ((vhA, vhB), (vhB, vhA)):
+        part = src._part
+        if part == None or part._oligoIndex is not src._oligoIndex:
+            index = dst._oligoIndex
+            for helixId in list(src._oligoIndex.helixIds()):
+                helix = helixForStorageId(helixId)
+                if helix != None:
+                    helix._setOligoIndex(index)
+            return index
+    vhB._oligoIndex.invalidate()
+    vhA._oligoIndex.invalidate()
+    return vhA._oligoIndex
+
+def _oligoIndexReady(index):
+    if index.isDirty():
+        index.rebuild(_threePrimeLinks(index))
+    return index
+
+############################ Oligo coloring #############################
+def colorOligos(vhelices, strandType, palette):
+    """Gives every oligo through the strandType strands of vhelices
+    its own color, palette[0], palette[1], ... in the order the oligos
+    are first reached going through vhelices base by base"""
+    visited = set()
+    k = 0
+    for vh in vhelices:
+        index = _oligoIndexReady(vh._oligoIndex)
+        strand = vh._strand(strandType)
+        occupied = strand._flags.tostring().translate(_nonemptyTable)
+        for idx in _indicesOf(occupied):
+            node = strand._node | idx
+            if node in visited:
+                continue
+            nodes = index.nodes(node)
+            visited.update(nodes)
+            c = colorIndex(palette[k])
+            k += 1
+            for n in nodes:
+                helix = helixForStorageId(n >> (_NODE_IDX_BITS + 1))
+                helix._strand(strandType)._colorIdx[n & _NODE_IDX_MASK] = c
+
+########################## Sequence application #########################
+# The complement util.rcomp gives a single base (nothing for characters
+# that aren't bases)
+_complement = {'A': 'T', 'C': 'G', 'G': 'C', 'T': 'A',\
+               'a': 'T', 'c': 'G', 'g': 'C', 't': 'A'}
+
+def applyScaffoldSequence(vhelices, seqStr):
+    """
+    Assigns seqStr to every scaffold oligo through vhelices, starting over
+    at the 5' end of each oligo (circular oligos start at their first
+    base in the order of vhelices), the way ApplySequenceCommand does for
+    one oligo: a loop takes one character per base in it, a skip gets a
+    space and bases past the end of seqStr get spaces. The complementary
+    staple bases get the complement of their scaffold base. Returns the
+    list of helices whose sequences were written.
+    """
+    visited = set()
+    touched = {}
+    for vh in vhelices:
+        index = _oligoIndexReady(vh._oligoIndex)
+        strand = vh._scaffoldBases
+        occupied = strand._flags.tostring().translate(_nonemptyTable)
+        for idx in _indicesOf(occupied):
+            node = strand._node | idx
+            if node in visited:
+                continue
+            nodes = index.nodes(node)
+            if index.isCyclic(node):
+                k = index.rank(node)
+                nodes = nodes[k:] + nodes[:k]
+            visited.update(nodes)
+            used = 0
+            for n in nodes:
+                helix = helixForStorageId(n >> (_NODE_IDX_BITS + 1))
+                i = n & _NODE_IDX_MASK
+                touched[helix] = True
+                numBasesInB = helix._scaffoldLoops.get(i, 0) + 1
+                if numBasesInB == 0:
+                    seq = " "
+                else:
+                    seq = seqStr[used:used + numBasesInB]
+                    used += len(seq)
+                    seq = seq.ljust(numBasesInB)
+                scaf, stap = helix._scaffoldBases, helix._stapleBases
+                scaf._seq[i] = ord(seq[0])
+                if len(seq) > 1:
+                    scaf._loopSeq[i] = seq[1:]
+                else:
+                    scaf._loopSeq.pop(i, None)
+                rest = stap._loopSeq.pop(i, '')
+                if stap._seq[i] == 0:
+                    rest = ''
+                comp = _complement.get(seq[0], '') + rest
+                if comp:
+                    stap._seq[i] = ord(comp[0])
+                    if len(comp) > 1:
+                        stap._loopSeq[i] = comp[1:]
+                else:
+                    stap._seq[i] = 0
+    for helix in touched:
+        helix._scaffoldBases._rebuildSequenceText()
+        helix._stapleBases._rebuildSequenceText()
+    return touched.keys()
+
+############################## Color table ##############################
+# Colors are interned so that each base stores a single int. Index 0 is
+# the "no color" entry; invalid QColors intern to it as well since
+# Base.getColor treats the two identically.
+_colorTable = [None]
+_colorIndexForKey = {}
+
+def colorIndex(color):
+    if color == None or not color.isValid():
+        return 0
+    key = color.rgba()
+    idx = _colorIndexForKey.get(key, None)
+    if idx == None:
+        idx = len(_colorTable)
+        _colorTable.append(QColor(color))
+        _colorIndexForKey[key] = idx
+    return idx
+
+def colorForIndex(idx):
+    """Returns a copy so callers may freely setAlpha etc."""
+    color = _colorTable[idx]
+    if color == None:
+        return None
+    return QColor(color)
+
+########################## Vectorized scanning ##########################
+# Scans translate the flag bytes of a whole strand into a string of
+# markers with a single str.translate call and then let str.find / re
+# do the looping in C.
+def _table(pred):
+    return ''.join(chr(1) if pred(f) else chr(0) for f in range(256))
+
+_endpoint5Table = _table(lambda f: f & (HAS5P | HAS3P) == HAS3P)
+_endpoint3Table = _table(lambda f: f & (HAS5P | HAS3P) == HAS5P)
+_xover3pTable = _table(lambda f: f & (HAS3P | NAT3P) == HAS3P)
+_natRTable = _table(lambda f: f & NATR)
+_nonemptyTable = _table(lambda f: f & (RAW5P | RAW3P))
+# Occupied and not already a crossover on either side
+_freeForXoverTable = _table(lambda f: f & (RAW5P | RAW3P) and\
+                                      f & (HAS3P | NAT3P) != HAS3P and\
+                                      f & (HAS5P | NAT5P) != HAS5P)
+# Single base crossovers (see VirtualHelix.thoughtPolice): 1 marks a
+# 5' crossover without a 3' neighbor, 2 a 3' crossover without a 5'
+# neighbor, 3 both
+_loneXoverTable = ''.join(chr((f & (HAS5P | NAT5P | HAS3P) == HAS5P) |\
+                              (f & (HAS3P | NAT3P | HAS5P) == HAS3P) << 1)\
+                          for f in range(256))
+_LONE_XOVER_5P, _LONE_XOVER_3P = 1, 2
+_runRE = re.compile('\x01+')
+_noNeighborRE = re.compile('\x00+')
+_hasNeighborTable = _table(lambda f: f & (HAS5P | HAS3P))
+_nonzeroRE = re.compile('[^\x00]')
+_MAX_DIRTY_RANGES = 64
+
+def _addToRanges(ranges, idx):
+    """Adds idx to ranges, a list of [lo, hi] (inclusive) ranges in the
+    order they were touched, and returns the list to keep"""
+    if ranges:
+        last = ranges[-1]
+        if last[0] - 1 <= idx <= last[1] + 1:
+            if idx < last[0]:
+                last[0] = idx
+            elif idx > last[1]:
+                last[1] = idx
+            return ranges
+        if len(ranges) >= _MAX_DIRTY_RANGES:
+            # Don't let an unpoliced helix accumulate ranges forever
+            lo = min(idx, min(r[0] for r in ranges))
+            hi = max(idx, max(r[1] for r in ranges))
+            return [[lo, hi]]
+    ranges.append([idx, idx])
+    return ranges
+
+def _normalizedRanges(ranges, margin, last):
+    """The sorted, disjoint (lo, hi) ranges covering ranges (as kept by
+    _addToRanges) widened by margin and clamped to 0...last"""
+    ret = []
+    for lo, hi in sorted(ranges):
+        lo, hi = max(lo - margin, 0), min(hi + margin, last)
+        if lo > hi:
+            continue
+        if ret and lo <= ret[-1][1] + 1:
+            ret[-1] = (ret[-1][0], max(hi, ret[-1][1]))
+        else:
+            ret.append((lo, hi))
+    return ret
+
+def _setMembership(sortedIdx, idx, member):
+    """Inserts idx into (or removes it from) the sorted array sortedIdx"""
+    i = bisect_left(sortedIdx, idx)
+    present = i < len(sortedIdx) and sortedIdx[i] == idx
+    if member and not present:
+        sortedIdx.insert(i, idx)
+    elif present and not member:
+        del sortedIdx[i]
+
+def _nextIn(sortedIdx, idx, step):
+    """The entry of the sorted array sortedIdx nearest to idx on the
+    side given by step (1 for larger, -1 for smaller), or None"""
+    if step > 0:
+        i = bisect_right(sortedIdx, idx)
+        return sortedIdx[i] if i < len(sortedIdx) else None
+    i = bisect_left(sortedIdx, idx)
+    return sortedIdx[i - 1] if i > 0 else None
+
+def _indicesOf(markers):
+    """Returns the indices of all the chr(1) markers in markers"""
+    ret = []
+    i = markers.find('\x01')
+    while i != -1:
+        ret.append(i)
+        i = markers.find('\x01', i + 1)
+    return ret
+
+
+class StrandArray(object):
+    """
+    Private to VirtualHelix and Base. Indexing a StrandArray returns a
+    Base view; all mutation goes through the _set* methods below so
+    that the cached flags stay in sync with the linkage arrays.
+    """
+    def __init__(self, vhelix, strandtype):
+        super(StrandArray, self).__init__()
+        self._vhelix = vhelix
+        self._strandtype = strandtype
+        self._helixId = vhelix._storageId
+        self._node = _nodeBase(self._helixId, strandtype)
+        self._fiveHelix = array('i')
+        self._fiveIdx = array('i')
+        self._threeHelix = array('i')
+        self._threeIdx = array('i')
+        self._colorIdx = array('i')
+        self._seq = array('B')
+        self._flags = array('B')
+        # Sparse column: loop sequence beyond the first character
+        self._loopSeq = {}
+        # [lo, hi] (inclusive) ranges of indices whose flags changed since
+        # the helix was last policed (see VirtualHelix.thoughtPolice)
+        self._dirtyRanges = []
+        # Ranges of indices whose flags, color or sequence changed since
+        # the helix last emitted basesModified (see
+        # VirtualHelix.modifiedRanges)
+        self._modifiedRanges = []
+        # The character drawn under each base (see Base.sequence), kept
+        # current by every change that can affect it, and a str copy
+        # that is made at most once per change for drawing
+        self._seqText = bytearray()
+        self._seqTextStr = None
+        # Sorted indices of the nonempty bases and of the ends (bases
+        # linked on exactly one side), kept current by _refreshFlags.
+        # The gaps between nonempty bases are the empty runs an end can
+        # be dragged across (see VirtualHelix.getDragBound).
+        self._nonemptyIdx = array('i')
+        self._endIdx = array('i')
+
+    def __len__(self):
+        return len(self._flags)
+
+    def __getitem__(self, idx):
+        if idx < 0 or idx >= len(self._flags):
+            raise IndexError("Base %s out of range" % idx)
+        return Base(self._vhelix, self._strandtype, idx)
+
+    def __iter__(self):
+        vh, st = self._vhelix, self._strandtype
+        for i in xrange(len(self._flags)):
+            yield Base(vh, st, i)
+
+    def resize(self, numBases):
+        oldNB = len(self._flags)
+        if numBases > oldNB:
+            n = numBases - oldNB
+            self._fiveHelix.extend(array('i', [NO_HELIX]) * n)
+            self._fiveIdx.extend(array('i', [-1]) * n)
+            self._threeHelix.extend(array('i', [NO_HELIX]) * n)
+            self._threeIdx.extend(array('i', [-1]) * n)
+            self._colorIdx.extend(array('i', [0]) * n)
+            self._seq.extend(array('B', [ord(' ')]) * n)
+            self._flags.extend(array('B', [0]) * n)
+            self._seqText.extend(' ' * n)
+        else:
+            for arr in (self._fiveHelix, self._fiveIdx, self._threeHelix,\
+                        self._threeIdx, self._colorIdx, self._seq,\
+                        self._flags):
+                del arr[numBases:]
+            del self._seqText[numBases:]
+            for idx in self._nonemptyIdx[bisect_left(self._nonemptyIdx,\
+                                                     numBases):]:
+                self._syncOccupancyAt(idx, False)
+            for sortedIdx in (self._nonemptyIdx, self._endIdx):
+                del sortedIdx[bisect_left(sortedIdx, numBases):]
+            for k in [k for k in self._loopSeq if k >= numBases]:
+                del self._loopSeq[k]
+            self._vhelix._oligoIndex.invalidate()
+        self._seqTextStr = None
+
+    def _cutTail(self, numBases):
+        """
+        Truncates the receiver to numBases bases after unlinking the bases
+        below numBases (on this or any other helix) that were linked to
+        the bases being cut off. Returns what _restoreTail needs to put
+        everything back.
+        """
+        oldNB = len(self._flags)
+        st = self._strandtype
+        occupied = self._nonemptyIdx[bisect_left(self._nonemptyIdx, numBases):]
+        partners = []  # (strand, idx, isFivePrimeSide, helix, index)
+        for idx in occupied:
+            h, i = self._threeHelix[idx], self._threeIdx[idx]
+            if h != NO_HELIX and i < numBases:
+                partner = helixForStorageId(h)._strand(st)
+                partners.append((partner, i, True,\
+                                 partner._fiveHelix[i], partner._fiveIdx[i]))
+                partner._fiveHelix[i], partner._fiveIdx[i] = NO_HELIX, -1
+            h, i = self._fiveHelix[idx], self._fiveIdx[idx]
+            if h != NO_HELIX and i < numBases:
+                partner = helixForStorageId(h)._strand(st)
+                partners.append((partner, i, False,\
+                                 partner._threeHelix[i], partner._threeIdx[i]))
+                partner._threeHelix[i], partner._threeIdx[i] = NO_HELIX, -1
+        tail = (self._fiveHelix[numBases:], self._fiveIdx[numBases:],\
+                self._threeHelix[numBases:], self._threeIdx[numBases:],\
+                self._colorIdx[numBases:], self._seq[numBases:],\
+                dict((k, v) for k, v in self._loopSeq.iteritems()\
+                     if k >= numBases))
+        # Unlink the tail too so that its crossovers leave the registry
+        n = oldNB - numBases
+        self._fiveHelix[numBases:] = array('i', [NO_HELIX]) * n
+        self._threeHelix[numBases:] = array('i', [NO_HELIX]) * n
+        for idx in occupied:
+            self._refreshFlags(idx)
+        for partner, i, isFive, h, j in partners:
+            partner._refreshFlags(i)
+        self.resize(numBases)
+        return (oldNB, tail, partners)
+
+    def _restoreTail(self, record):
+        """Undoes _cutTail"""
+        oldNB, tail, partners = record
+        numBases = len(self._flags)
+        self.resize(oldNB)
+        for column, values in zip((self._fiveHelix, self._fiveIdx,\
+                                   self._threeHelix, self._threeIdx,\
+                                   self._colorIdx, self._seq), tail[:6]):
+            column[numBases:] = values
+        self._loopSeq.update(tail[6])
+        for partner, i, isFive, h, j in partners:
+            if isFive:
+                partner._fiveHelix[i], partner._fiveIdx[i] = h, j
+            else:
+                partner._threeHelix[i], partner._threeIdx[i] = h, j
+        self._vhelix._oligoIndex.invalidate()
+        for idx in xrange(numBases, oldNB):
+            if self._fiveHelix[idx] != NO_HELIX or\
+               self._threeHelix[idx] != NO_HELIX:
+                self._refreshFlags(idx)
+        for partner, i, isFive, h, j in partners:
+            partner._refreshFlags(i)
+        self._rebuildSequenceText()
+
+    ############################ Linkage ################################
+    def _fivePrimeTarget(self, idx):
+        h = self._fiveHelix[idx]
+        if h == NO_HELIX:
+            return None
+        return Base(helixForStorageId(h), self._strandtype, self._fiveIdx[idx])
+
+    def _threePrimeTarget(self, idx):
+        h = self._threeHelix[idx]
+        if h == NO_HELIX:
+            return None
+        return Base(helixForStorageId(h), self._strandtype, self._threeIdx[idx])
+
+    def _setFivePrimeTarget(self, idx, base):
+        if _recorders:
+            self._noteChange(idx)
+        if base == None:
+            self._fiveHelix[idx], self._fiveIdx[idx] = NO_HELIX, -1
+        else:
+            self._fiveHelix[idx] = base._vhelix._storageId
+            self._fiveIdx[idx] = base._n
+        self._refreshFlags(idx)
+
+    def _threePrimeNode(self, idx):
+        h = self._threeHelix[idx]
+        if h == NO_HELIX:
+            return None
+        return _nodeBase(h, self._strandtype) | self._threeIdx[idx]
+
+    def _linkIndex(self, helixId):
+        """The OligoIndex that tracks 3' linkages from the receiver to the
+        helix with storage id helixId (see _sharedOligoIndex)"""
+        index = self._vhelix._oligoIndex
+        if helixId != self._helixId:
+            other = helixForStorageId(helixId)
+            if other != None and other._oligoIndex is not index:
+                return _sharedOligoIndex(self._vhelix, other)
+        return index
+
+    def _setThreePrimeTarget(self, idx, base):
+        # The 3' linkage is the one the oligo index tracks (the 5'
+        # linkage is its mirror image)
+        if _recorders:
+            self._noteChange(idx)
+        oldNode = self._threePrimeNode(idx)
+        if oldNode != None:
+            self._linkIndex(self._threeHelix[idx]).cut(self._node | idx,\
+                                                       oldNode)
+        if base == None:
+            self._threeHelix[idx], self._threeIdx[idx] = NO_HELIX, -1
+        else:
+            self._threeHelix[idx] = base._vhelix._storageId
+            self._threeIdx[idx] = base._n
+            self._linkIndex(self._threeHelix[idx]).link(self._node | idx,\
+                                                self._threePrimeNode(idx))
+        self._refreshFlags(idx)
+
+    def _refreshFlags(self, idx):
+        self._markDirty(idx)
+        fiveTo3 = self._vhelix.directionOfStrandIs5to3(self._strandtype)
+        d3 = 1 if fiveTo3 else -1
+        f = 0
+        fiveH = self._fiveHelix[idx]
+        if fiveH != NO_HELIX:
+            f |= RAW5P | HAS5P
+            if fiveH == self._helixId and self._fiveIdx[idx] == idx - d3:
+                f |= NAT5P
+        threeH = self._threeHelix[idx]
+        if threeH != NO_HELIX:
+            f |= RAW3P | HAS3P
+            if threeH == self._helixId and self._threeIdx[idx] == idx + d3:
+                f |= NAT3P
+        if f & NAT5P:
+            f |= NATL if fiveTo3 else NATR
+        if f & NAT3P:
+            f |= NATR if fiveTo3 else NATL
+        old = self._flags[idx]
+        if f != old:
+            self._flags[idx] = f
+            if bool(f & (RAW5P | RAW3P)) != bool(old & (RAW5P | RAW3P)):
+                _setMembership(self._nonemptyIdx, idx, f & (RAW5P | RAW3P))
+                self._syncOccupancyAt(idx, bool(f & (RAW5P | RAW3P)))
+            isEnd = bool(f & HAS5P) != bool(f & HAS3P)
+            if isEnd != (bool(old & HAS5P) != bool(old & HAS3P)):
+                _setMembership(self._endIdx, idx, isEnd)
+        self._syncXoverAt(idx)
+        self._refreshSequenceTextAt(idx)
+
+    def _syncXoverAt(self, idx):
+        """Tells the part's crossover registry whether a crossover leaves
+        the 3' side of base idx (flags must be current)"""
+        part = self._vhelix._part
+        if part == None:
+            return
+        f = self._flags[idx]
+        if f & RAW3P and not f & NAT3P:
+            toBase = (helixForStorageId(self._threeHelix[idx]),\
+                      self._strandtype, self._threeIdx[idx])
+        else:
+            toBase = None
+        part._xoverRegistry.setXoverFrom((self._vhelix, self._strandtype, idx),\
+                                         toBase)
+
+    def _syncOccupancyAt(self, idx, occupied):
+        """Tells the part's occupancy map whether base idx is nonempty"""
+        part = self._vhelix._part
+        if part == None:
+            return
+        part._occupancy.setOccupied(self._vhelix, self._strandtype, idx,\
+                                    occupied)
+
+    def _syncAllXovers(self):
+        """Registers the crossovers leaving and entering the receiver with
+        its helix's (new) part"""
+        st = self._strandtype
+        marked = self._flags.tostring().translate(_nonemptyTable)
+        for i in _indicesOf(marked):
+            self._syncXoverAt(i)
+            h = self._fiveHelix[i]
+            if h != NO_HELIX:
+                helixForStorageId(h)._strand(st)._syncXoverAt(self._fiveIdx[i])
+
+    def _refreshAllFlags(self):
+        """Called when the strand's direction may have changed (the
+        parity of the owning helix's number changed)."""
+        for i in xrange(len(self._flags)):
+            self._refreshFlags(i)
+
+    def _noteChange(self, idx):
+        for recorder in _recorders:
+            recorder._note(self, idx)
+
+    ########################## Dirty tracking ###########################
+    def _markDirty(self, idx):
+        self._dirtyRanges = _addToRanges(self._dirtyRanges, idx)
+        self._markModified(idx)
+
+    def _markModified(self, idx):
+        self._modifiedRanges = _addToRanges(self._modifiedRanges, idx)
+
+    def takeDirtyRanges(self, margin=1):
+        """Returns the sorted, disjoint (lo, hi) ranges (inclusive) of
+        indices modified since the last call, widened by margin, and
+        forgets them"""
+        ranges, self._dirtyRanges = self._dirtyRanges, []
+        return _normalizedRanges(ranges, margin, len(self._flags) - 1)
+
+    def takeModifiedRanges(self):
+        """Like takeDirtyRanges (with no margin), but kept separately for
+        VirtualHelix to report along with basesModified, and also covering
+        bases whose color or sequence changed"""
+        ranges, self._modifiedRanges = self._modifiedRanges, []
+        return _normalizedRanges(ranges, 0, len(self._flags) - 1)
+
+    def loneXoverIndices(self, lo=0, hi=None):
+        """Returns (lone5p, lone3p), the indices in lo..hi (inclusive)
+        of bases with a 5' crossover but no 3' neighbor and of bases
+        with a 3' crossover but no 5' neighbor"""
+        if hi == None:
+            hi = len(self._flags) - 1
+        marks = self._flags[lo:hi + 1].tostring().translate(_loneXoverTable)
+        lone5p, lone3p = [], []
+        for m in _nonzeroRE.finditer(marks):
+            i = m.start()
+            kind = ord(marks[i])
+            if kind & _LONE_XOVER_5P:
+                lone5p.append(lo + i)
+            if kind & _LONE_XOVER_3P:
+                lone3p.append(lo + i)
+        return (lone5p, lone3p)
+
+    def isLoneXover5p(self, idx):
+        return bool(ord(_loneXoverTable[self._flags[idx]]) & _LONE_XOVER_5P)
+
+    def isLoneXover3p(self, idx):
+        return bool(ord(_loneXoverTable[self._flags[idx]]) & _LONE_XOVER_3P)
+
+    ######################## Per-base attributes ########################
+    def _colorAt(self, idx):
+        return colorForIndex(self._colorIdx[idx])
+
+    def _setColorAt(self, idx, color):
+        if _recorders:
+            self._noteChange(idx)
+        self._colorIdx[idx] = colorIndex(color)
+        self._markModified(idx)
+
+    def _sequenceAt(self, idx):
+        c = self._seq[idx]
+        if c == 0:
+            return ""
+        return chr(c) + self._loopSeq.get(idx, "")
+
+    def _setSequenceAt(self, idx, seq):
+        if _recorders:
+            self._noteChange(idx)
+        if seq:
+            self._seq[idx] = ord(seq[0])
+            if len(seq) > 1:
+                self._loopSeq[idx] = seq[1:]
+            else:
+                self._loopSeq.pop(idx, None)
+        else:
+            self._seq[idx] = 0
+            self._loopSeq.pop(idx, None)
+        self._refreshSequenceTextAt(idx)
+        self._markModified(idx)
+
+    def _refreshSequenceTextAt(self, idx):
+        """Call when the flags, the sequence or the skip at idx change"""
+        c = self._seq[idx]
+        if c == 0 or not self._flags[idx] & (HAS5P | HAS3P) or\
+           self._vhelix.hasLoopOrSkipAt(self._strandtype, idx) == -1:
+            c = 32  # ' '
+        if self._seqText[idx] != c:
+            self._seqText[idx] = c
+            self._seqTextStr = None
+
+    def _rebuildSequenceText(self):
+        """Recomputes the whole sequence text at once (after bulk writes
+        to _seq that skipped _refreshSequenceTextAt)"""
+        text = bytearray(self._seq.tostring().replace('\x00', ' '))
+        hasNeighbor = self._flags.tostring().translate(_hasNeighborTable)
+        for m in _noNeighborRE.finditer(hasNeighbor):
+            text[m.start():m.end()] = ' ' * (m.end() - m.start())
+        for idx, size in self._vhelix._loop(StrandType.Scaffold).iteritems():
+            if size == -1 and idx < len(text):
+                text[idx] = ' '
+        self._seqText = text
+        self._seqTextStr = None
+
+    def sequenceSnapshot(self):
+        """A copy of the sequence stored in the receiver (one byte per
+        base plus any loop sequences) for restoreSequenceSnapshot"""
+        return (array('B', self._seq), dict(self._loopSeq))
+
+    def restoreSequenceSnapshot(self, snapshot):
+        seq, loopSeq = snapshot
+        self._seq = array('B', seq)
+        self._loopSeq = dict(loopSeq)
+        self._rebuildSequenceText()
+
+    ########################### Bulk edits ##############################
+    def linkageSnapshot(self):
+        """Copies of the linkage columns (fiveHelix, fiveIdx, threeHelix,
+        threeIdx, see helixForStorageId), the color column and the
+        sequence, for replaceLinkage and restoreLinkageSnapshot"""
+        return (array('i', self._fiveHelix), array('i', self._fiveIdx),\
+                array('i', self._threeHelix), array('i', self._threeIdx),\
+                array('i', self._colorIdx)) + self.sequenceSnapshot()
+
+    def restoreLinkageSnapshot(self, snapshot):
+        self.replaceLinkage(*snapshot[:4])
+        self._colorIdx = array('i', snapshot[4])
+        self.restoreSequenceSnapshot(snapshot[5:])
+
+    def replaceLinkage(self, fiveHelix, fiveIdx, threeHelix, threeIdx):
+        """Bulk version of the _set*PrimeTarget methods: adopts copies of
+        the given linkage columns and refreshes the bases whose linkage
+        changed. The caller is responsible for the mirror image links on
+        the other end of each linkage. The oligo index is rebuilt by the
+        next query."""
+        old = (self._fiveHelix, self._fiveIdx, self._threeHelix,\
+               self._threeIdx)
+        self._fiveHelix = array('i', fiveHelix)
+        self._fiveIdx = array('i', fiveIdx)
+        self._threeHelix = array('i', threeHelix)
+        self._threeIdx = array('i', threeIdx)
+        self._vhelix._oligoIndex.invalidate()
+        new = (self._fiveHelix, self._fiveIdx, self._threeHelix,\
+               self._threeIdx)
+        for idx in xrange(len(self._flags)):
+            if old[0][idx] != new[0][idx] or old[1][idx] != new[1][idx] or\
+               old[2][idx] != new[2][idx] or old[3][idx] != new[3][idx]:
+                self._refreshFlags(idx)
+
+    def clearSequences(self, lo, hi):
+        """Sets the sequence of bases lo...hi (inclusive) to a space"""
+        self._seq[lo:hi + 1] = array('B', [ord(' ')]) * (hi + 1 - lo)
+        for idx in [idx for idx in self._loopSeq if lo <= idx <= hi]:
+            del self._loopSeq[idx]
+        self._rebuildSequenceText()
+
+    def sequenceText(self):
+        """The character drawn under each base, as one string (see
+        VirtualHelix.sequenceForVirtualStrand)"""
+        if self._seqTextStr == None:
+            self._seqTextStr = str(self._seqText)
+        return self._seqTextStr
+
+    ############################## Oligos ###############################
+    # Bases joined by 3' linkages form an oligo; these read the treap
+    # kept by the helix's OligoIndex. An empty base belongs to no oligo.
+    def oligoLength(self, idx):
+        if not self._flags[idx] & (RAW5P | RAW3P):
+            return 0
+        index = _oligoIndexReady(self._vhelix._oligoIndex)
+        return index.size(self._node | idx)
+
+    def oligoFivePrimeEnd(self, idx):
+        """Returns the Base at the 5' end of the oligo through idx. A
+        circular oligo has no 5' end so the base at idx is returned."""
+        if not self._flags[idx] & (RAW5P | RAW3P):
+            return None
+        index = _oligoIndexReady(self._vhelix._oligoIndex)
+        node = self._node | idx
+        if index.isCyclic(node):
+            return self[idx]
+        return _baseForNode(index.first(node))
+
+    def positionInOligo(self, idx):
+        """Number of bases 5' of idx in its oligo (for circular oligos
+        this counts from an arbitrary but fixed base)"""
+        index = _oligoIndexReady(self._vhelix._oligoIndex)
+        return index.rank(self._node | idx)
+
+    def oligoBases(self, idx):
+        """The Bases of the oligo through idx, 5' to 3'. Circular oligos
+        start at idx."""
+        if not self._flags[idx] & (RAW5P | RAW3P):
+            return []
+        index = _oligoIndexReady(self._vhelix._oligoIndex)
+        node = self._node | idx
+        nodes = index.nodes(node)
+        if index.isCyclic(node):
+            k = index.rank(node)
+            nodes = nodes[k:] + nodes[:k]
+        return [_baseForNode(n) for n in nodes]
+
+    ############################## Runs #################################
+    def nextNonemptyIndex(self, idx, step):
+        """Index of the nearest nonempty base past idx in the direction
+        step (1 for right, -1 for left), or None"""
+        return _nextIn(self._nonemptyIdx, idx, step)
+
+    def nextEndIndex(self, idx, step):
+        """Index of the nearest end (a base linked on one side only) past
+        idx in the direction step, or None"""
+        return _nextIn(self._endIdx, idx, step)
+
+    def endIndices(self):
+        """Indices of all the ends (3' and 5'), in ascending order"""
+        return list(self._endIdx)
+
+    def _connectRange(self, lo, hi, colorIdx):
+        """Links each base in lo...hi to its natural neighbors within the
+        range and gives the range the color colorIdx; the links must all
+        be free. A bulk ConnectStrandCommand for extending an end across an
+        empty run. Returns the colors it replaced, for _disconnectRange."""
+        n = hi - lo
+        h = array('i', [self._helixId]) * n
+        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
+            self._threeHelix[lo:hi] = h
+            self._threeIdx[lo:hi] = array('i', xrange(lo + 1, hi + 1))
+            self._fiveHelix[lo + 1:hi + 1] = h
+            self._fiveIdx[lo + 1:hi + 1] = array('i', xrange(lo, hi))
+        else:
+            self._threeHelix[lo + 1:hi + 1] = h
+            self._threeIdx[lo + 1:hi + 1] = array('i', xrange(lo, hi))
+            self._fiveHelix[lo:hi] = h
+            self._fiveIdx[lo:hi] = array('i', xrange(lo + 1, hi + 1))
+        oldColors = self._colorIdx[lo:hi + 1]
+        self._colorIdx[lo:hi + 1] = array('i', [colorIdx]) * (n + 1)
+        self._vhelix._oligoIndex.invalidate()
+        for idx in xrange(lo, hi + 1):
+            self._refreshFlags(idx)
+        return oldColors
+
+    def _disconnectRange(self, lo, hi, oldColors):
+        """Undoes _connectRange(lo, hi, ...)"""
+        n = hi - lo
+        noHelix, noIdx = array('i', [NO_HELIX]) * n, array('i', [-1]) * n
+        if self._vhelix.directionOfStrandIs5to3(self._strandtype):
+            threeSlice, fiveSlice = slice(lo, hi), slice(lo + 1, hi + 1)
+        else:
+            threeSlice, fiveSlice = slice(lo + 1, hi + 1), slice(lo, hi)
+        self._threeHelix[threeSlice] = noHelix
+        self._threeIdx[threeSlice] = noIdx
+        self._fiveHelix[fiveSlice] = noHelix
+        self._fiveIdx[fiveSlice] = noIdx
+        self._colorIdx[lo:hi + 1] = oldColors
+        self._vhelix._oligoIndex.invalidate()
+        for idx in xrange(lo, hi + 1):
+            self._refreshFlags(idx)
+
+    ############################# Scans #################################
+    def endpoints(self, lo=None, hi=None):
+        """Returns (ends3, ends5), lists of the indices of 3' and 5'
+        ends on the receiver (only those in lo...hi if given)"""
+        if lo == None:
+            flagStr = self._flags.tostring()
+            return (_indicesOf(flagStr.translate(_endpoint3Table)),\
+                    _indicesOf(flagStr.translate(_endpoint5Table)))
+        endIdx = self._endIdx
+        ends3, ends5 = [], []
+        for idx in endIdx[bisect_left(endIdx, lo):bisect_right(endIdx, hi)]:
+            if self._flags[idx] & HAS5P:
+                ends3.append(idx)
+            else:
+                ends5.append(idx)
+        return (ends3, ends5)
+
+    def threePrimeXoverIndices(self):
+        """Indices of bases with a crossover on their 3' side"""
+        return _indicesOf(self._flags.tostring().translate(_xover3pTable))
+
+    def freeForXoverMask(self):
+        """chr(1) at the indices of bases that could take part in a new
+        crossover (see VirtualHelix.possibleNewCrossoverAt), chr(0)
+        elsewhere"""
+        return self._flags.tostring().translate(_freeForXoverTable)
+
+    def isFreeForXover(self, idx):
+        return _freeForXoverTable[self._flags[idx]] == '\x01'
+
+    def indexOfRightmostNonemptyBase(self):
+        if not self._nonemptyIdx:
+            return -1
+        return self._nonemptyIdx[-1]
+
+    def segments(self, splitOnColor=True, lo=None, hi=None):
+        """Runs of bases connected to their natural neighbors, in the
+        format documented in VirtualHelix.getSegmentsAndEndpoints. Given
+        lo and hi, only the runs through bases lo...hi are returned."""
+        ret = []
+        colors = self._colorIdx
+        natR = self._flags.tostring().translate(_natRTable)
+        if lo == None:
+            runs = _runRE.finditer(natR)
+        else:
+            # From the start of the run through lo (if any) to the end of
+            # the one through hi
+            start = natR.rfind('\x00', 0, max(lo, 0)) + 1
+            end = natR.find('\x00', max(hi, 0))
+            if end == -1:
+                end = len(natR)
+            runs = _runRE.finditer(natR, start, end)
+        for m in runs:
+            # bases start..end-1 are connected to their right neighbor,
+            # so the segment covers bases start..end
+            start, end = m.start(), m.end()
+            s = start + .5
+            if splitOnColor:
+                c = colors[start]
+                if colors[start:end + 1].count(c) != end + 1 - start:
+                    for j in xrange(start + 1, end + 1):
+                        if colors[j] != colors[j - 1]:
+                            ret.append((s, j))
+                            s = j
+            ret.append((s, end + .5))
+        return ret
@@ -0,0 +1,348 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+undodelta.py
+Created by Shawn Douglas on 2011-05-11.
+
+Compact undo state for the base editing commands of VirtualHelix.
+
+While an UndoDelta is recording (with delta: ...), every base changed
+through the per-base _set* methods of StrandArray has its linkage,
+color and sequence noted the first time it is touched. When recording
+stops the touched bases are grouped into runs of consecutive indices,
+and each run is kept as (helix storage id, strand type, lo, hi, old,
+new) where old and new are packed columns (typed arrays like the ones
+in StrandArray, plus the sparse loop sequence entries). Undo and redo
+then write whole runs back with slice assignments instead of replaying
+lists of Base objects and QColors.
+
+UndoBudget holds the undo memory of a document under a budget by
+dropping the undo data of the oldest commands on its undo stack.
+"""
+
+from array import array
+from .strandarray import _recorders, helixForStorageId, _NODE_IDX_BITS
+
+import util
+# import Qt stuff into the module namespace with PySide, PyQt4 independence
+util.qtWrapImport('QtCore', globals(), ['pyqtSignal', 'QObject'])
+util.qtWrapImport('QtGui', globals(), ['QUndoCommand'])
+
+# Rough cost of a run beyond its arrays (the tuples and array headers)
+_RUN_OVERHEAD = 400
+# What we charge a command that doesn't report its undo memory
+_COMMAND_OVERHEAD = 200
+
+def _pack(values):
+    """Packs a list of per-base tuples as noted by UndoDelta._note into
+    columns"""
+    cols = zip(*values)
+    sparse = {}
+    for k in xrange(len(values)):
+        if values[k][6] != None:
+            sparse[k] = values[k][6]
+    return (array('i', cols[0]), array('i', cols[1]), array('i', cols[2]),\
+            array('i', cols[3]), array('i', cols[4]), array('B', cols[5]),\
+            sparse)
+
+def _capture(strand, lo, hi):
+    """The current values of bases lo...hi (inclusive) of strand, packed
+    like _pack does"""
+    sparse = dict((idx - lo, v) for idx, v in strand._loopSeq.iteritems()\
+                  if lo <= idx <= hi)
+    return (strand._fiveHelix[lo:hi + 1], strand._fiveIdx[lo:hi + 1],\
+            strand._threeHelix[lo:hi + 1], strand._threeIdx[lo:hi + 1],\
+            strand._colorIdx[lo:hi + 1], strand._seq[lo:hi + 1], sparse)
+
+def _values(strand, idx):
+    """The per-base tuple UndoDelta._note keeps for base idx of strand"""
+    return (strand._fiveHelix[idx], strand._fiveIdx[idx],\
+            strand._threeHelix[idx], strand._threeIdx[idx],\
+            strand._colorIdx[idx], strand._seq[idx],\
+            strand._loopSeq.get(idx))
+
+def _packedSize(cols):
+    return sum(len(c) * c.itemsize for c in cols[:6]) + 100 * len(cols[6])
+
+
+class UndoDelta(object):
+    def __init__(self):
+        super(UndoDelta, self).__init__()
+        self._touched = None  # strand -> {idx: old values} while recording
+        self._runs = []
+        self._bytes = 0
+
+    def __enter__(self):
+        self._touched = {}
+        _recorders.append(self)
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        _recorders.remove(self)
+        for strand, touched in self._touched.iteritems():
+            # Bases set back to what they were (a recolor with the same
+            # color, say) are left out
+            idxs = sorted(idx for idx, old in touched.iteritems()\
+                          if old != _values(strand, idx))
+            start = 0
+            for k in xrange(1, len(idxs) + 1):
+                if k < len(idxs) and idxs[k] == idxs[k - 1] + 1:
+                    continue
+                lo, hi = idxs[start], idxs[k - 1]
+                start = k
+                old = _pack([touched[i] for i in xrange(lo, hi + 1)])
+                new = _capture(strand, lo, hi)
+                self._runs.append((strand._helixId, strand._strandtype,\
+                                   lo, hi, old, new))
+                self._bytes += _packedSize(old) + _packedSize(new) +\
+                               _RUN_OVERHEAD
+        self._touched = None
+        return False
+
+    def _note(self, strand, idx):
+        touched = self._touched.get(strand)
+        if touched == None:
+            touched = self._touched[strand] = {}
+        if idx in touched:
+            return
+        touched[idx] = _values(strand, idx)
+
+    def isEmpty(self):
+        return not self._runs
+
+    def ranges(self):
+        """(vhelix, strandType, lo, hi) of each run of bases the receiver
+        changes"""
+        ret = []
+        for helixId, strandType, lo, hi, old, new in self._runs:
+            vh = helixForStorageId(helixId)
+            if vh != None:
+                ret.append((vh, strandType, lo, hi))
+        return ret
+
+    def byteSize(self):
+        """Approximate memory held by the receiver"""
+        return self._bytes
+
+    def undo(self):
+        self._write(4)
+
+    def redo(self):
+        self._write(5)
+
+    def _write(self, which):
+        written = []
+        cuts, links = [], []  # (oligo index, node, 3' node)
+        for run in self._runs:
+            helixId, strandType, lo, hi = run[:4]
+            cols = run[which]
+            vh = helixForStorageId(helixId)
+            if vh == None:
+                continue
+            strand = vh._strand(strandType)
+            if _recorders:  # Replaying one delta while recording another
+                for idx in xrange(lo, hi + 1):
+                    strand._noteChange(idx)
+            oldNodes = [strand._threePrimeNode(idx)\
+                        for idx in xrange(lo, hi + 1)]
+            columns = (strand._fiveHelix, strand._fiveIdx, strand._threeHelix,\
+                       strand._threeIdx, strand._colorIdx, strand._seq)
+            for column, values in zip(columns, cols[:6]):
+                column[lo:hi + 1] = values
+            loopSeq = strand._loopSeq
+            for idx in [idx for idx in loopSeq if lo <= idx <= hi]:
+                del loopSeq[idx]
+            for k, seq in cols[6].iteritems():
+                loopSeq[lo + k] = seq
+            for k in xrange(hi + 1 - lo):
+                newNode = strand._threePrimeNode(lo + k)
+                if newNode != oldNodes[k]:
+                    node = strand._node | (lo + k)
+                    if oldNodes[k] != None:
+                        index = strand._linkIndex(\
+                                    oldNodes[k] >> (_NODE_IDX_BITS + 1))
+                        cuts.append((index, node, oldNodes[k]))
+                    if newNode != None:
+                        index = strand._linkIndex(\
+                                    newNode >> (_NODE_IDX_BITS + 1))
+                        links.append((index, node, newNode))
+            written.append((strand, lo, hi))
+        # Every cut precedes every link so that each link joins the end of
+        # one oligo to the start of another
+        for index, node, threeNode in cuts:
+            index.cut(node, threeNode)
+        for index, node, threeNode in links:
+            index.link(node, threeNode)
+        vh = None
+        for strand, lo, hi in written:
+            for idx in xrange(lo, hi + 1):
+                strand._refreshFlags(idx)
+            vh = strand._vhelix
+            vh.setHasBeenModified()
+        if vh != None:
+            vh.emitBasesModifiedIfNeeded()
+
+    def discard(self):
+        """Forgets the recorded changes (see UndoBudget)"""
+        self._runs = []
+        self._bytes = 0
+
+
+class DeltaCommand(QUndoCommand):
+    """
+    An undo command whose effect on bases is recorded in an UndoDelta.
+    Subclasses implement _apply, which runs once (on the first redo)
+    while the delta records; later redos and undos replay the delta.
+    Subclasses that change state other than bases extend redo, undo and
+    discardUndoData to handle it.
+    """
+    def __init__(self):
+        super(DeltaCommand, self).__init__()
+        self._delta = None
+
+    def _apply(self):
+        raise NotImplementedError
+
+    def redo(self):
+        if self._delta == None:
+            self._delta = UndoDelta()
+            with self._delta:
+                self._apply()
+        else:
+            self._delta.redo()
+
+    def undo(self):
+        assert(self._delta != None)  # Must redo/apply before undo
+        self._delta.undo()
+
+    def undoMemory(self):
+        if self._delta == None:
+            return 0
+        return self._delta.byteSize()
+
+    def discardUndoData(self):
+        """Leaves undo and redo doing nothing (see UndoBudget)"""
+        if self._delta != None:
+            self._delta.discard()
+
+
+def snapshotMemory(snapshot):
+    """Approximate bytes held by the arrays and strings in a snapshot
+    made of (nested) tuples, lists and dicts, for the undoMemory of
+    commands that keep whole snapshots"""
+    if isinstance(snapshot, array):
+        return len(snapshot) * snapshot.itemsize
+    if isinstance(snapshot, str):
+        return len(snapshot)
+    if isinstance(snapshot, dict):
+        return sum(snapshotMemory(v) for v in snapshot.itervalues()) +\
+               24 * len(snapshot)
+    if isinstance(snapshot, (tuple, list)):
+        return sum(snapshotMemory(v) for v in snapshot)
+    return 0
+
+def commandMemory(command):
+    """Approximate memory held by an undo command and its children.
+    Commands that keep significant undo state report it through an
+    undoMemory method."""
+    ret = _COMMAND_OVERHEAD
+    if hasattr(command, 'undoMemory'):
+        ret += command.undoMemory()
+    for i in range(command.childCount()):
+        ret += commandMemory(command.child(i))
+    return ret
+
+def _discardUndoData(command):
+    """Discards the undo data of command and its children. Returns the
+    undo memory still held by those that can't discard theirs."""
+    ret = 0
+    if hasattr(command, 'discardUndoData'):
+        command.discardUndoData()
+    elif hasattr(command, 'undoMemory'):
+        ret += command.undoMemory()
+    for i in range(command.childCount()):
+        ret += _discardUndoData(command.child(i))
+    return ret
+
+
+class UndoBudget(QObject):
+    """
+    Watches an undo stack and, whenever the commands on it hold more than
+    budget bytes, discards the undo data of the oldest commands until they
+    don't (always keeping the most recent one). The discarded commands
+    become a horizon the stack can't be undone past: an undo that would
+    cross it is redone right away.
+    """
+    memoryUseChanged = pyqtSignal(object)  # Not int: it can pass 2 GiB
+
+    def __init__(self, undoStack, budget):
+        super(UndoBudget, self).__init__()
+        self._undoStack = undoStack
+        self._budget = budget
+        self._sizes = []  # commandMemory of each command on the stack
+        self._horizon = 0  # number of commands whose undo data is gone
+        self._memoryUse = 0
+        undoStack.indexChanged.connect(self._indexChanged)
+
+    def budget(self):
+        return self._budget
+
+    def setBudget(self, budget):
+        self._budget = budget
+        self._enforce()
+
+    def memoryUse(self):
+        return self._memoryUse
+
+    def _indexChanged(self, index):
+        stack = self._undoStack
+        count = stack.count()
+        if count < self._horizon:
+            self._horizon = 0  # The stack was cleared
+        if index < self._horizon:
+            stack.setIndex(self._horizon)
+            return
+        # Commands above the index may have been replaced by a push and
+        # the one below it was just (re)done, so its undo data may have
+        # changed; everything below that keeps its size
+        del self._sizes[max(min(index - 1, count), self._horizon):]
+        for i in range(len(self._sizes), count):
+            if i < self._horizon:
+                self._sizes.append(0)
+            else:
+                self._sizes.append(commandMemory(stack.command(i)))
+        self._enforce()
+
+    def _enforce(self):
+        stack = self._undoStack
+        total = sum(self._sizes)
+        while total > self._budget and self._horizon < stack.index() - 1:
+            held = _discardUndoData(stack.command(self._horizon))
+            total -= self._sizes[self._horizon] - held
+            self._sizes[self._horizon] = held
+            self._horizon += 1
+        if total != self._memoryUse:
+            self._memoryUse = total
+            self.memoryUseChanged.emit(total)
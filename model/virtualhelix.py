@@ -28,10 +28,11 @@ Created by Jonathan deWerd on 2011-01-26.
 """
 import sys
 from exceptions import AttributeError, IndexError
-from itertools import product
 from .enum import LatticeType, Parity, StrandType, BreakType
 from .enum import Crossovers, EndType
-from .base import Base
+from .strandarray import StrandArray, registerHelix, helixForStorageId
+from .undodelta import DeltaCommand
+from .oligoindex import OligoIndex
 from cadnano import app, ignoreEnv
 from random import Random
 import re, sys, os
@@ -49,9 +50,18 @@ class VirtualHelix(QObject):
     prohibitSingleBaseCrossovers = True
     if os.environ.get('CADNANO_NO_THOUGHTPOLICE', False) and not ignoreEnv():
         prohibitSingleBaseCrossovers = False
+    # Debug aid: thoughtPolice also does the full scan it used to do and
+    # asserts that the dirty ranges didn't miss anything
+    checkThoughtPolice = False
+    if os.environ.get('CADNANO_CHECK_THOUGHTPOLICE', False) and not ignoreEnv():
+        checkThoughtPolice = True
     
+    # Slots can ask modifiedRanges which bases changed
     basesModified = pyqtSignal()
     dimensionsModified = pyqtSignal()
+    # (strandType, lo, hi) of bases a tool's live preview changed (see
+    # model.preview); basesModified follows if the preview is committed
+    basesPreviewed = pyqtSignal(int, int, int)
 
     def __init__(self, numBases=21, idnum=0, incompleteArchivedDict=None):
         super(VirtualHelix, self).__init__()
@@ -72,11 +82,17 @@ class VirtualHelix(QObject):
         # the above three properties (it asks part to set them,
         # self should no longer modify _row, _col, or _number)
         self._part = None
-        # The base arrays are owned entirely by virtualhelix
-        self._stapleBases = []
-        self._scaffoldBases = []
-        # As is the floatingXoverBase if there is one
-        self.floatingXoverBase = None
+        # The base arrays are owned entirely by virtualhelix. Each strand
+        # is a StrandArray (columnar storage); indexing one yields a Base
+        # view. Other strands refer to our bases by self._storageId,
+        # which unlike self._number never changes.
+        self._storageId = registerHelix(self)
+        # The oligos through our bases are indexed by our part's
+        # OligoIndex, or by one of our own while we aren't in a part
+        self._oligoIndex = OligoIndex()
+        self._oligoIndex.addHelix(self._storageId)
+        self._stapleBases = StrandArray(self, StrandType.Staple)
+        self._scaffoldBases = StrandArray(self, StrandType.Scaffold)
 
         """
         This is for inserts and skips. A dictionary for loops and skips is
@@ -95,16 +111,18 @@ class VirtualHelix(QObject):
         # doesn't make the document disappear). setSandboxed(False)
         # then clears _privateUndoStack at which point self
         # goes back to using the part / document undo stack.
+        # (The path tools preview edits with model.preview.Preview
+        # instead, which needs neither.)
         self._privateUndoStack = None
         self._sandboxed = False
+        # strandType -> ranges of bases reported by the last basesModified
+        self._modifiedRanges = {}
         # numBases is a simulated property that corresponds to the
         # length of _stapleBases and _scaffoldBases
         if incompleteArchivedDict:
             numBases = len(re.split('\s+',\
                                     incompleteArchivedDict['staple'])) - 1
         self.setNumBases(numBases, notUndoable=True)
-        self._sequenceForScafCache = None
-        self._sequenceForStapCache = None
     
     def fsck(self):
         for strandType in (StrandType.Scaffold, StrandType.Staple):
@@ -158,13 +176,27 @@ class VirtualHelix(QObject):
         (self._row, self._col) = coords
         if self._part and self._part.getVirtualHelix(coords):
             self._part.addVirtualHelixAt(coords, None)
-        self._number = num
+        self._setNumber(num)
         self._part = newPart
+        self._setOligoIndex(newPart._oligoIndex)
         self.setNumBases(newPart.numBases(), notUndoable=True)
+        self._scaffoldBases._syncAllXovers()
+        self._stapleBases._syncAllXovers()
         # Command line convenience for -i mode
         if app().v != None:
             app().v[self.number()] = self
 
+    def _setOligoIndex(self, index):
+        """Moves the receiver's oligos to index (None for an index of
+        its own). Should only be called by _setPart and dnapart."""
+        if index == None:
+            index = OligoIndex()
+        if index is self._oligoIndex:
+            return
+        self._oligoIndex.removeHelix(self._storageId)
+        self._oligoIndex = index
+        index.addHelix(self._storageId)
+
     def palette(self):
         if self.part():
             return self.part().palette()
@@ -214,7 +246,7 @@ class VirtualHelix(QObject):
         if self.part():
             self.part().renumberVirtualHelix(self, newNumber)
         else:
-            self._number = newNumber
+            self._setNumber(newNumber)
     
     # Why two setNumber commands? Because we're faced with
     # a bit of a connundrum. We want
@@ -269,7 +301,12 @@ class VirtualHelix(QObject):
     #     would have to touch the ivar self._number directly, which
     #     is mildly bad karma.
     def _setNumber(self, newNumber):
+        parityChanged = (newNumber - self._number) % 2 != 0
         self._number = newNumber
+        if parityChanged:
+            # Strand directions flipped, so the cached L/R flags are stale
+            self._scaffoldBases._refreshAllFlags()
+            self._stapleBases._refreshAllFlags()
 
     def selected(self):
         return self in self.part().selection()
@@ -343,6 +380,19 @@ class VirtualHelix(QObject):
             raise IndexError("%s is not Scaffold=%s or Staple=%s" % \
                          (strandType, StrandType.Scaffold, StrandType.Staple))
 
+    def _setLoopAt(self, strandType, index, loopsize):
+        """Sets (or, for loopsize 0, removes) the loop or skip at index.
+        Loop dicts are only modified through here so that the sequence
+        text of both strands can follow skips (see hasLoopOrSkipAt)."""
+        loop = self._loop(strandType)
+        if loopsize == 0:
+            loop.pop(index, None)
+        else:
+            loop[index] = loopsize
+        for strand in (self._scaffoldBases, self._stapleBases):
+            if index < len(strand):
+                strand._refreshSequenceTextAt(index)
+
     ############################## Access to Bases ###########################
     def indexOfRightmostNonemptyBase(self):
         """
@@ -352,13 +402,8 @@ class VirtualHelix(QObject):
         is used on each vhelix by the part to determine the
         numBases that will effect such a reduction.
         """
-        ret = -1
-        for strandType in (StrandType.Scaffold, StrandType.Staple):
-            strand = self._strand(strandType)
-            for i in range(len(strand)):
-                if not strand[i].isEmpty():
-                    ret = max(ret, i)
-        return ret
+        return max(self._scaffoldBases.indexOfRightmostNonemptyBase(),\
+                   self._stapleBases.indexOfRightmostNonemptyBase())
 
     def hasBaseAt(self, strandType, index):
         """Returns true if a base is present at index on strand strandtype."""
@@ -425,30 +470,30 @@ class VirtualHelix(QObject):
             return base.isEmpty()
 
     def getDragBound(self, strandType, index):
+        """The index an end at index could be dragged out to along its
+        natural 5' (for a 5' end) or 3' (for a 3' end) direction: up to
+        the last empty base before anything nonempty"""
         base = self._baseAt(strandType, index)
         if not base:
             return False
+        fiveTo3 = self.directionOfStrandIs5to3(strandType)
         if base.isEnd() == 5:
-            # keep checking natural 5' neighbor until we hit something
-            while True:
-                nat5 = base._natNeighbor5p()
-                if nat5 == None:  # ran out of neighbors
-                    break
-                if not nat5.isEmpty():  # hit non-empty base
-                    break
-                base = nat5
+            step = -1 if fiveTo3 else 1
         elif base.isEnd() == 3:
-            # keep checking natural 3' neighbor until we hit something
-            while True:
-                nat3 = base._natNeighbor3p()
-                if nat3 == None:  # ran out of neighbor
-                    break
-                if not nat3.isEmpty():  # hit non-empty base
-                    break
-                base = nat3
+            step = 1 if fiveTo3 else -1
         else:
             print "!"
-        return base._n
+            return base._n
+        strand = self._strand(strandType)
+        stop = strand.nextNonemptyIndex(base._n, step)
+        if stop == None:  # ran out of neighbors
+            return 0 if step < 0 else len(strand) - 1
+        return stop - step
+
+    def nearestEndIndex(self, strandType, index, step):
+        """Index of the nearest end (see Base.isEnd) past index in the
+        direction step (1 for right, -1 for left), or None"""
+        return self._strand(strandType).nextEndIndex(index, step)
 
     def hasLoopOrSkipAt(self, strandType, index):
         """
@@ -464,93 +509,43 @@ class VirtualHelix(QObject):
             return 0
 
     def getEndpoints(self, strandType):
-        """docstring for getEndpoints"""
-        ends3, ends5 = [], []
-        strand = self._strand(strandType)
-        for i in range(len(strand)):
-            b = strand[i]
-            if b.is5primeEnd():
-                ends5.append(i)
-            if b.is3primeEnd():
-                ends3.append(i)
-        return (ends3, ends5)
+        """Returns ([3pEndIdx1, ...], [5pEndIdx1, ...])"""
+        return self._strand(strandType).endpoints()
 
-    def getSegmentsAndEndpoints(self, strandType):
+    def getSegmentsAndEndpoints(self, strandType, lo=None, hi=None):
         """Returns a list of segments, endpoints of self in the format
         ([(startIdx, endIdx), ...],
          [3pEndIdx1, 3pEndIdx2, ...], 
          [5pEndIdx1, ...])
         where startIdx and endIdx can be 1.5, 2.5 etc (multiply by base
-        width to see where to draw the lines)"""
-        segments, ends3, ends5 = [], [], []
+        width to see where to draw the lines). Given lo and hi, only the
+        segments through bases lo...hi (and perhaps their neighbors) and
+        the endpoints in lo...hi are returned."""
         strand = self._strand(strandType)
-        i, s = 0, None
-        curColor = None
-        # s is the start index of the segment
-        # segColor is the color of the current segment
-        for i in range(len(strand)):
-            b = strand[i]
-            
-            #Segments
-            if b._connectsToNatL():
-                if curColor and b.getColor() and\
-                   curColor.name() != b.getColor().name():
-                    # print "<B1 %s %s>"%(curColor.name(), b.getColor().name())
-                    segments.append((s,i))
-                    s = i
-                    curColor = b.getColor()
-                if s==None:
-                    s = i
-                    curColor = b.getColor()
-                else:
-                    pass
-            else: # not connected to base on left
-                if s==None:
-                    pass
-                else:
-                    # print "<B2>"
-                    segments.append((s,i))
-                    s = None
-            if b._connectsToNatR():
-                if s==None:
-                    s = i+.5
-                    curColor = b.getColor()
-                else:
-                    pass
-            else: # not connected to base on right
-                if s==None:
-                    pass
-                else:
-                    # print "<B3>"
-                    segments.append((s,i+.5))
-                    s = None
-            #Endpoints
-            if b.is5primeEnd():
-                ends5.append(i)
-            if b.is3primeEnd():
-                ends3.append(i)
+        # Segments are split where the color changes. Scaffold bases
+        # are all drawn in the same color (see Base.getColor).
+        segments = strand.segments(\
+                            splitOnColor=strandType != StrandType.Scaffold,\
+                            lo=lo, hi=hi)
+        ends3, ends5 = strand.endpoints(lo, hi)
         return (segments, ends3, ends5)
 
     def get3PrimeXovers(self, strandType):
         """
         Returns a tuple of tuples of the form 
         ((fromVH, fromIdx), (toVH, strandType, toIdx))
-        or, in the case of a floating crossover,
-        ((fromVH, fromIdx), toQPoint)
         """
-        ret = []
         strand = self._strand(strandType)
-        i, s = 0, None
-        for base in strand:
-            if base.is3primeXover():
-                floatDest = base.floatingXoverDestination()
-                if floatDest:
-                    ret.append(((self, base._n), floatDest))
-                else:
-                    ret.append(( (self, base._n),\
-                                 (base._3pBase.vhelix(),\
-                                  base._3pBase._strandtype,\
-                                  base._3pBase._n) ))
+        if self._part == None:
+            threeHelix, threeIdx = strand._threeHelix, strand._threeIdx
+            return [((self, i),\
+                     (helixForStorageId(threeHelix[i]), strandType, threeIdx[i]))\
+                    for i in strand.threePrimeXoverIndices()]
+        # The part's crossover registry already knows them
+        ret = [((self, fromBase[2]), toBase) for (fromBase, toBase) in\
+               self._part.xoversOnHelix(self)\
+               if fromBase[0] == self and fromBase[1] == strandType]
+        ret.sort(key=lambda xo: xo[0][1])
         return ret
 
     def getXover(self, strandType, idx):
@@ -573,58 +568,46 @@ class VirtualHelix(QObject):
         # print "colorOfBase", idx, c.name(), self._stapleBases[idx].getColor()
         return self._strand(strandType)[idx].getColor()
 
+    def colorIndexOfBase(self, strandType, idx):
+        """An int standing for colorOfBase(strandType, idx): bases of
+        the same color have the same index. Cheaper than colorOfBase
+        for views that cache what they draw by color."""
+        if strandType == StrandType.Scaffold:
+            return 0  # See Base.getColor
+        return self._strand(strandType)._colorIdx[idx]
+
     def numberOfBasesConnectedTo(self, strandType, idx):
-        return self._strand(strandType)[idx]._strandLength
+        return self._strand(strandType).oligoLength(idx)
+
+    def positionInOligo(self, strandType, idx):
+        """Number of bases between the 5' end of the oligo through
+        strandType, idx and that base"""
+        return self._strand(strandType).positionInOligo(idx)
 
     def sequenceForVirtualStrand(self, strandType):
-        if strandType == StrandType.Scaffold:
-            if self._sequenceForScafCache != None:
-                return self._sequenceForScafCache
-            seq = "".join([b.sequence() for b in self._strand(strandType)])
-            self._sequenceForScafCache = seq
-        else: #Staple Strand
-            if self._sequenceForStapCache != None:
-                return self._sequenceForStapCache
-            seq = "".join([b.sequence() for b in self._strand(strandType)])
-            self._sequenceForStapCache = seq
-        return seq
+        """The characters drawn under the bases of the strand, one per
+        base (see Base.sequence). The strand keeps them up to date as
+        sequences, linkages and skips change, so this doesn't walk the
+        bases."""
+        return self._strand(strandType).sequenceText()
 
     def sequenceForLoopAt(self, strandType, idx):
         return self._strand(strandType)[idx].sequenceOfLoop()
 
     def _basesConnectedTo(self, strandType, idx):
         """
-        Private because it returns a set of Base
-        objects.
+        Private because it returns a list of Base
+        objects, ordered 5' to 3' (a circular oligo
+        starts at idx).
         Returns [] if the base at strandType, idx is
         empty
         """
-        ret = []
-        base = self._strand(strandType)[idx]
-        # Back track to the 5' end
-        startBase = base
-        while base._hasNeighbor5p():
-            base = base._neighbor5p()
-            if base==startBase:
-                break
-        startBase = base
-        # Move forward through the linked list,
-        # adding bases to the (not linked) list
-        # we will return
-        if not base.isEmpty():
-            ret.append(base)
-        while base._hasNeighbor3p():
-            neighbor = base._neighbor3p()
-            if neighbor == startBase:
-                break
-            ret.append(neighbor)
-            base = neighbor
-        return ret
+        return self._strand(strandType).oligoBases(idx)
 
     def fivePEndOfSegmentThrough(self, strandType, idx):
-        bases = self._basesConnectedTo(strandType, idx)
-        if bases:
-            return (bases[0]._vhelix, bases[0]._strandtype, bases[0]._n)
+        base = self._strand(strandType).oligoFivePrimeEnd(idx)
+        if base:
+            return (base._vhelix, base._strandtype, base._n)
         else:
             return None
 
@@ -656,6 +639,9 @@ class VirtualHelix(QObject):
         if self._privateUndoStack != None:
             return self._privateUndoStack
         if self.part() != None:
+            if self.part()._preview != None:
+                # Edits made while a preview is shown go into it
+                return self.part()._preview
             return self.part().undoStack()
         if self._privateUndoStack == None:
             #print "Creating detached undo stack for %s" % self
@@ -730,18 +716,28 @@ class VirtualHelix(QObject):
         if self.part():
             self.part().basesModifiedVHs.add(self)
         else:
-            self.basesModified.emit()
+            self._emitBasesModified()
     
     def emitBasesModifiedIfNeeded(self):
         if self.part():
-            for vh in list(self.part().basesModifiedVHs):
-                vh.basesModified.emit()
-            self.part().basesModifiedVHs.clear()
-            self.part()._recalculateStrandLengths()
+            # Emitted from the event loop (or at the end of the part's
+            # transaction) along with every other helix's
+            self.part()._scheduleNotifications()
         else:
-            self.basesModified.emit()
-        self._sequenceForVirtualStrandCache = None
-        #self.part().virtualHelixAtCoordsChanged.emit(*self.coord())
+            self._emitBasesModified()
+
+    def _emitBasesModified(self):
+        self._modifiedRanges = dict((strandType,\
+                                     self._strand(strandType).takeModifiedRanges())\
+                                    for strandType in (StrandType.Scaffold,\
+                                                       StrandType.Staple))
+        self.basesModified.emit()
+
+    def modifiedRanges(self, strandType):
+        """While the receiver emits basesModified, the sorted (lo, hi)
+        ranges (inclusive) of the bases of strandType that changed since
+        it last did, so that views can update just those bases"""
+        return self._modifiedRanges.get(strandType, [])
 
     def connectStrand(self, strandType, startIndex, endIndex, undoable=True,\
                       police=True, color=None):
@@ -794,6 +790,8 @@ class VirtualHelix(QObject):
             if police:  # Check for inconsistencies
                 self.thoughtPolice()
             undoStack.endMacro()
+        else:
+            c.redo()
 
     def installXoverFrom3To5(self, strandType, fromIndex, toVhelix, toIndex,\
            undoable=True, endToTakeColorFrom=3, speedy=False):
@@ -922,57 +920,45 @@ class VirtualHelix(QObject):
             undoStack.endMacro()
         self.emitBasesModifiedIfNeeded()
 
-    def floatingXover(self):
-        """
-        Return the receiver's floating xover in the format:
-        ((fromVH, fromStrand, fromIdx), toPt)
-        or, if there isn't a floating xover, return
-        None
-        """
-        if self.floatingXoverBase != None:
-            fb = self.floatingXoverBase
-            return ((fb._vhelix, fb._strandtype, fb._n),\
-                    fb.floatingXoverDestination())
-        return None
-
-    def setFloatingXover(self, strandType=None, fromIdx=None, toPoint=None):
-        """The floating crossover is a GUI hack that is the
-        temporary crossover shown while the user is using the
-        force tool (pencil tool right click) that has a 3' end
-        wherever the user clicked / is dragging from and ends
-        beneath the mouse."""
-        if self.part():
-            if strandType==None or fromIdx==None or toPoint==None:
-                self.part().updateFloatingXover.emit(None, None)
-            else:
-                self.part().updateFloatingXover.emit((self, strandType, fromIdx),
-                                                     toPoint)
-        if self.floatingXoverBase != None:
-            self.floatingXoverBase._floatingXoverDestination = None
-            self.floatingXoverBase = None
-        if strandType==None or fromIdx==None or toPoint==None:
-            self.setHasBeenModified()
-            self.emitBasesModifiedIfNeeded()
-            return
-        newXoverBase = self._strand(strandType)[fromIdx]
-        newXoverBase._floatingXoverDestination = toPoint
-        self.floatingXoverBase = newXoverBase
-        self.setHasBeenModified()
-        self.emitBasesModifiedIfNeeded()
-
     def autoDragToBoundary(self, strandType, idx):
         """docstring for autoDragToBound"""
         dragBound = self.getDragBound(strandType, idx)
         if idx != dragBound:
             self.connectStrand(strandType, idx, dragBound)
 
-    def autoDragAllBreakpoints(self, strandType):
-        """Called by dnapart, extends all breakpoints as far as
-        they could have manually been dragged in the interface."""
-        ends3, ends5 = self.getEndpoints(strandType)
+    def autoDragTargets(self, strandType):
+        """
+        Returns [(index, dragBound), ...] for every end that
+        autoDragAllBreakpoints extends, in ascending order of index. Ends
+        are dragged left to right, so when two ends face each other
+        across an empty run the left one takes the whole run.
+        """
         strand = self._strand(strandType)
-        for idx in sorted(ends3 + ends5):
-            self.autoDragToBoundary(strandType, idx)
+        ret = []
+        filledTo = -1  # Rightmost base filled by an earlier drag
+        for idx in strand.endIndices():
+            bound = max(self.getDragBound(strandType, idx), filledTo + 1)
+            if bound > idx:
+                filledTo = bound
+            if bound != idx:
+                ret.append((idx, bound))
+        return ret
+
+    def autoDragAllBreakpoints(self, strandType, undoable=True):
+        """Extends all breakpoints as far as they could have manually been
+        dragged in the interface, in one ExtendEndsCommand (see
+        DNAPart.autoDragAllBreakpoints for all helices at once)."""
+        drags = [(self, idx, bound)\
+                 for idx, bound in self.autoDragTargets(strandType)]
+        c = self.ExtendEndsCommand(strandType, drags)
+        if undoable:
+            undoStack = self.undoStack()
+            undoStack.beginMacro("Auto-drag breakpoints")
+            undoStack.push(c)
+            self.thoughtPolice()
+            undoStack.endMacro()
+        else:
+            c.redo()
 
     ################ Private Base Modification API ###########################
     # The Notification Responsibilities of a Command
@@ -980,9 +966,11 @@ class VirtualHelix(QObject):
     #      Judiciously use this method, since all it really does is add the VH
     #      it is called on to a list of dirty VH in the dnapart.
     #   2) Call vh.emitBasesModifiedIfNeeded() when you are done with a command.
-    #      This actually emits the signals (this way, Base can automatically
+    #      This schedules the signals (this way, Base can automatically
     #      decide which VH were dirtied yet a command that affects 20 bases doesn't
-    #      result in 20 duplicate basesModified signals being emitted)
+    #      result in 20 duplicate basesModified signals being emitted). In a
+    #      part they go out once per event loop iteration, see
+    #      DNAPart.flushNotifications.
 
     def thoughtPolice(self):
         """
@@ -991,66 +979,107 @@ class VirtualHelix(QObject):
         to looking for single base crossovers and making
         a connection so that they are no longer single base
         crossovers.
+        Only the bases modified since the last call (plus one
+        base of margin) are examined; see checkThoughtPolice.
+        Inside a DNAPart.transaction this just marks the receiver
+        to be policed once when the transaction ends.
         """
-        if self.prohibitSingleBaseCrossovers:
-            for strandType in (StrandType.Scaffold, StrandType.Staple):
-                strand = self._strand(strandType)
-                for i in range(len(strand)):
-                    b = strand[i]
-                    hasNeighborL = b._hasNeighborL()
-                    hasNeighborR = b._hasNeighborR()
-                    hasXoverL = b._hasCrossoverL()
-                    hasXoverR = b._hasCrossoverR()
-                    if hasXoverL and not hasNeighborR:
-                        self.connectStrand(strandType, i, i+1,\
-                                           undoable=True, police=False)
-                    if hasXoverR and not hasNeighborL:
-                        self.connectStrand(strandType, i-1, i,\
+        if self.part() and self.part()._deferThoughtPolice(self):
+            return
+        self._policeDirtyRanges()
+
+    def _policeDirtyRanges(self):
+        for strandType in (StrandType.Scaffold, StrandType.Staple):
+            strand = self._strand(strandType)
+            ranges = strand.takeDirtyRanges(margin=1)
+            if not self.prohibitSingleBaseCrossovers:
+                continue
+            if self.checkThoughtPolice:
+                found = set()
+                for lo, hi in ranges:
+                    found.update(self._singleBaseXoverFixes(strandType, lo, hi))
+                assert(found == self._singleBaseXoverFixesByFullScan(strandType))
+            attempted = set()
+            while ranges:
+                for lo, hi in ranges:
+                    for fix in self._singleBaseXoverFixes(strandType, lo, hi):
+                        # An earlier fix may have taken care of this one
+                        if fix in attempted or\
+                           not fix in self._singleBaseXoverFixes(strandType,\
+                                                           fix[0], fix[1]):
+                            continue
+                        attempted.add(fix)
+                        self.connectStrand(strandType, fix[0], fix[1],\
                                            undoable=True, police=False)
+                # The fixes dirty their own neighborhoods
+                ranges = strand.takeDirtyRanges(margin=1)
 
+    def _singleBaseXoverFixes(self, strandType, lo, hi):
+        """Returns the (startIndex, endIndex) connectStrand arguments
+        that thoughtPolice would use to fix the single base crossovers
+        in lo..hi (inclusive), in index order"""
+        strand = self._strand(strandType)
+        lone5p, lone3p = strand.loneXoverIndices(lo, hi)
+        if self.directionOfStrandIs5to3(strandType):
+            # L is 5', R is 3'
+            loneL, loneR = lone5p, lone3p
+        else:
+            loneL, loneR = lone3p, lone5p
+        # A crossover on the left with no neighbor on the right gets
+        # connected to the right and vice versa
+        # (Fixes that would run off the end of the helix are no-ops)
+        ret = [(i, (i, i + 1)) for i in loneL if i + 1 < len(strand)] +\
+              [(i, (i - 1, i)) for i in loneR if i > 0]
+        ret.sort()
+        return [fix for (i, fix) in ret]
+
+    def _singleBaseXoverFixesByFullScan(self, strandType):
+        """The per-base scan thoughtPolice used to do, kept as the
+        reference for checkThoughtPolice"""
+        ret = set()
+        strand = self._strand(strandType)
+        for i in range(len(strand)):
+            b = strand[i]
+            if b._hasCrossoverL() and not b._hasNeighborR() and\
+               i + 1 < len(strand):
+                ret.add((i, i + 1))
+            if b._hasCrossoverR() and not b._hasNeighborL() and i > 0:
+                ret.add((i - 1, i))
+        return ret
 
-    class ApplySequenceCommand(QUndoCommand):
+    class ApplySequenceCommand(DeltaCommand):
         def __init__(self, vh, strandType, idx, seqStr):
             """
             Applies seqStr to the oligo connected to (strandType, idx),
             applying the first... [FIX]
             """
-            QUndoCommand.__init__(self)
+            super(VirtualHelix.ApplySequenceCommand, self).__init__()
             self._vh = vh
             self._strandType = strandType
             self._idx = idx
             self._seqStr = seqStr
+            # (index, old size, new size) of the loop the sequence went
+            # into, if it was applied to a staple loop
+            self._loopChange = None
 
-        def redo(self):
+        def _apply(self):
             vh = self._vh
             bases = vh._basesConnectedTo(StrandType.Scaffold, self._idx)
             charactersUsedFromSeqStr = 0
-            self.oldBaseStrs = oldBaseStrs = []
             startBase = vh._strand(StrandType.Scaffold)[self._idx]
-            startBaseComplement = vh._strand(StrandType.Staple)[self._idx]
-            scafBasesInBase = vh.hasLoopOrSkipAt(StrandType.Scaffold, startBase._n)
             stapBasesInBase = vh.hasLoopOrSkipAt(StrandType.Staple, startBase._n)
             if stapBasesInBase and self._strandType == StrandType.Staple:
                 # We are applying to a staple loop
                 startBase = vh._strand(StrandType.Staple)[self._idx]
-                self.oldLoopSeq = startBase._sequence
                 if not startBase._sequence:
                     startBase._sequence = " "
                 startBase._sequence = startBase._sequence[0] + self._seqStr
                 seqLen = len(self._seqStr)
-                if seqLen==0:
-                    del vh._loop(startBase._strandtype)[startBase._n]
-                else:
-                    vh._loop(startBase._strandtype)[startBase._n] = seqLen
+                self._loopChange = (startBase._n, stapBasesInBase, seqLen)
+                vh._setLoopAt(startBase._strandtype, startBase._n, seqLen)
                 vh.setHasBeenModified()
                 vh.emitBasesModifiedIfNeeded()
                 return
-            else:
-                # We use this variable to determine if we 
-                # need to undo an application to an asymmetrical
-                # loop or a strand application, so it always
-                # must be present
-                self.oldLoopSeq = None
             # We aren't applying to a loop, so we must loop through
             # the entire strand and apply to each pair of complementary
             # bases
@@ -1058,7 +1087,6 @@ class VirtualHelix(QObject):
                 b = bases[i]
                 stap_b = b._vhelix._strand(StrandType.Staple)[b._n]
                 numBasesInB = b._vhelix.hasLoopOrSkipAt(StrandType.Scaffold, b._n)+1
-                oldBaseStrs.append((b._sequence, stap_b._sequence))
                 numBasesToUse = numBasesInB
                 if numBasesToUse == 0:
                     seq = " "
@@ -1076,32 +1104,25 @@ class VirtualHelix(QObject):
             vh.setHasBeenModified()
             vh.emitBasesModifiedIfNeeded()
 
+        def redo(self):
+            replay = self._delta != None
+            super(VirtualHelix.ApplySequenceCommand, self).redo()
+            if replay and self._loopChange != None:
+                idx, oldSize, newSize = self._loopChange
+                self._vh._setLoopAt(StrandType.Staple, idx, newSize)
+
         def undo(self):
-            vh = self._vh
-            scafBases = vh._basesConnectedTo(StrandType.Scaffold, self._idx)
-            stapBases = vh._basesConnectedTo(StrandType.Staple, self._idx)
-            startBase = vh._strand(StrandType.Scaffold)[self._idx]
-            startBaseComplement = vh._strand(StrandType.Staple)[self._idx]
-            scafBasesInBase = vh.hasLoopOrSkipAt(StrandType.Scaffold, startBase._n)
-            stapBasesInBase = vh.hasLoopOrSkipAt(StrandType.Staple, startBase._n)
-            if self.oldLoopSeq != None:
-                startBase._sequence = self.oldLoopSeq
-                vh.setHasBeenModified()
-                vh.emitBasesModifiedIfNeeded()
-                return
-            for i in range(len(scafBases)):
-                scafB = scafBases[i]
-                scafBseq = self.oldBaseStrs[i][0]
-                scafB._sequence = scafBseq
-            for i in range(len(stapBases)):
-                stapB = stapBases[i]
-                stapBseq = self.oldBaseStrs[i][1]
-                stapB._sequence = stapBseq
-            vh.setHasBeenModified()
-            vh.emitBasesModifiedIfNeeded()
+            super(VirtualHelix.ApplySequenceCommand, self).undo()
+            if self._loopChange != None:
+                idx, oldSize, newSize = self._loopChange
+                self._vh._setLoopAt(StrandType.Staple, idx, oldSize)
 
+        def discardUndoData(self):
+            super(VirtualHelix.ApplySequenceCommand, self).discardUndoData()
+            self._loopChange = None
 
-    class ApplyColorCommand(QUndoCommand):
+
+    class ApplyColorCommand(DeltaCommand):
         def __init__(self, bases, color):
             super(VirtualHelix.ApplyColorCommand, self).__init__()
             self._bases = list(bases)
@@ -1113,19 +1134,18 @@ class VirtualHelix(QObject):
                 color = QColor()
                 color.setHsv(newHue%256, 255, 255)
             self._newColor = color
-        def redo(self):
-            oc = self._oldColors = []
+
+        def _apply(self):
+            """Colors the bases. Commands that recolor bases as part of
+            their own change call this directly instead of redo."""
             nc = self._newColor
-            vh = None
             for b in self._bases:
-                vh = b._vhelix
-                oc.append(b._setColor(nc))
-        def undo(self):
-            oc = self._oldColors
-            vh = None
-            for b in reversed(self._bases):
-                vh = b._vhelix
-                b._setColor(oc.pop())
+                b._setColor(nc)
+
+        def redo(self):
+            super(VirtualHelix.ApplyColorCommand, self).redo()
+            # Replayed from the delta from now on
+            self._bases = None
 
 
     class LoopCommand(QUndoCommand):
@@ -1145,11 +1165,12 @@ class VirtualHelix(QObject):
                     if self._index in loop:
                         self._oldLoopsize = loop[self._index]
                     # end if
-                    loop[self._index] = self._loopsize # set the model
+                    self._vh._setLoopAt(self._strandType, self._index,\
+                                        self._loopsize)  # set the model
                 else: # trying to set the loop to zero so get rid of it! 
                     if self._index in loop:
                         self._oldLoopsize = loop[self._index]
-                        del loop[self._index]
+                        self._vh._setLoopAt(self._strandType, self._index, 0)
                     # end if
                 # end else
                 self._vh.setHasBeenModified()
@@ -1160,64 +1181,54 @@ class VirtualHelix(QObject):
                 loop = self._vh._loop(self._strandType)
                 assert(self._oldLoopsize != None)  # Must redo/apply before undo
                 if self._oldLoopsize != 0: # if we are not removing the loop
-                    loop[self._index] = self._oldLoopsize
+                    self._vh._setLoopAt(self._strandType, self._index,\
+                                        self._oldLoopsize)
                 else: 
                     if self._index in loop:
-                        del loop[self._index]
+                        self._vh._setLoopAt(self._strandType, self._index, 0)
                     # end if
                 # end else
                 self._vh.setHasBeenModified()
                 self._vh.emitBasesModifiedIfNeeded()
 
 
-    class RemoveBasesCommand(QUndoCommand):
+    class RemoveBasesCommand(DeltaCommand):
         def __init__(self, bases):
             super(VirtualHelix.RemoveBasesCommand, self).__init__()
             self.bases = list(bases)
-        def redo(self):
-            ol = self._oldLinkage = []
+
+        def _apply(self):
             vh = None
             for b in self.bases:
-                ol.append(b._set3Prime(None))
-                ol.append(b._set5Prime(None))
-                vh = b._vhelix
-            if vh:
-                vh.emitBasesModifiedIfNeeded()
-        def undo(self):
-            ol = self._oldLinkage
-            vh = None
-            for b in reversed(self.bases):
-                b._unset5Prime(None, ol.pop())
-                b._unset3Prime(None, ol.pop())
+                b._set3Prime(None)
+                b._set5Prime(None)
                 vh = b._vhelix
             if vh:
                 vh.emitBasesModifiedIfNeeded()
+            self.bases = None
 
 
-    class ConnectStrandCommand(QUndoCommand):
+    class ConnectStrandCommand(DeltaCommand):
         def __init__(self, virtualHelix, strandType, startIndex, endIndex, color=None):
             super(VirtualHelix.ConnectStrandCommand, self).__init__()
             self._vh = virtualHelix
             self._strandType = strandType
             self._startIndex = startIndex
             self._endIndex = endIndex
-            self._oldLinkage = None
-            self._colorSubCommand = None
             self._explicitColor = color
 
-        def redo(self):
+        def _apply(self):
             # Sets {s.n, (s+1).np, ..., (e-2).np, (e-1).np, e.p}
             # st s, s+1, ..., e-1, e are connected
             strand = self._vh._strand(self._strandType)
-            ol = self._oldLinkage = []
             firstIdx = min(self._startIndex, self._endIndex)
             stopIdx = max(self._startIndex, self._endIndex)
             if self._vh.directionOfStrandIs5to3(self._strandType):
                 for i in range(firstIdx, stopIdx):
-                    ol.append(strand[i]._set3Prime(strand[i + 1]))
+                    strand[i]._set3Prime(strand[i + 1])
             else:
                 for i in range(firstIdx, stopIdx):
-                    ol.append(strand[i]._set5Prime(strand[i + 1]))
+                    strand[i]._set5Prime(strand[i + 1])
             # Now ensure all connected bases have the same color
             # which gets taken from the startIndex base
             if self._explicitColor == None:
@@ -1225,46 +1236,61 @@ class VirtualHelix(QObject):
             else:
                 color = self._explicitColor
             bases = self._vh._basesConnectedTo(self._strandType, self._startIndex)
-            self._colorSubCommand = VirtualHelix.ApplyColorCommand(bases, color)
-            self._colorSubCommand.redo()
+            VirtualHelix.ApplyColorCommand(bases, color)._apply()
             self._vh.emitBasesModifiedIfNeeded()
 
+    class ExtendEndsCommand(QUndoCommand):
+        """Drags ends out across empty runs of their strand: drags is a
+        list of (vhelix, index of an end, bound) where every base between
+        the end and bound is empty (see autoDragTargets)"""
+        def __init__(self, strandType, drags):
+            super(VirtualHelix.ExtendEndsCommand, self).__init__()
+            self._strandType = strandType
+            self._drags = drags
+            self._oldColors = None
+
+        def redo(self):
+            self._oldColors = []
+            for vh, idx, bound in self._drags:
+                strand = vh._strand(self._strandType)
+                lo, hi = min(idx, bound), max(idx, bound)
+                # The new bases join the end's oligo and take its color
+                self._oldColors.append(strand._connectRange(lo, hi,\
+                                                    strand._colorIdx[idx]))
+                vh.setHasBeenModified()
+            if self._drags:
+                self._drags[0][0].emitBasesModifiedIfNeeded()
+
         def undo(self):
-            strand = self._vh._strand(self._strandType)
-            ol = self._oldLinkage
-            firstIdx = min(self._startIndex, self._endIndex)
-            stopIdx = max(self._startIndex, self._endIndex)
-            assert(ol != None)  # Must redo/apply before undo
-            if self._vh.directionOfStrandIs5to3(self._strandType):
-                for i in range(stopIdx - 1, firstIdx - 1, -1):
-                    strand[i]._unset3Prime(strand[i + 1],\
-                                           *ol[i - firstIdx])
-            else:
-                for i in range(stopIdx - 1, firstIdx - 1, -1):
-                    strand[i]._unset5Prime(strand[i + 1],\
-                                           *ol[i - firstIdx])
-            self._colorSubCommand.undo()
-            self._vh.emitBasesModifiedIfNeeded()
+            assert(self._oldColors != None)  # Must redo/apply before undo
+            for (vh, idx, bound), oldColors in reversed(zip(self._drags,\
+                                                            self._oldColors)):
+                lo, hi = min(idx, bound), max(idx, bound)
+                vh._strand(self._strandType)._disconnectRange(lo, hi, oldColors)
+                vh.setHasBeenModified()
+            if self._drags:
+                self._drags[0][0].emitBasesModifiedIfNeeded()
+            self._oldColors = None
 
-    class ClearStrandCommand(QUndoCommand):
+    class ClearStrandCommand(DeltaCommand):
         def __init__(self, virtualHelix, strandType, startIndexF, endIndexF, colorL=None, colorR=None):
             super(VirtualHelix.ClearStrandCommand, self).__init__()
             self._vh = virtualHelix
             self._strandType = strandType
             self._startIndexF = min(startIndexF, endIndexF)
             self._endIndexF = max(startIndexF, endIndexF)
-            self._oldLinkage = None
             self._colorL = colorL
             self._colorR = colorR
-    
-        def redo(self):
+            # Loops on the bases the command emptied (the delta only
+            # covers the bases themselves)
+            self.erasedLoopDictItems = {}
+
+        def _apply(self):
             # See docs/virtualhelix.pdf for a description of
             # how each parameter is used.
             strand = self._vh._strand(self._strandType)
-            ol = self._oldLinkage = []
             potentialNewEndpoints = []
             loopDict = self._vh._loop(self._strandType)
-            self.erasedLoopDictItems = {}
             startIdxF = min(self._startIndexF, self._endIndexF)
             endIdxF = max(self._startIndexF, self._endIndexF)
             startFrac, startIdx = modf(startIdxF)
@@ -1282,15 +1308,14 @@ class VirtualHelix(QObject):
             lastBaseToEmpty = endIdx
             # clearedStartR = there is an A
             # clearedEndL = there is a C
-            self.clearedStartR, self.clearedEndL = False, False
+            clearedEndL = False
             if startFrac > .25:
                 if startFrac < .75:
                     # startFrac in (.25, .75)
-                    self.clearedStartR = True
                     startBase = strand[startIdx]
                     # Take care of A
                     potentialNewEndpoints.extend((startBase, startBase._RBase()))
-                    ol.append(startBase._setR(None))
+                    startBase._setR(None)
                     firstBaseToEmpty += 1
                 else:
                     # startFrac in [.75, 1]
@@ -1303,7 +1328,7 @@ class VirtualHelix(QObject):
                     # We put of clearing until after
                     # we clear the Bs so that our
                     # list of new endpoints is in order
-                    self.clearedEndL = True
+                    clearedEndL = True
                     lastBaseToEmpty -= 1
                 else:
                     # endFrac in [0, .25]
@@ -1311,19 +1336,17 @@ class VirtualHelix(QObject):
             else:   # endFrac in [.75, 1]
                 pass
             # Take care of the Bs
-            self.firstBaseToEmpty = firstBaseToEmpty
-            self.lastBaseToEmpty = lastBaseToEmpty
             for i in range(firstBaseToEmpty, lastBaseToEmpty + 1):
                 base = strand[i]
                 potentialNewEndpoints.extend((base, base._LBase()))
-                ol.append(base._setL(None))
+                base._setL(None)
                 potentialNewEndpoints.extend((base, base._RBase()))
-                ol.append(base._setR(None))
-            if self.clearedEndL:
+                base._setR(None)
+            if clearedEndL:
                 endBase = strand[endIdx]
                 # Take care of C
                 potentialNewEndpoints.extend((endBase, endBase._LBase()))
-                ol.append(endBase._setL(None))
+                endBase._setL(None)
             # Now determine which bases were left completely empty
             # by this clear operation that weren't empty before.
             # All bases that we could possibly have left empty that
@@ -1340,16 +1363,12 @@ class VirtualHelix(QObject):
                 lastEmptiedBase -= 1
             # Now that we know which bases got emptied, clear the
             # loops and sequences on those bases
-            self.firstEmptiedBase = firstEmptiedBase
             assert(firstEmptiedBase >= 0)
-            self.lastEmptiedBase = lastEmptiedBase
             assert(lastEmptiedBase < len(strand))
-            self.erasedSequenceItems = []    
             for i in range(firstEmptiedBase, lastEmptiedBase+1):
                 if loopDict.get(i, None) != None:
                     self.erasedLoopDictItems[i] = loopDict[i]
-                    del loopDict[i]
-                self.erasedSequenceItems.append(strand[i]._sequence)
+                    self._vh._setLoopAt(self._strandType, i, 0)
                 strand[i]._sequence = " "
             # Our list of potential endpoints has tons of duplicates
             # and empty bases in it. First, remove the empty bases.
@@ -1374,7 +1393,6 @@ class VirtualHelix(QObject):
             # Could filter out endpoints leading to the same set of
             # connected bases if that becomes a performance issue
             # but I don't anticipate it
-            colorSubCommands = []
             for i in range(len(newEndpts)):
                 e = newEndpts[i]
                 bases = e._vhelix._basesConnectedTo(e._strandtype, e._n)
@@ -1384,56 +1402,33 @@ class VirtualHelix(QObject):
                     color = self._colorL
                 elif i==len(newEndpts)-1 and self._colorR!=None:
                     color = self._colorR
-                c = VirtualHelix.ApplyColorCommand(bases, color)
-                c.redo()
-                colorSubCommands.append(c)
+                VirtualHelix.ApplyColorCommand(bases, color)._apply()
             if len(potentialNewEndpoints) > 0:
                 if self._colorL:
                     bases = self._vh._basesConnectedTo(self._strandType, potentialNewEndpoints[0]._n)
-                    c = VirtualHelix.ApplyColorCommand(bases, self._colorL)
-                    c.redo()
-                    colorSubCommands.append(c)
+                    VirtualHelix.ApplyColorCommand(bases, self._colorL)._apply()
                 if self._colorR:
                     bases = self._vh._basesConnectedTo(self._strandType, potentialNewEndpoints[-1]._n)
-                    c = VirtualHelix.ApplyColorCommand(bases, self._colorR)
-                    c.redo()
-                    colorSubCommands.append(c)
-            self.colorSubCommands = colorSubCommands
+                    VirtualHelix.ApplyColorCommand(bases, self._colorR)._apply()
             self._vh.emitBasesModifiedIfNeeded()
+
+        def redo(self):
+            replay = self._delta != None
+            super(VirtualHelix.ClearStrandCommand, self).redo()
+            if replay:
+                for i in self.erasedLoopDictItems:
+                    self._vh._setLoopAt(self._strandType, i, 0)
     
         def undo(self):
-            strand = self._vh._strand(self._strandType)
-            ol = self._oldLinkage
-            assert(ol != None)  # Must redo/apply before undo
-            startIdxF = min(self._startIndexF, self._endIndexF)
-            endIdxF = max(self._startIndexF, self._endIndexF)
-            startFrac, startIdx = modf(startIdxF)
-            endFrac, endIdx = modf(endIdxF)
-            startIdx, endIdx = int(startIdx), int(endIdx)
-            # If this assert raises an exception, undo() got called without
-            # redo() being called first
-            assert(hasattr(self, 'colorSubCommands'))
-            for c in reversed(self.colorSubCommands):
-                c.undo()
-            del self.colorSubCommands
-            loopDict = self._vh._loop(self._strandType)
+            super(VirtualHelix.ClearStrandCommand, self).undo()
             for k, v in self.erasedLoopDictItems.iteritems():
-                loopDict[k] = v
-            for i in reversed(range(self.firstEmptiedBase, self.lastEmptiedBase+1)):
-                strand[i]._sequence = self.erasedSequenceItems.pop()
-            if self.clearedEndL:
-                endBase = strand[endIdx]
-                endBase._unsetL(None, *ol.pop())
-            for i in reversed(range(self.firstBaseToEmpty, self.lastBaseToEmpty + 1)):
-                base = strand[i]
-                base._unsetR(None, *ol.pop())
-                base._unsetL(None, *ol.pop())
-            if self.clearedStartR:
-                startBase = strand[startIdx]
-                startBase._unsetR(None, *ol.pop())
-            self._vh.emitBasesModifiedIfNeeded()
+                self._vh._setLoopAt(self._strandType, k, v)
 
-    class Connect3To5Command(QUndoCommand):
+        def discardUndoData(self):
+            super(VirtualHelix.ClearStrandCommand, self).discardUndoData()
+            self.erasedLoopDictItems = {}
+
+    class Connect3To5Command(DeltaCommand):
         def __init__(self, strandType, fromHelix, fromIndex, toHelix, toIndex, endToTakeColorFrom=3, speedy=False):
             super(VirtualHelix.Connect3To5Command, self).__init__()
             self._strandType = strandType
@@ -1444,18 +1439,15 @@ class VirtualHelix(QObject):
             self._colorEnd = endToTakeColorFrom
             self._speedy = speedy
 
-        def redo(self):
+        def _apply(self):
             vh, strandType = self._fromHelix, self._strandType
             fromIdx, toIdx = self._fromIndex, self._toIndex
             fromB = vh._strand(strandType)[fromIdx]
             toB = self._toHelix._strand(strandType)[toIdx]
             old3p = fromB._3pBase
             old5p = toB._5pBase
-            self._undoDat = fromB._set3Prime(toB)
+            fromB._set3Prime(toB)
             if self._speedy:
-                self._colorCommand = False
-                self._colorCommand1 = False
-                self._colorCommand2 = False
                 return
             if self._colorEnd == 3:
                 color = vh.colorOfBase(strandType, fromIdx)
@@ -1465,78 +1457,44 @@ class VirtualHelix(QObject):
                 assert(False)
             # Ensure that the newly joined strand is all one color
             bases = vh._basesConnectedTo(strandType, fromIdx)
-            c = VirtualHelix.ApplyColorCommand(bases, color)
-            c.redo()
-            self._colorCommand = c
-            
+            VirtualHelix.ApplyColorCommand(bases, color)._apply()
             # If we had to split a strand to make the crossover, give
             # the resulting segment a random color
-            self._colorCommand1 = None
             if old3p!=None:
                 bases1 = old3p._vhelix._basesConnectedTo(old3p._strandtype, old3p._n)
                 color1 = vh.palette()[0]
-                c1 = VirtualHelix.ApplyColorCommand(bases1, color1)
-                c1.redo()
-                self._colorCommand1 = c1
-            self._colorCommand2 = None
+                VirtualHelix.ApplyColorCommand(bases1, color1)._apply()
             if old5p != None:
                 bases2 = old5p._vhelix._basesConnectedTo(old5p._strandtype, old5p._n)
                 color2 = vh.palette()[1]
-                c2 = VirtualHelix.ApplyColorCommand(bases2, color2)
-                c2.redo()
-                self._colorCommand2 = c2
+                VirtualHelix.ApplyColorCommand(bases2, color2)._apply()
             vh.emitBasesModifiedIfNeeded()
 
-        def undo(self):
-            fromB = self._fromHelix._strand(self._strandType)[self._fromIndex]
-            toB = self._toHelix._strand(self._strandType)[self._toIndex]
-            assert(self._undoDat)  # Must redo/apply before undo
-            fromB._unset3Prime(toB, *self._undoDat)
-            if self._colorCommand != False:
-                self._colorCommand.undo()
-            if self._colorCommand1:
-                self._colorCommand1.undo()
-            if self._colorCommand2:
-                self._colorCommand2.undo()
-            self._fromHelix.emitBasesModifiedIfNeeded()
-
-    class Break3To5Command(QUndoCommand):
+    class Break3To5Command(DeltaCommand):
         def __init__(self, strandType, vhelix, index, endToKeepColor=3, newColor=None):
             super(VirtualHelix.Break3To5Command, self).__init__()
             self._strandType = strandType
-            self._base = vhelix._strand(strandType)[index]
+            self._vh = vhelix
+            self._index = index
             self._endToKeepColor = endToKeepColor
-            self._colorCommand = None
             if newColor==None:
                 newColor = vhelix.palette()[0]
             self._newColor = newColor
 
-        def redo(self):
-            threeB = self._base
-            self._old3pBase = fiveB = threeB._3pBase
+        def _apply(self):
+            threeB = self._vh._strand(self._strandType)[self._index]
+            fiveB = threeB._3pBase
             threeB._set3Prime(None)
             if threeB and self._endToKeepColor==5:
                 color = self._newColor
                 bases = threeB._vhelix._basesConnectedTo(threeB._strandtype, threeB._n)
-                c = VirtualHelix.ApplyColorCommand(bases, color)
-                c.redo()
-                self._colorCommand = c
+                VirtualHelix.ApplyColorCommand(bases, color)._apply()
             elif fiveB and self._endToKeepColor==3:
                 color = self._newColor
                 bases = fiveB._vhelix._basesConnectedTo(fiveB._strandtype, fiveB._n)
-                c = VirtualHelix.ApplyColorCommand(bases, color)
-                c.redo()
-                self._colorCommand = c
+                VirtualHelix.ApplyColorCommand(bases, color)._apply()
             threeB._vhelix.emitBasesModifiedIfNeeded()
 
-        def undo(self):
-            assert(self._old3pBase)
-            base = self._base
-            base._set3Prime(self._old3pBase)
-            base._vhelix.emitBasesModifiedIfNeeded()
-            if self._colorCommand:
-                self._colorCommand.undo()
-
     class SetNumBasesCommand(QUndoCommand):
         def __init__(self, vhelix, newNumBases):
             super(VirtualHelix.SetNumBasesCommand, self).__init__()
@@ -1553,13 +1511,8 @@ class VirtualHelix(QObject):
             if vh.part():
                 # If we are attached to a dnapart we must obey its dimensions
                 assert(vh.part().numBases() == newNumBases)
-            if newNumBases > oldNB:
-                for n in range(oldNB, newNumBases):
-                    vh._stapleBases.append(Base(vh, StrandType.Staple, n))
-                    vh._scaffoldBases.append(Base(vh, StrandType.Scaffold, n))
-            else:
-                del vh._stapleBases[newNumBases:]
-                del vh._scaffoldBases[newNumBases:]
+            vh._stapleBases.resize(newNumBases)
+            vh._scaffoldBases.resize(newNumBases)
             assert(vh.numBases() == newNumBases)
             vh.dimensionsModified.emit()
 
@@ -1570,23 +1523,33 @@ class VirtualHelix(QObject):
     def potentialCrossoverList(self, facingRight, strandType):
         """Returns a list of [neighborVirtualHelix, index] potential
         crossovers"""
-        ret = []  # LUT = Look Up Table
-        part = self._part
-        luts = (part.scafL, part.scafR, part.stapL, part.stapR)
-
-        # these are the list of crossover points simplified
-        lut = luts[int(facingRight) +\
-                   2 * int(strandType == StrandType.Staple)]
+        ret = []
+        # The part caches the indices per neighbor direction
+        table = self._part.potentialCrossoverIndices(strandType, facingRight)
+        neighbors = self.neighbors()
+        for p in range(len(neighbors)):
+            neighbor = neighbors[p]
+            if not neighbor:
+                continue
+            ret.extend([neighbor, index] for index in table[p])
+        return ret
 
+    def possibleNewCrossoverList(self, facingRight, strandType):
+        """The subset of potentialCrossoverList(facingRight, strandType)
+        for which possibleNewCrossoverAt is True, computed a neighbor at a
+        time from the strands' flag masks"""
+        ret = []
+        table = self._part.potentialCrossoverIndices(strandType, facingRight)
+        fromMask = self._strand(strandType).freeForXoverMask()
         neighbors = self.neighbors()
         for p in range(len(neighbors)):
             neighbor = neighbors[p]
             if not neighbor:
                 continue
-            for i, j in product(range(0, self.numBases(), part.step), lut[p]):
-                index = i + j
-                if index < self.numBases():
-                    ret.append([neighbor, index])
+            toMask = neighbor._strand(strandType).freeForXoverMask()
+            ret.extend([neighbor, index] for index in table[p]\
+                       if fromMask[index] == '\x01' and\
+                          index < len(toMask) and toMask[index] == '\x01')
         return ret
 
     def isaXover(self, fromIndex, toVH, toIndex, strandType):
@@ -1619,17 +1582,8 @@ class VirtualHelix(QObject):
         if fromIndex >= self.numBases() or\
            toIndex >= neighbor.numBases():
             return False
-        fromB = self._strand(strandType)[fromIndex]
-        toB = neighbor._strand(strandType)[toIndex]
-        if fromB.isCrossover() or toB.isCrossover():
-            return False
-        else:
-            if strandType == StrandType.Scaffold:
-                return  not self.scaffoldBase(fromIndex).isEmpty() and \
-                    not neighbor.scaffoldBase(toIndex).isEmpty()
-            else:
-                return  not self.stapleBase(fromIndex).isEmpty() and \
-                    not neighbor.stapleBase(toIndex).isEmpty()
+        return self._strand(strandType).isFreeForXover(fromIndex) and\
+               neighbor._strand(strandType).isFreeForXover(toIndex)
 
     def getLeftScafPreCrossoverIndexList(self):
         return self.potentialCrossoverList(False, StrandType.Scaffold)
@@ -1652,6 +1606,11 @@ class VirtualHelix(QObject):
         by the part)"""
         return self._part.getVirtualHelixNeighbors(self)
 
+    def neighborsVersion(self):
+        """Changes whenever neighbors() does (see
+        DNAPart.neighborsVersion)"""
+        return self._part.neighborsVersion(self)
+
     #################### Archiving / Unarchiving #############################
     # A helper method; not part of the archive protocol
     def encodeStrand(self, strandType):
@@ -1685,6 +1644,9 @@ class VirtualHelix(QObject):
         stap = re.split('\s+', completeArchivedDict['staple'])[1:]
         # Did the init method set the number of bases correctly?
         assert(len(scaf) == len(stap) and len(stap) == self.numBases())
+        # Half-linkages are restored one at a time, so let the oligo
+        # index rebuild once afterwards instead of tracking each one
+        self._oligoIndex.invalidate()
         for i in range(len(scaf)):
             self._scaffoldBases[i].setConnectsFromString(scaf[i])
             self._stapleBases[i].setConnectsFromString(stap[i])
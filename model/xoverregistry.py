@@ -0,0 +1,139 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+"""
+xoverregistry.py
+Created by Shawn Douglas on 2011-05-06.
+
+Every crossover in a DNAPart, kept up to date by the StrandArrays of its
+helices as linkages change so that nobody has to scan bases to find them.
+
+A crossover is the tuple (fromBase, toBase) where each base is a
+(vhelix, strandType, index) tuple and fromBase is the 3' side (the base
+whose 3' linkage leaves its natural neighbor). The floating crossover of
+the force tool is drawn by the path view alone and never gets here.
+
+Changes are accumulated and handed to DNAPart.xoversChanged in one batch
+by flush(); a crossover that is added and removed again before the flush
+never shows up in a delta.
+"""
+
+class XoverRegistry(object):
+    def __init__(self, part):
+        super(XoverRegistry, self).__init__()
+        self._part = part
+        self._byFrom = {}  # fromBase -> xover
+        self._byTo = {}  # toBase -> xover
+        self._byPair = {}  # (fromVH, toVH) -> set of xovers
+        self._byHelix = {}  # vh -> set of xovers leaving or entering vh
+        self._added = set()
+        self._removed = set()
+
+    ############################## Access ###############################
+    def xovers(self):
+        return self._byFrom.values()
+
+    def xoverFrom(self, vh, strandType, idx):
+        """The crossover leaving the 3' side of the base, or None"""
+        return self._byFrom.get((vh, strandType, idx))
+
+    def xoverTo(self, vh, strandType, idx):
+        """The crossover entering the 5' side of the base, or None"""
+        return self._byTo.get((vh, strandType, idx))
+
+    def xoversBetween(self, vhA, vhB):
+        """Crossovers from vhA to vhB and from vhB to vhA"""
+        ret = list(self._byPair.get((vhA, vhB), ()))
+        if vhA != vhB:
+            ret.extend(self._byPair.get((vhB, vhA), ()))
+        return ret
+
+    def xoversOnHelix(self, vh):
+        """Crossovers with at least one end on vh"""
+        return list(self._byHelix.get(vh, ()))
+
+    ############################## Update ###############################
+    def setXoverFrom(self, fromBase, toBase):
+        """Records that the crossover leaving fromBase now goes to toBase
+        (None if fromBase no longer has a crossover on its 3' side)"""
+        old = self._byFrom.get(fromBase)
+        if old == None:
+            if toBase == None:
+                return
+        elif old[1] == toBase:
+            return
+        else:
+            self._remove(old)
+        if toBase != None:
+            self._add((fromBase, toBase))
+
+    def removeHelix(self, vh):
+        """Forgets every crossover with an end on vh (which is leaving
+        the part)"""
+        for xo in list(self._byHelix.get(vh, ())):
+            self._remove(xo)
+
+    def _add(self, xo):
+        fromBase, toBase = xo
+        self._byFrom[fromBase] = xo
+        self._byTo[toBase] = xo
+        pair = (fromBase[0], toBase[0])
+        self._byPair.setdefault(pair, set()).add(xo)
+        for vh in pair:
+            self._byHelix.setdefault(vh, set()).add(xo)
+        if xo in self._removed:
+            self._removed.discard(xo)
+        else:
+            self._added.add(xo)
+
+    def _remove(self, xo):
+        fromBase, toBase = xo
+        del self._byFrom[fromBase]
+        if self._byTo.get(toBase) == xo:
+            del self._byTo[toBase]
+        pair = (fromBase[0], toBase[0])
+        self._discardFrom(self._byPair, pair, xo)
+        for vh in pair:
+            self._discardFrom(self._byHelix, vh, xo)
+        if xo in self._added:
+            self._added.discard(xo)
+        else:
+            self._removed.add(xo)
+
+    def _discardFrom(self, index, key, xo):
+        s = index.get(key)
+        if s != None:
+            s.discard(xo)
+            if not s:
+                del index[key]
+
+    def flush(self):
+        """Emits the accumulated changes as one xoversChanged(added,
+        removed) signal, if there are any"""
+        if not self._added and not self._removed:
+            return
+        added, removed = list(self._added), list(self._removed)
+        self._added.clear()
+        self._removed.clear()
+        self._part.xoversChanged.emit(added, removed)
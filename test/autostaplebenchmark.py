@@ -0,0 +1,132 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+
+"""
+autostaplebenchmark.py
+Created by Shawn Douglas on 2011-05-10.
+
+Times DNAPart.autoStaple on honeycomb parts of increasing size and
+reports the peak memory of the process, next to the one-command-per-edit
+autostaple it replaced. Each measurement runs in its own process so that
+the peak memory figures don't carry over.
+
+Usage: From the main cadnano folder: python -m test.autostaplebenchmark
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import resource
+import subprocess
+import time
+from PyQt4.QtGui import QUndoStack
+import cadnano
+from model.document import Document
+from model.dnahoneycombpart import DNAHoneycombPart
+from model.virtualhelix import VirtualHelix
+from model.enum import StrandType
+
+# (rows, columns, bases) of the parts to staple
+sizes = ((2, 3, 210), (4, 6, 420), (6, 8, 672), (10, 10, 1008))
+
+class UndoStackController(object):
+    def __init__(self):
+        self._undoStack = QUndoStack()
+
+    def undoStack(self):
+        return self._undoStack
+
+def makePart(rows, cols, numBases):
+    """A part whose helices each carry a full length scaffold strand"""
+    doc = Document()
+    doc.setController(UndoStackController())
+    part = DNAHoneycombPart()
+    doc.addPart(part)
+    part.setDimensions((max(rows, 2), max(cols, 2), numBases))
+    for row in range(rows):
+        for col in range(cols):
+            vh = VirtualHelix(numBases=numBases)
+            part.addVirtualHelixAt((row, col), vh, noUndo=True)
+            vh.connectStrand(StrandType.Scaffold, 0, numBases - 1,\
+                             undoable=False)
+    return part
+
+def legacyAutoStaple(part):
+    """autoStaple as one undo command per clear, connect and crossover"""
+    vhs = part.getVirtualHelices()
+    with part.transaction("Auto Staple"):
+        for vh in vhs:
+            vh.legacyClearStrand(StrandType.Staple, 1, vh.numBases()-1)
+            segments, ends3, ends5 = vh.getSegmentsAndEndpoints(StrandType.Scaffold)
+            for segStart, segEnd in segments:
+                vh.connectStrand(StrandType.Staple, segStart, segEnd)
+            for i in range(len(segments)-1):
+                segIEnd = segments[i][1]
+                if segIEnd + 1 == segments[i+1][0]:
+                    vh.connectStrand(StrandType.Staple, segIEnd, segIEnd + 1)
+        candidates = part.potentialCrossoverLists(StrandType.Staple,\
+                                                  possibleOnly=True, vhs=vhs)
+        for vh in vhs:
+            for toVH, idx in candidates[vh]:
+                if vh.possibleNewCrossoverAt(StrandType.Staple, idx, toVH, idx):
+                    vh.installXoverFrom3To5(StrandType.Staple, idx, toVH, idx)
+    part.flushNotifications()
+
+def measure(method, rows, cols, numBases):
+    """Prints seconds, peak RSS in kB (KB on Linux, bytes on OS X) and
+    the number of undo commands the autostaple left"""
+    part = makePart(rows, cols, numBases)
+    undoStack = part.undoStack()
+    t = time.time()
+    if method == "legacy":
+        legacyAutoStaple(part)
+    else:
+        part.autoStaple()
+        part.flushNotifications()
+    elapsed = time.time() - t
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    cmd = undoStack.command(undoStack.count() - 1)
+    print elapsed, peak, cmd.childCount()
+
+def main():
+    print "%-16s %8s %8s %10s %10s %10s" % ("part", "bases", "method",\
+                                             "seconds", "peak kB", "commands")
+    for rows, cols, numBases in sizes:
+        for method in ("engine", "legacy"):
+            args = [sys.executable, "-m", "test.autostaplebenchmark",\
+                    method, str(rows), str(cols), str(numBases)]
+            out = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+            elapsed, peak, commands = out.split()[-3:]
+            print "%-16s %8d %8s %10.3f %10s %10s" %\
+                  ("%dx%dx%d" % (rows, cols, numBases),\
+                   rows * cols * numBases, method, float(elapsed), peak,\
+                   commands)
+
+if __name__ == '__main__':
+    cadnano.app().initGui()  # The model expects the app's helix registry
+    if len(sys.argv) == 5:
+        measure(sys.argv[1], *[int(a) for a in sys.argv[2:]])
+    else:
+        main()
@@ -42,7 +42,23 @@ import test.cadnanoguitestcase
 from test.cadnanoguitestcase import CadnanoGuiTestCase
 import time
 from model.virtualhelix import VirtualHelix
+from model.document import Document
+from model.dnahoneycombpart import DNAHoneycombPart
+from model.dnasquarepart import DNASquarePart
 from model.enum import StrandType
+from model.preview import Preview
+import util
+util.qtWrapImport('QtGui', globals(), ['QColor', 'QUndoStack'])
+
+
+class UndoStackController(object):
+    """Stands in for a DocumentController so that a Document has an
+    undo stack"""
+    def __init__(self):
+        self._undoStack = QUndoStack()
+
+    def undoStack(self):
+        return self._undoStack
 
 
 class ModelTests(CadnanoGuiTestCase):
@@ -162,7 +178,607 @@ class ModelTests(CadnanoGuiTestCase):
         vh1.clearStrand(StrandType.Staple, 0, 5)
         self.assertEqual(repr(vh), '0 Scaffold: _,_ _,_ _,_ _,_ _,_ _,_ _,_ _,_\n0 Staple:   _,> <,_ _,> <,> <,> <,> <,> <,_')
         self.assertEqual(repr(vh1), '1 Scaffold: _,_ _,_ _,_ _,_ _,_\n1 Staple:   _,_ _,_ _,_ _,_ _,_')
-        
+
+    def testSegmentsAndEndpoints(self):
+        """
+        Segments, endpoints and crossovers are computed by scanning the
+        strand arrays; make sure they agree with the linkage.
+        """
+        vh = VirtualHelix(numBases=8, idnum=0)
+        vh1 = VirtualHelix(numBases=8, idnum=1)
+        self.assertEqual(vh.getSegmentsAndEndpoints(StrandType.Staple), ([], [], []))
+        self.assertEqual(vh.indexOfRightmostNonemptyBase(), -1)
+        vh.connectStrand(StrandType.Staple, 1, 6)
+        self.assertEqual(vh.getSegmentsAndEndpoints(StrandType.Staple),\
+                         ([(1.5, 6.5)], [1], [6]))
+        self.assertEqual(vh.indexOfRightmostNonemptyBase(), 6)
+        vh1.connectStrand(StrandType.Staple, 0, 7)
+        vh.installXoverFrom3To5(StrandType.Staple, 3, vh1, 3)
+        self.assertEqual(vh.getEndpoints(StrandType.Staple), ([1], [2, 6]))
+        # Only what runs through bases lo...hi
+        self.assertEqual(vh.getSegmentsAndEndpoints(StrandType.Staple, 2, 2),\
+                         ([(1.5, 2.5)], [], [2]))
+        self.assertEqual(vh.getSegmentsAndEndpoints(StrandType.Staple, 4, 7),\
+                         ([(3.5, 6.5)], [], [6]))
+        self.assertEqual(vh.get3PrimeXovers(StrandType.Staple),\
+                         [((vh, 3), (vh1, StrandType.Staple, 3))])
+        self.assertTrue(vh.hasCrossoverAt(StrandType.Staple, 3))
+        self.assertTrue(vh._strand(StrandType.Staple)[3] ==\
+                        vh1._strand(StrandType.Staple)[3]._5pBase)
+        vh.undoStack().undo()
+        self.assertEqual(vh.get3PrimeXovers(StrandType.Staple), [])
+        self.assertEqual(vh.getSegmentsAndEndpoints(StrandType.Staple),\
+                         ([(1.5, 6.5)], [1], [6]))
+
+    def testOligoIndex(self):
+        """
+        Oligo lengths, 5' ends and positions follow the linkage as
+        crossovers split, join and close oligos.
+        """
+        vh = VirtualHelix(numBases=8, idnum=0)
+        vh1 = VirtualHelix(numBases=8, idnum=1)
+        st = StrandType.Staple
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 3), 0)
+        self.assertEqual(vh.fivePEndOfSegmentThrough(st, 3), None)
+        vh.connectStrand(st, 1, 6)
+        vh1.connectStrand(st, 0, 7)
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 1), 6)
+        self.assertEqual(vh.fivePEndOfSegmentThrough(st, 1), (vh, st, 6))
+        self.assertEqual(vh.positionInOligo(st, 1), 5)
+        vh.installXoverFrom3To5(st, 3, vh1, 3)
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 6), 9)
+        self.assertEqual(vh1.numberOfBasesConnectedTo(st, 7), 9)
+        self.assertEqual(vh1.numberOfBasesConnectedTo(st, 0), 3)
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 2), 2)
+        self.assertEqual(vh1.fivePEndOfSegmentThrough(st, 5), (vh, st, 6))
+        self.assertEqual(vh1.positionInOligo(st, 5), 6)
+        self.assertEqual([(b._vhelix, b._n) for b in vh._basesConnectedTo(st, 4)],\
+                         [(vh, 6), (vh, 5), (vh, 4), (vh, 3), (vh1, 3),\
+                          (vh1, 4), (vh1, 5), (vh1, 6), (vh1, 7)])
+        # Closing the oligo into a loop leaves it without a 5' end
+        vh1.installXoverFrom3To5(st, 7, vh, 6)
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 3), 9)
+        self.assertEqual(vh1.fivePEndOfSegmentThrough(st, 4), (vh1, st, 4))
+        self.assertEqual(vh1._basesConnectedTo(st, 4)[-1]._n, 3)
+        vh1.undoStack().undo()
+        vh.undoStack().undo()
+        self.assertEqual(vh.numberOfBasesConnectedTo(st, 3), 6)
+        self.assertEqual(vh1.numberOfBasesConnectedTo(st, 3), 8)
+        self.assertEqual(vh1.fivePEndOfSegmentThrough(st, 3), (vh1, st, 0))
+
+    def testOligoIndexPerPart(self):
+        """
+        Each part indexes the oligos of its own helices; a helix leaving
+        the part takes its nodes out of the part's index.
+        """
+        partA, partB = DNAHoneycombPart(), DNAHoneycombPart()
+        for part in (partA, partB):
+            doc = Document()
+            doc.setController(UndoStackController())
+            doc.addPart(part)
+        vhA, vhB = VirtualHelix(idnum=0), VirtualHelix(idnum=0)
+        partA.addVirtualHelixAt((0, 0), vhA, noUndo=True)
+        partB.addVirtualHelixAt((0, 0), vhB, noUndo=True)
+        st = StrandType.Scaffold
+        vhA.connectStrand(st, 2, 9)
+        vhB.connectStrand(st, 4, 5)
+        self.assertEqual(vhA.numberOfBasesConnectedTo(st, 2), 8)
+        self.assertEqual(vhB.numberOfBasesConnectedTo(st, 4), 2)
+        self.assertTrue(vhA._oligoIndex is partA._oligoIndex)
+        partB._oligoIndex.invalidate()
+        self.assertFalse(partA._oligoIndex.isDirty())
+        vh1 = VirtualHelix(idnum=1)
+        partA.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        vh1.connectStrand(st, 0, 3)
+        partA._removeHelixAt((0, 1))
+        self.assertFalse(vh1._oligoIndex is partA._oligoIndex)
+        self.assertEqual(vhA.numberOfBasesConnectedTo(st, 2), 8)
+        self.assertEqual(vh1.numberOfBasesConnectedTo(st, 0), 4)
+        self.assertEqual(partA._oligoIndex.helixIds(), set([vhA._storageId]))
+        nodes = set(partA._oligoIndex._prio)
+        self.assertEqual(nodes, set(vhA._scaffoldBases._node | i\
+                                    for i in range(2, 10)))
+
+    def testXoverRegistry(self):
+        """
+        The part's crossover registry follows the linkage and reports
+        what changed in batches.
+        """
+        doc = Document()
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        deltas = []
+        part.xoversChanged.connect(lambda a, r: deltas.append((a, r)))
+        st = StrandType.Staple
+        vh0.connectStrand(st, 1, 20, undoable=False)
+        vh1.connectStrand(st, 1, 20, undoable=False)
+        self.assertEqual(part.xovers(), [])
+        vh0.installXoverFrom3To5(st, 7, vh1, 7, undoable=False)
+        xo = ((vh0, st, 7), (vh1, st, 7))
+        self.assertEqual(deltas, [])  # Deferred to the event loop
+        part.flushNotifications()
+        self.assertEqual(deltas, [([xo], [])])
+        self.assertEqual(part.xovers(), [xo])
+        self.assertEqual(part.xoversBetween(vh1, vh0), [xo])
+        self.assertEqual(vh0.get3PrimeXovers(st), [((vh0, 7), (vh1, st, 7))])
+        self.assertEqual(vh1.get3PrimeXovers(st), [])
+        vh0.setSandboxed(True)  # The document has no controller/undo stack
+        vh0.clearStrand(st, 7, 7.5)
+        part.flushNotifications()
+        self.assertEqual(deltas[-1], ([], [xo]))
+        self.assertEqual(part.xovers(), [])
+        self.assertEqual(part.xoversOnHelix(vh1), [])
+
+    def testPotentialCrossovers(self):
+        """
+        Potential crossover tables are shared per lattice/length and the
+        batch filter agrees with possibleNewCrossoverAt.
+        """
+        doc = Document()
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        st = StrandType.Staple
+        table = part.potentialCrossoverIndices(st, True)
+        self.assertTrue(part.potentialCrossoverIndices(st, True) is table)
+        part.setDimensions((30, 32, part.numBases()))  # invalidates
+        self.assertFalse(part.potentialCrossoverIndices(st, True) is table)
+        table = part.potentialCrossoverIndices(st, True)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        self.assertEqual(vh0.potentialCrossoverList(True, st),\
+                         [[vh1, i] for i in table[0]])
+        self.assertEqual(vh0.possibleNewCrossoverList(True, st), [])
+        vh0.connectStrand(st, 0, part.numBases() - 1, undoable=False)
+        vh1.connectStrand(st, 0, 20, undoable=False)
+        possible = vh0.possibleNewCrossoverList(True, st)
+        self.assertEqual(possible, [[vh1, i] for i in table[0] if i <= 20])
+        self.assertEqual(part.potentialCrossoverLists(st, True,\
+                                                      possibleOnly=True)[vh0],\
+                         possible)
+        for toVH, idx in vh0.potentialCrossoverList(True, st):
+            self.assertEqual([toVH, idx] in possible,\
+                             vh0.possibleNewCrossoverAt(st, idx, toVH, idx))
+
+    def testThoughtPoliceDirtyRanges(self):
+        """
+        thoughtPolice only looks at the bases touched since it last ran;
+        checkThoughtPolice makes it compare against the full scan.
+        """
+        st = StrandType.Staple
+        vh = VirtualHelix(numBases=40, idnum=0)
+        vh1 = VirtualHelix(numBases=40, idnum=1)
+        strand = vh._strand(st)
+        vh.connectStrand(st, 10, 12, undoable=False)
+        self.assertEqual(strand.takeDirtyRanges(margin=1), [(9, 13)])
+        self.assertEqual(strand.takeDirtyRanges(), [])
+        VirtualHelix.checkThoughtPolice = True
+        try:
+            vh.connectStrand(st, 0, 39)
+            vh1.connectStrand(st, 0, 39)
+            vh.installXoverFrom3To5(st, 20, vh1, 20)
+            # Clearing 21..25 would leave 20 a single base crossover
+            vh.clearStrand(st, 20.5, 25)
+            self.assertTrue(strand[20]._hasNeighborR())
+            self.assertFalse(strand[22]._hasNeighborL())
+        finally:
+            VirtualHelix.checkThoughtPolice = False
+
+    def testModifiedRanges(self):
+        """
+        While a helix emits basesModified, modifiedRanges reports the
+        bases changed since it last did.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh = VirtualHelix(idnum=0)
+        part.addVirtualHelixAt((0, 0), vh, noUndo=True)
+        part.flushNotifications()
+        reported = []
+        vh.basesModified.connect(lambda: reported.append(\
+                (vh.modifiedRanges(StrandType.Scaffold),\
+                 vh.modifiedRanges(StrandType.Staple))))
+        vh.connectStrand(StrandType.Staple, 3, 6)
+        vh.connectStrand(StrandType.Staple, 12, 14)
+        part.flushNotifications()
+        self.assertEqual(reported, [([], [(3, 6), (12, 14)])])
+        part.undoStack().undo()
+        part.flushNotifications()
+        self.assertEqual(reported[1], ([], [(12, 14)]))
+        # Color and sequence edits leave the linkage alone but are reported
+        vh.applyColorAt(QColor(0, 0, 255), StrandType.Staple, 3)
+        part.flushNotifications()
+        self.assertEqual(reported[2], ([], [(3, 6)]))
+        vh.connectStrand(StrandType.Scaffold, 3, 6)
+        part.flushNotifications()
+        vh.applySequenceAt(StrandType.Scaffold, 3, "ACGT")
+        part.flushNotifications()
+        self.assertEqual(reported[4], ([(3, 6)], [(3, 6)]))
+
+    def testOccupancyMap(self):
+        """
+        The part's occupancy map follows linkage changes, undo and helices
+        leaving the part, and answers indexOfRightmostNonemptyBase.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        self.assertEqual(part.indexOfRightmostNonemptyBase(), -1)
+        vh0.connectStrand(StrandType.Scaffold, 2, 8)
+        vh1.connectStrand(StrandType.Scaffold, 5, 12)
+        vh1.connectStrand(StrandType.Staple, 10, 20)
+        changed = lambda a, b: set(part.helicesChangedBetweenSlices(\
+                                                StrandType.Scaffold, a, b))
+        self.assertEqual(changed(0, 3), set([vh0]))
+        self.assertEqual(changed(3, 6), set([vh1]))
+        self.assertEqual(changed(0, 6), set([vh0, vh1]))
+        self.assertEqual(changed(6, 7), set())
+        self.assertEqual(part.indexOfRightmostNonemptyBase(), 20)
+        part.undoStack().undo()
+        self.assertEqual(part.indexOfRightmostNonemptyBase(), 12)
+        part.undoStack().undo()
+        self.assertEqual(changed(3, 6), set())
+        self.assertEqual(part.indexOfRightmostNonemptyBase(), 8)
+        part._removeHelixAt((0, 0))
+        self.assertEqual(changed(0, 3), set())
+        self.assertEqual(part.indexOfRightmostNonemptyBase(), -1)
+
+    def testTransaction(self):
+        """
+        A transaction is one undo entry, polices each helix once at the end
+        and emits basesModified once per modified helix.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        undoStack = doc.undoStack()
+        emitted = []
+        vh0.basesModified.connect(lambda: emitted.append(0))
+        vh1.basesModified.connect(lambda: emitted.append(1))
+        st = StrandType.Staple
+        entries = undoStack.count()
+        with part.transaction("Connect"):
+            vh0.connectStrand(st, 0, 20)
+            vh1.connectStrand(st, 0, 20)
+            vh0.installXoverFrom3To5(st, 7, vh1, 7)
+            vh0.clearStrand(st, 7.5, 12)
+            self.assertEqual(emitted, [])
+            # Not policed yet: 7 is a single base crossover
+            self.assertFalse(vh0.hasNeighborR(st, 7))
+        self.assertTrue(vh0.hasNeighborR(st, 7))
+        part.flushNotifications()
+        self.assertEqual(sorted(emitted), [0, 1])
+        self.assertEqual(undoStack.count(), entries + 1)
+        del emitted[:]
+        undoStack.undo()
+        part.flushNotifications()
+        self.assertEqual(sorted(emitted), [0, 1])
+        part.flushNotifications()
+        self.assertEqual(len(emitted), 2)
+        self.assertFalse(vh0.hasStrandAt(st, 3))
+        self.assertEqual(part.xovers(), [])
+
+    def testNeighborTable(self):
+        """
+        The part's neighbor table matches the lattice as helices come
+        and go, for both lattices.
+        """
+        def expected(part, vh):
+            r, c = vh.coord()
+            if part.virtualHelixParityEven(vh):
+                offsets = part._neighborOffsetsEven
+            else:
+                offsets = part._neighborOffsetsOdd
+            return [part.getVirtualHelix((r + dr, c + dc))\
+                    for dr, dc in offsets]
+        for partClass, numDirections in ((DNAHoneycombPart, 3),\
+                                         (DNASquarePart, 4)):
+            doc = Document()
+            doc.setController(UndoStackController())
+            part = partClass()
+            doc.addPart(part)
+            coords = [(1, 1), (1, 2), (0, 1), (2, 1), (1, 0), (2, 2)]
+            vhs = []
+            for coord in coords:
+                vh = VirtualHelix(numBases=part.numBases())
+                part.addVirtualHelixAt(coord, vh)
+                vhs.append(vh)
+            center = vhs[0]
+            self.assertEqual(len(center.neighbors()), numDirections)
+            self.assertFalse(None in center.neighbors())
+            for vh in vhs:
+                self.assertEqual(vh.neighbors(), expected(part, vh))
+            before = center.neighborsVersion()
+            farVersion = vhs[5].neighborsVersion()
+            doc.undoStack().undo()  # Removes (2, 2)
+            doc.undoStack().undo()  # Removes (1, 0)
+            for vh in vhs[:4]:
+                self.assertEqual(vh.neighbors(), expected(part, vh))
+            self.assertFalse(vhs[4] in center.neighbors())
+            self.assertNotEqual(center.neighborsVersion(), before)
+            doc.undoStack().redo()
+            doc.undoStack().redo()
+            self.assertEqual(vhs[5].neighbors(), expected(part, vhs[5]))
+            self.assertNotEqual(vhs[5].neighborsVersion(), farVersion)
+
+    def testSequenceText(self):
+        """
+        sequenceForVirtualStrand follows sequence, linkage and skip changes
+        """
+        vh = VirtualHelix(numBases=8, idnum=0)
+        scaf, stap = StrandType.Scaffold, StrandType.Staple
+        vh.connectStrand(scaf, 0, 7, undoable=False)
+        self.assertEqual(vh.sequenceForVirtualStrand(scaf), " " * 8)
+        vh.applySequenceAt(scaf, 0, "ACGTACGT", undoable=False)
+        seq = "".join(vh._strand(scaf)[i].sequence() for i in range(8))
+        self.assertEqual(seq, "ACGTACGT")
+        self.assertEqual(vh.sequenceForVirtualStrand(scaf), seq)
+        self.assertEqual(vh.sequenceForVirtualStrand(stap), " " * 8)
+        vh.clearStrand(scaf, 5.5, 8, undoable=True)
+        self.assertEqual(vh.sequenceForVirtualStrand(scaf), seq[:6] + "  ")
+        vh.installLoop(scaf, 3, -1, undoable=False)
+        vh.applySequenceAt(scaf, 0, "ACGTACGT", undoable=False)
+        self.assertEqual(vh.sequenceForVirtualStrand(scaf)[3], " ")
+
+    def testApplyScaffoldSequence(self):
+        """
+        applyScaffoldSequence writes every scaffold oligo and the staple
+        bases across from it in one undoable step.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        scaf, stap = StrandType.Scaffold, StrandType.Staple
+        vh0.connectStrand(scaf, 2, 5, undoable=False)
+        vh1.connectStrand(scaf, 2, 4, undoable=False)
+        vh0.connectStrand(stap, 0, 8, undoable=False)
+        vh1.installLoop(scaf, 3, -1, undoable=False)
+        before = [vh.sequenceForVirtualStrand(st) for vh in (vh0, vh1)\
+                                                  for st in (scaf, stap)]
+        part.applyScaffoldSequence("ACGTT")
+        # vh0 runs 5' to 3' left to right, vh1 the other way
+        self.assertEqual(vh0.sequenceForVirtualStrand(scaf)[2:6], "ACGT")
+        self.assertEqual(vh1.sequenceForVirtualStrand(scaf)[2:5], "C A")
+        self.assertEqual(vh0.sequenceForVirtualStrand(stap)[:7], "  TGCA ")
+        doc.undoStack().undo()
+        self.assertEqual(before, [vh.sequenceForVirtualStrand(st)\
+                                  for vh in (vh0, vh1) for st in (scaf, stap)])
+
+    def testAutoStaple(self):
+        """
+        autoStaple lays staples over the scaffold and crosses them over
+        between neighbors, as a single undo entry.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        scaf, stap = StrandType.Scaffold, StrandType.Staple
+        last = vh0.numBases() - 1
+        vh0.connectStrand(scaf, 0, last, undoable=False)
+        vh1.connectStrand(scaf, 0, last, undoable=False)
+        vh0.connectStrand(stap, 3, 9, undoable=False)
+        before = [vh.getSegmentsAndEndpoints(stap) for vh in (vh0, vh1)]
+        count = doc.undoStack().count()
+        part.autoStaple()
+        self.assertEqual(doc.undoStack().count(), count + 1)
+        xovers = part.xoversBetween(vh0, vh1)
+        self.assertTrue(xovers)
+        for (fromVH, st, fromIdx), (toVH, st, toIdx) in xovers:
+            self.assertEqual(st, stap)
+            self.assertEqual(fromIdx, toIdx)
+            self.assertTrue(vh0.hasStrandAt(stap, fromIdx))
+        # Every staple oligo is colored, and all of its bases alike
+        for vh in (vh0, vh1):
+            for idx in range(vh.numBases()):
+                bases = vh._basesConnectedTo(stap, idx)
+                colors = set(b.getColor().name() for b in bases)
+                self.assertEqual(len(colors), 1)
+        doc.undoStack().undo()
+        self.assertEqual(before, [vh.getSegmentsAndEndpoints(stap)\
+                                  for vh in (vh0, vh1)])
+        self.assertFalse(part.xoversBetween(vh0, vh1))
+
+    def testAutoDragBreakpoints(self):
+        """
+        Ends are dragged across the empty runs next to them, the left end
+        winning a run two ends face across, in one undo entry.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0 = VirtualHelix(idnum=0)  # Scaffold runs 5' to 3' rightwards
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        scaf = StrandType.Scaffold
+        last = vh0.numBases() - 1
+        vh0.connectStrand(scaf, 5, 8, undoable=False)
+        vh0.connectStrand(scaf, 15, 18, undoable=False)
+        self.assertEqual(vh0.getDragBound(scaf, 5), 0)
+        self.assertEqual(vh0.getDragBound(scaf, 8), 14)
+        self.assertEqual(vh0.getDragBound(scaf, 15), 9)
+        self.assertEqual(vh0.nearestEndIndex(scaf, 10, -1), 8)
+        self.assertEqual(vh0.nearestEndIndex(scaf, 18, 1), None)
+        count = doc.undoStack().count()
+        part.autoDragAllBreakpoints()
+        self.assertEqual(doc.undoStack().count(), count + 1)
+        self.assertEqual(vh0.getSegmentsAndEndpoints(scaf)[0],\
+                         [(.5, 14.5), (15.5, last + .5)])
+        doc.undoStack().undo()
+        self.assertEqual(vh0.getSegmentsAndEndpoints(scaf)[0],\
+                         [(5.5, 8.5), (15.5, 18.5)])
+
+    def testAddVirtualHelices(self):
+        """
+        addVirtualHelicesAt adds a batch of helices as one undo entry and
+        reports them with a single virtualHelicesAtCoordsChanged.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        batches, singles = [], []
+        part.virtualHelicesAtCoordsChanged.connect(batches.append)
+        part.virtualHelixAtCoordsChanged.connect(\
+                                    lambda r, c: singles.append((r, c)))
+        coords = [(0, 0), (0, 1), (1, 1)]
+        part.addVirtualHelicesAt([(coords[0], VirtualHelix(), 4),\
+                                  (coords[1], VirtualHelix(), None),\
+                                  (coords[2], VirtualHelix(), None)])
+        self.assertEqual(batches, [coords])
+        self.assertEqual(singles, [])
+        self.assertEqual(part.getVirtualHelix((0, 0)).number(), 4)
+        self.assertEqual(len(part.selection()), 3)
+        vh1 = part.getVirtualHelix((0, 1))
+        self.assertTrue(part.getVirtualHelix((0, 0)) in vh1.neighbors())
+        doc.undoStack().undo()
+        self.assertEqual(list(part.getVirtualHelices()), [])
+        self.assertEqual(part.selection(), [])
+        self.assertEqual(len(batches), 2)
+
+    def testSetDimensions(self):
+        """
+        setDimensions resizes every helix in one undo entry; truncation
+        unlinks crossovers into the bases it cuts off until undone.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        stap = StrandType.Staple
+        oldNB = part.numBases()
+        vh0.connectStrand(stap, 10, 30, undoable=False)
+        vh1.connectStrand(stap, 30, 40, undoable=False)
+        vh0.installXoverFrom3To5(stap, 30, vh1, 30, undoable=False)
+        self.assertEqual(len(part.xoversBetween(vh0, vh1)), 1)
+        changes = []
+        part.dimensionsDidChange.connect(lambda: changes.append(1))
+        count = doc.undoStack().count()
+        dim = part.dimensions()
+        part.setDimensions((dim[0], dim[1], 21))
+        self.assertEqual(doc.undoStack().count(), count + 1)
+        self.assertEqual(changes, [1])
+        self.assertEqual((vh0.numBases(), vh1.numBases()), (21, 21))
+        self.assertFalse(part.xoversBetween(vh0, vh1))
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0], [(10.5, 20.5)])
+        doc.undoStack().undo()
+        self.assertEqual(vh0.numBases(), oldNB)
+        self.assertEqual(len(part.xoversBetween(vh0, vh1)), 1)
+        self.assertEqual(vh1.getSegmentsAndEndpoints(stap)[0], [(30.5, 40.5)])
+        part.setDimensions((dim[0], dim[1], oldNB + 21))
+        self.assertEqual(vh1.numBases(), oldNB + 21)
+        self.assertEqual(len(part.xoversBetween(vh0, vh1)), 1)
+
+    def testUndoBudget(self):
+        """
+        Edits keep their undo state as compact deltas; past the document's
+        undo memory budget the oldest steps can no longer be undone.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0 = VirtualHelix(idnum=0)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        stap = StrandType.Staple
+        u = doc.undoStack()
+        vh0.connectStrand(stap, 0, 20)
+        use = doc.undoMemoryUse()
+        self.assertTrue(0 < use < 2000)
+        vh0.clearStrand(stap, 9.5, 10.5)
+        self.assertTrue(doc.undoMemoryUse() > use)
+        u.undo()
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0], [(.5, 20.5)])
+        u.redo()
+        doc.setUndoMemoryBudget(0)
+        vh0.connectStrand(stap, 30, 40)
+        # Only the most recent step keeps its undo data
+        self.assertTrue(doc.undoMemoryUse() <= use)
+        for i in range(u.count()):
+            u.undo()
+        self.assertEqual(u.index(), u.count() - 1)
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0],\
+                         [(.5, 9.5), (10.5, 20.5)])
+        # Snapshot based commands give their memory back too
+        doc.setUndoMemoryBudget(256 * 1024 * 1024)
+        vh0.connectStrand(StrandType.Scaffold, 0, 41)
+        part.autoStaple()
+        vh0.connectStrand(stap, 50, 60)
+        self.assertTrue(doc.undoMemoryUse() > 2000)
+        doc.setUndoMemoryBudget(0)
+        self.assertTrue(doc.undoMemoryUse() <= use)
+        def held(c):
+            return (c.undoMemory() if hasattr(c, 'undoMemory') else 0) +\
+                   sum(held(c.child(i)) for i in range(c.childCount()))
+        for i in range(u.count() - 1):
+            self.assertEqual(held(u.command(i)), 0)
+
+    def testPreview(self):
+        """
+        A preview shows edits without putting them on the undo stack or
+        emitting basesModified, and commits them as one undo entry.
+        """
+        doc = Document()
+        doc.setController(UndoStackController())
+        part = DNAHoneycombPart()
+        doc.addPart(part)
+        vh0, vh1 = VirtualHelix(idnum=0), VirtualHelix(idnum=1)
+        part.addVirtualHelixAt((0, 0), vh0, noUndo=True)
+        part.addVirtualHelixAt((0, 1), vh1, noUndo=True)
+        stap = StrandType.Staple
+        u = doc.undoStack()
+        vh0.connectStrand(stap, 0, 20)
+        vh1.connectStrand(stap, 0, 20)
+        part.flushNotifications()
+        count = u.count()
+        modified, previewed = [], []
+        vh0.basesModified.connect(lambda: modified.append(vh0))
+        vh0.basesPreviewed.connect(lambda *r: previewed.append(r))
+        preview = Preview(part)
+        preview.show(lambda: vh0.connectStrand(stap, 20, 30))
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0], [(.5, 30.5)])
+        self.assertEqual(previewed, [(stap, 20, 30)])
+        # Dragging back only redraws the bases that changed
+        preview.show(lambda: vh0.connectStrand(stap, 20, 25))
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0], [(.5, 25.5)])
+        self.assertEqual(previewed[1:], [(stap, 25, 30)])
+        part.flushNotifications()
+        self.assertEqual((u.count(), modified), (count, []))
+        preview.commit()
+        part.flushNotifications()
+        self.assertEqual((u.count(), modified), (count + 1, [vh0]))
+        u.undo()
+        self.assertEqual(vh0.getSegmentsAndEndpoints(stap)[0], [(.5, 20.5)])
+        # Crossovers show up while previewed and go away when cleared
+        preview.show(lambda: vh0.installXoverFrom3To5(stap, 7, vh1, 7))
+        self.assertEqual(len(part.xovers()), 1)
+        preview.clear()
+        self.assertEqual(part.xovers(), [])
+        self.assertEqual(vh1.getSegmentsAndEndpoints(stap)[0], [(.5, 20.5)])
+        self.assertEqual(u.count(), count + 1)
 
 if __name__ == '__main__':
     print "Running Model Tests"
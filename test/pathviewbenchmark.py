@@ -0,0 +1,118 @@
+# The MIT License
+#
+# Copyright (c) 2011 Wyss Institute at Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# http://www.opensource.org/licenses/mit-license.php
+
+
+"""
+pathviewbenchmark.py
+Created by Shawn Douglas on 2011-06-01.
+
+Times frames of the path view's CustomQGraphicsView panning across an
+autostapled honeycomb part with a scaffold sequence, at a zoom level
+in each of PathHelix's levels of detail (see PathHelix.paint), next to
+the same frames drawn at full detail.
+
+Usage: From the main cadnano folder: python -m test.pathviewbenchmark
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import time
+from PyQt4.QtGui import QTransform
+import cadnano
+from model.enum import StrandType
+from model.virtualhelix import VirtualHelix
+from views import styles
+from views.pathview.pathhelix import PathHelix
+
+# (rows, columns, bases) of the part
+size = (6, 8, 2016)
+# Frames drawn per measurement
+numFrames = 30
+# The tiers, by the on-screen width of a base in pixels
+tiers = (("far", styles.PATH_LOD_FAR_BASE_WIDTH / 2.),\
+         ("middle", (styles.PATH_LOD_FAR_BASE_WIDTH +\
+                     styles.PATH_LOD_NEAR_BASE_WIDTH) / 2.),\
+         ("near", styles.PATH_BASE_WIDTH))
+
+def makeDocument(rows, cols, numBases):
+    """The document controller of a new document displaying a part whose
+    helices carry a full length scaffold strand and autostapled staples"""
+    app = cadnano.app()
+    app.initGui()
+    dc = list(app.documentControllers)[0]
+    dc.addHoneycombHelixGroup()
+    part = dc.activePart()
+    part.setDimensions((part.dimensions()[0], part.dimensions()[1], numBases),\
+                       undoable=False)
+    for row in range(rows):
+        for col in range(cols):
+            vh = VirtualHelix(numBases=numBases)
+            part.addVirtualHelixAt((row, col), vh, noUndo=True)
+            vh.connectStrand(StrandType.Scaffold, 0, numBases - 1,\
+                             undoable=False)
+    part.autoStaple()
+    vh = part.getVirtualHelix((0, 0))
+    vh.applySequenceAt(StrandType.Scaffold, 0, "ACGT" * (numBases // 4),\
+                       undoable=False)
+    part.flushNotifications()
+    dc.pathHelixGroup.setDisplayedVHs(part.getVirtualHelices())
+    dc.win.show()
+    app.processEvents()
+    return dc
+
+def frameTime(view, screenBaseWidth):
+    """Seconds per frame spent redrawing the view while it pans along the
+    helices at the given zoom"""
+    scale = screenBaseWidth / styles.PATH_BASE_WIDTH
+    view.setTransform(QTransform.fromScale(scale, scale))
+    rect = view.scene().itemsBoundingRect()
+    step = view.viewport().width() / scale / 4
+    x = rect.left()
+    t = time.time()
+    for i in range(numFrames):
+        view.centerOn(x, rect.center().y())
+        view.viewport().repaint()
+        x += step
+        if x > rect.right():
+            x = rect.left()
+    return (time.time() - t) / numFrames
+
+def main():
+    rows, cols, numBases = size
+    dc = makeDocument(rows, cols, numBases)
+    view = dc.win.pathGraphicsView
+    print "%dx%dx%d part, %d frames each" % (rows, cols, numBases, numFrames)
+    print "%-8s %10s %12s %12s" % ("tier", "px/base", "ms (LOD)", "ms (full)")
+    for name, screenBaseWidth in tiers:
+        PathHelix.drawLevelsOfDetail = True
+        lod = frameTime(view, screenBaseWidth)
+        PathHelix.drawLevelsOfDetail = False
+        full = frameTime(view, screenBaseWidth)
+        print "%-8s %10.1f %12.2f %12.2f" % (name, screenBaseWidth,\
+                                             lod * 1000, full * 1000)
+    PathHelix.drawLevelsOfDetail = True
+
+if __name__ == '__main__':
+    main()
@@ -40,6 +40,46 @@ util.qtWrapImport('QtGui', globals(), ['QBrush', 'QFont', 'QGraphicsItem',\
 FromSide = "FromSide"
 ToSide = "ToSide"
 
+def xoverPath(threeInsetPt, threeExitPt, fiveEnterPt, fiveInsetPt, orient3,\
+              sameStrand, sameParity):
+    """The path of a crossover: in from the middle of the 3' base to
+    where the strand leaves it, a quad curve to where it enters the 5'
+    base, and on to the middle of that base"""
+    xScale = styles.PATH_XOVER_LINE_SCALE_X  # control point x constant
+    yScale = styles.PATH_XOVER_LINE_SCALE_Y  # control point y constant
+    # Determine control point of quad curve
+    c1 = QPointF()
+    # case 1: same strand
+    if sameStrand:
+        dx = abs(fiveEnterPt.x() - threeExitPt.x())
+        c1.setX(0.5 * (threeExitPt.x() + fiveEnterPt.x()))
+        if orient3 in [HandleOrient.LeftUp, HandleOrient.RightUp]:
+            c1.setY(threeExitPt.y() - yScale * dx)
+        else:
+            c1.setY(threeExitPt.y() + yScale * dx)
+    # case 2: same parity
+    elif sameParity:
+        dy = abs(fiveEnterPt.y() - threeExitPt.y())
+        c1.setX(threeExitPt.x() + xScale * dy)
+        c1.setY(0.5 * (threeExitPt.y() + fiveEnterPt.y()))
+    # case 3: different parity
+    else:
+        if orient3 == HandleOrient.LeftUp:
+            c1.setX(threeExitPt.x() - xScale *\
+                    abs(fiveEnterPt.y() - threeExitPt.y()))
+        else:
+            c1.setX(threeExitPt.x() + xScale *\
+                    abs(fiveEnterPt.y() - threeExitPt.y()))
+        c1.setY(0.5 * (threeExitPt.y() + fiveEnterPt.y()))
+
+    # Construct painter path
+    painterpath = QPainterPath()
+    painterpath.moveTo(threeInsetPt)
+    painterpath.lineTo(threeExitPt)
+    painterpath.quadTo(c1, fiveEnterPt)
+    painterpath.lineTo(fiveInsetPt)
+    return painterpath
+
 class XoverHandle(QGraphicsItem):
     """
     This class lets us draw crossovers as a child below pathhelixgroup
@@ -127,11 +167,11 @@ class XoverHandle(QGraphicsItem):
 class XoverHandlePair(QGraphicsItem):
     """
     XoverHandlePair responds to mouse input and serves as an interface
-    for adding scaffold crossovers.
+    for adding scaffold crossovers. The path view uses one for the force
+    tool's floating crossover; the crossovers in the model are drawn by
+    an XoverHandleGroup.
     """
     _baseWidth = styles.PATH_BASE_WIDTH
-    _xScale = styles.PATH_XOVER_LINE_SCALE_X  # control point x constant
-    _yScale = styles.PATH_XOVER_LINE_SCALE_Y  # control point y constant
 
     def __init__(self, phg, fromBase, toBase):
         """Create XoverHandlePair (parented to the PathHelixGroup)."""
@@ -228,10 +268,7 @@ class XoverHandlePair(QGraphicsItem):
             return
         self.scene().removeItem(self._xover5prime)
         self.scene().removeItem(self._xover3prime)
-        key = self.keyMe()
         self.scene().removeItem(self)
-        if key in self._phg.xovers:
-            del self._phg.xovers[self.keyMe()]
         self._fromVH = self._toVH = None
 
     def representedXoverExistsInModel(self):
@@ -241,15 +278,8 @@ class XoverHandlePair(QGraphicsItem):
                                          self._toIdx,\
                                          self._fromStrand)
             return retv
-        if self._toPt != None:
-            floatingXover = self._fromVH.floatingXover()
-            # floatingXover[0] is the (vh, st, idx)
-            if floatingXover == None:
-                return False
-            retv = floatingXover[0] == (self._fromVH,\
-                                        self._fromStrand,\
-                                        self._fromIdx)
-            return retv
+        # The floating crossover is never in the model; its
+        # PathHelixGroup decides where it goes
         return True
 
     def refresh(self):
@@ -358,43 +388,14 @@ class XoverHandlePair(QGraphicsItem):
             fiveInsetPt = self._xover5prime.centerPoint()
             fiveInsetPt = self.mapFromItem(self._xover5prime, fiveInsetPt)
             
-        # Determine control point of quad curve
-        c1 = QPointF()
         if floatPos and not self._toVH:
             sameStrand = False
             sameParity = False
         else:
             sameStrand = self._fromVH == self._toVH
             sameParity = self._fromVH.evenParity() == self._toVH.evenParity()
-        # case 1: same strand
-        if sameStrand:
-            dx = abs(fiveEnterPt.x() - threeExitPt.x())
-            c1.setX(0.5 * (threeExitPt.x() + fiveEnterPt.x()))
-            if orient3 in [HandleOrient.LeftUp, HandleOrient.RightUp]:
-                c1.setY(threeExitPt.y() - self._yScale * dx)
-            else:
-                c1.setY(threeExitPt.y() + self._yScale * dx)
-        # case 2: same parity
-        elif sameParity:
-            dy = abs(fiveEnterPt.y() - threeExitPt.y())
-            c1.setX(threeExitPt.x() + self._xScale * dy)
-            c1.setY(0.5 * (threeExitPt.y() + fiveEnterPt.y()))
-        # case 3: different parity
-        else:
-            if orient3 == HandleOrient.LeftUp:
-                c1.setX(threeExitPt.x() - self._xScale *\
-                        abs(fiveEnterPt.y() - threeExitPt.y()))
-            else:
-                c1.setX(threeExitPt.x() + self._xScale *\
-                        abs(fiveEnterPt.y() - threeExitPt.y()))
-            c1.setY(0.5 * (threeExitPt.y() + fiveEnterPt.y()))
-
-        # Construct painter path
-        painterpath = QPainterPath()
-        painterpath.moveTo(threeInsetPt)
-        painterpath.lineTo(threeExitPt)
-        painterpath.quadTo(c1, fiveEnterPt)
-        painterpath.lineTo(fiveInsetPt)
+        painterpath = xoverPath(threeInsetPt, threeExitPt, fiveEnterPt,\
+                                fiveInsetPt, orient3, sameStrand, sameParity)
         self._painterpath = painterpath
         return painterpath
     # end def
@@ -407,7 +408,335 @@ class XoverHandlePair(QGraphicsItem):
         penW = self.getPen().widthF()
         newRect.adjust(-penW, -penW, 2*penW, 2*penW)
         if self._rect != newRect:
+            # Before the change, so that the old rect gets repainted too
+            self.prepareGeometryChange()
             self._rect = newRect
+
+# end class
+
+
+class XoverHandleGroup(QGraphicsItem):
+    """
+    Draws every crossover of the part a PathHelixGroup shows, and removes
+    the crossover at a base when either of its ends is clicked.
+
+    The crossovers are slots in a few parallel lists: the crossover, its
+    path, its pen and where its two helix number labels go (in the
+    receiver's coordinates). A slot is filled in when DNAPart.xoversChanged
+    adds its crossover and freed when it removes it; its geometry is only
+    recomputed when the PathHelix of one of its helices moves, and its pen
+    only when basesModified comes from one of its helices. Crossovers
+    are painted with one drawPath per (3' helix, pen) and labels with one
+    per helix, from paths built when something in them changed.
+    """
+    _baseWidth = styles.PATH_BASE_WIDTH
+    _toHelixNumFont = styles.XOVER_LABEL_FONT
+    fm = QFontMetrics(_toHelixNumFont)
+    _labelBrush = QBrush(Qt.SolidPattern)
+    _pens = {}  # (rgba, highlight) -> QPen
+
+    def __init__(self, phg):
+        super(XoverHandleGroup, self).__init__(phg)
+        self.setZValue(styles.ZXOVERHANDLEPAIR)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self._phg = phg
+        # One entry per slot; a free slot's crossover is None
+        self._xovers = []  # (fromBase, toBase)
+        self._paths = []  # QPainterPath, None if an end isn't displayed
+        self._labels = []  # ((vh, QPointF, text), (vh, QPointF, text))
+        self._penKeys = []
+        self._freeSlots = []
+        self._slotOfXover = {}
+        self._slotsOfHelix = {}  # vh -> slots of crossovers with an end on vh
+        self._slotsOfEnd = {}  # base -> slots of crossovers ending there
+        self._placements = {}  # vh -> where its PathHelix was (see _placement)
+        # (3' vhelix, pen key) -> slots, and their paths and rects when built
+        self._groups = {}
+        self._groupPaths = {}
+        # vh -> paths and rects of its labels when built
+        self._labelPaths = {}
+        self._rect = None
+
+    def xovers(self):
+        return [xo for xo in self._xovers if xo != None]
+
+    ############################## Updates ##############################
+    def xoversChanged(self, added, removed):
+        """Applies crossovers added to and removed from the part (see
+        DNAPart.xoversChanged)"""
+        for xo in removed:
+            slot = self._slotOfXover.pop(xo, None)
+            if slot == None:
+                continue
+            self._unplace(slot)
+            for base in xo:
+                vh = base[0]
+                slots = self._slotsOfHelix.get(vh)
+                if slots != None:
+                    slots.discard(slot)
+                    if not slots:
+                        del self._slotsOfHelix[vh]
+                        del self._placements[vh]
+                        self._labelPaths.pop(vh, None)
+                slots = self._slotsOfEnd.get(base)
+                if slots != None:
+                    slots.discard(slot)
+                    if not slots:
+                        del self._slotsOfEnd[base]
+            self._xovers[slot] = None
+            self._freeSlots.append(slot)
+        for xo in added:
+            if xo in self._slotOfXover:
+                continue
+            if self._freeSlots:
+                slot = self._freeSlots.pop()
+                self._xovers[slot] = xo
+            else:
+                slot = len(self._xovers)
+                self._xovers.append(xo)
+                self._paths.append(None)
+                self._labels.append(None)
+                self._penKeys.append(None)
+            self._slotOfXover[xo] = slot
+            for base in xo:
+                vh = base[0]
+                if not vh in self._slotsOfHelix:
+                    self._slotsOfHelix[vh] = set()
+                    self._placements[vh] = self._placement(vh)
+                self._slotsOfHelix[vh].add(slot)
+                if not base in self._slotsOfEnd:
+                    self._slotsOfEnd[base] = set()
+                self._slotsOfEnd[base].add(slot)
+            self._place(slot)
+
+    def helixBasesModified(self, vh):
+        """Refreshes the pens of the crossovers on vh, which follow the
+        color and oligo length of their 3' bases"""
+        if not vh in self._slotsOfHelix:
+            return
+        if self._placement(vh) != self._placements[vh]:
+            # Renumbering flipped the helix's parity
+            self.helicesMoved()
+        for slot in self._slotsOfHelix[vh]:
+            if self._penKey(slot) != self._penKeys[slot]:
+                self._unplace(slot)
+                self._place(slot)
+
+    def helicesMoved(self, vhs=None):
+        """Recomputes the crossovers on helices whose PathHelix moved, was
+        added or went away. vhs, if given, are the only helices that can
+        have done so."""
+        if vhs == None:
+            vhs = self._slotsOfHelix.keys()
+        moved = set()
+        for vh in vhs:
+            if not vh in self._slotsOfHelix:
+                continue
+            placement = self._placement(vh)
+            if placement != self._placements[vh]:
+                self._placements[vh] = placement
+                moved.update(self._slotsOfHelix[vh])
+        for slot in moved:
+            self._unplace(slot)
+            self._place(slot)
+
+    def _placement(self, vh):
+        ph = self._phg.pathHelixForVHelix(vh)
+        if ph == None:
+            return None
+        return (ph.pos().x(), ph.pos().y(), vh.evenParity())
+
+    def _unplace(self, slot):
+        """Takes slot out of the paths that draw it"""
+        if self._paths[slot] == None:
+            return
+        group = (self._xovers[slot][0][0], self._penKeys[slot])
+        self._groups[group].discard(slot)
+        if not self._groups[group]:
+            del self._groups[group]
+        self._groupPaths.pop(group, None)
+        for vh, pt, text in self._labels[slot]:
+            self._labelPaths.pop(vh, None)
+        self._paths[slot] = self._labels[slot] = None
+        self._geometryChanged()
+
+    def _place(self, slot):
+        """Computes the path, labels and pen of slot and has the paths
+        that draw it rebuilt"""
+        fromBase, toBase = self._xovers[slot]
+        self._penKeys[slot] = self._penKey(slot)
+        path, labels = self._geometry(fromBase, toBase)
+        if path == None:
+            return  # An end's helix isn't displayed
+        self._paths[slot], self._labels[slot] = path, labels
+        group = (fromBase[0], self._penKeys[slot])
+        self._groups.setdefault(group, set()).add(slot)
+        self._groupPaths.pop(group, None)
+        for vh, pt, text in labels:
+            self._labelPaths.pop(vh, None)
+        self._geometryChanged()
+
+    def _geometryChanged(self):
+        if self._rect != None:
+            # Before the change, so that the old rect gets repainted too
             self.prepareGeometryChange()
+            self._rect = None
+        self.update()
+
+    ############################# Geometry ##############################
+    def _penKey(self, slot):
+        fromVH, fromStrand, fromIdx = self._xovers[slot][0]
+        highlight = False
+        if fromStrand == StrandType.Staple:
+            oligoLength = fromVH.numberOfBasesConnectedTo(fromStrand, fromIdx)
+            highlight = oligoLength > styles.oligoLenAboveWhichHighlight or \
+                        oligoLength < styles.oligoLenBelowWhichHighlight
+        return (fromVH.colorOfBase(fromStrand, fromIdx).rgba(), highlight)
+
+    @classmethod
+    def penForKey(cls, key):
+        pen = cls._pens.get(key)
+        if pen != None:
+            return pen
+        rgba, highlight = key
+        color = QColor.fromRgba(rgba)
+        pen = QPen(color)
+        pen.setWidth(styles.PATH_STRAND_STROKE_WIDTH)
+        if highlight:
+            pen.setWidth(styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH)
+            color.setAlpha(128)
+            pen.setColor(color)
+        pen.setCapStyle(Qt.SquareCap)
+        cls._pens[key] = pen
+        return pen
+
+    def _basePoints(self, base):
+        """(ph, upper left corner, strand exit point, center) of base in
+        the receiver's coordinates, or None if its helix isn't displayed"""
+        vh, strandType, idx = base
+        ph = self._phg.pathHelixForVHelix(vh)
+        if ph == None:
+            return None
+        bw = self._baseWidth
+        x, y = ph.baseLocation(strandType, idx)
+        corner = ph.pos() + QPointF(x, y)
+        exitY = 0 if ph.strandIsTop(strandType) else bw
+        return (ph, corner, corner + QPointF(bw / 2.0, exitY),\
+                corner + QPointF(bw / 2.0, bw / 2.0))
+
+    def _geometry(self, fromBase, toBase):
+        """The path of the crossover from fromBase to toBase and its two
+        labels, as (vh, baseline point, text), or (None, None) if the
+        helix of either end isn't displayed (see XoverHandlePair.painterPath
+        for how the curve goes)"""
+        threePts, fivePts = self._basePoints(fromBase), self._basePoints(toBase)
+        if threePts == None or fivePts == None:
+            return (None, None)
+        bw = self._baseWidth
+        fromVH, fromStrand = fromBase[0], fromBase[1]
+        toVH, toStrand = toBase[0], toBase[1]
+        threeExitPt, fiveEnterPt = threePts[2], fivePts[2]
+        if fromVH.directionOfStrandIs5to3(fromStrand):
+            orient3 = HandleOrient.LeftUp
+            labelRect3 = QRectF(threeExitPt.x() - 0.75*bw,\
+                                threeExitPt.y() - 1.5*bw, bw, bw)
+        else:
+            orient3 = HandleOrient.RightDown
+            labelRect3 = QRectF(threeExitPt.x() - 0.25*bw,\
+                                threeExitPt.y() + 0.5*bw, bw, bw)
+        if toVH.directionOfStrandIs5to3(toStrand):
+            labelRect5 = QRectF(fiveEnterPt.x() - 0.25*bw,\
+                                fiveEnterPt.y() - 1.5*bw, bw, bw)
+        else:
+            labelRect5 = QRectF(fiveEnterPt.x() - 0.75*bw,\
+                                fiveEnterPt.y() + 0.5*bw, bw, bw)
+        path = xoverPath(threePts[3], threeExitPt, fiveEnterPt, fivePts[3],\
+                         orient3, fromVH == toVH,\
+                         fromVH.evenParity() == toVH.evenParity())
+        labels = (self._label(fromVH, labelRect3), self._label(toVH, labelRect5))
+        return (path, labels)
 
+    def _label(self, vh, rect):
+        """The (vh, baseline point, text) of a label centered in rect"""
+        text = str(vh.number())
+        x = rect.center().x() - self.fm.width(text) / 2.0
+        y = rect.center().y() + (self.fm.ascent() - self.fm.descent()) / 2.0
+        return (vh, QPointF(x, y), text)
+
+    def _groupPath(self, group):
+        built = self._groupPaths.get(group)
+        if built == None:
+            path = QPainterPath()
+            for slot in self._groups[group]:
+                path.addPath(self._paths[slot])
+            penW = self.penForKey(group[1]).widthF()
+            rect = path.controlPointRect().adjusted(-penW, -penW, penW, penW)
+            built = self._groupPaths[group] = (path, rect)
+        return built
+
+    def _labelPath(self, vh):
+        built = self._labelPaths.get(vh)
+        if built == None:
+            path = QPainterPath()
+            for slot in self._slotsOfHelix.get(vh, ()):
+                if self._labels[slot] == None:
+                    continue
+                for labelVH, pt, text in self._labels[slot]:
+                    if labelVH == vh:
+                        path.addText(pt, self._toHelixNumFont, text)
+            built = self._labelPaths[vh] = (path, path.boundingRect())
+        return built
+
+    ############################# Drawing ###############################
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        painter.setBrush(Qt.NoBrush)
+        for group in self._groups:
+            path, rect = self._groupPath(group)
+            if rect.intersects(exposed):
+                painter.setPen(self.penForKey(group[1]))
+                painter.drawPath(path)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self._labelBrush)
+        for vh in self._slotsOfHelix:
+            path, rect = self._labelPath(vh)
+            if rect.intersects(exposed):
+                painter.drawPath(path)
+
+    def boundingRect(self):
+        if self._rect == None:
+            rect = QRectF()
+            for group in self._groups:
+                rect = rect.united(self._groupPath(group)[1])
+            for vh in self._slotsOfHelix:
+                rect = rect.united(self._labelPath(vh)[1])
+            self._rect = rect
+        return self._rect
+
+    ############################## Events ###############################
+    def xoverEndAt(self, pos):
+        """The base (vh, strandType, index) under pos, in the receiver's
+        coordinates, if a crossover ends there, otherwise None"""
+        ph = self._phg.pathHelixAtScenePos(self.mapToScene(pos))
+        if ph == None:
+            return None
+        pt = ph.mapFromItem(self, pos)
+        loc = ph.baseAtLocation(pt.x(), pt.y())
+        if loc == None:
+            return None
+        base = (ph.vhelix(), loc[0], loc[1])
+        for slot in self._slotsOfEnd.get(base, ()):
+            if self._paths[slot] != None:
+                return base
+        return None
+
+    def contains(self, pos):
+        return self.xoverEndAt(pos) != None
+
+    def mousePressEvent(self, event):
+        base = self.xoverEndAt(event.pos())
+        if self._phg.dragging or base == None:
+            return QGraphicsItem.mousePressEvent(self, event)
+        vh, strandType, idx = base
+        vh.removeXoversAt(strandType, idx)
 # end class
@@ -55,6 +55,7 @@ class PathHelixHandle(QGraphicsItem):
         super(PathHelixHandle, self).__init__(parent)
         self.vhelix = vhelix
         vhelix.part().virtualHelixAtCoordsChanged.connect(self.someVHChangedItsNumber)
+        vhelix.part().virtualHelicesAtCoordsChanged.connect(self.someVHsChangedTheirNumbers)
         
         self.parent = parent
         self._phg = parent
@@ -96,6 +97,10 @@ class PathHelixHandle(QGraphicsItem):
         if (r,c) == self.vhelix.coord():
             self.setNumber()
 
+    def someVHsChangedTheirNumbers(self, coordsList):
+        if self.vhelix.coord() in coordsList:
+            self.setNumber()
+
     def setNumber(self):
         """docstring for setNumber"""
         if self.label == None:
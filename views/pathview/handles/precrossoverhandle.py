@@ -30,6 +30,8 @@ from exceptions import AttributeError, NotImplementedError
 from model.enum import StrandType, Parity, BreakType, HandleOrient
 from views import styles
 from itertools import product
+from bisect import bisect_left, bisect_right
+from math import floor
 
 import util
 # import Qt stuff into the module namespace with PySide, PyQt4 independence
@@ -61,8 +63,21 @@ _ppathRD = QPainterPath()
 hashMarkGen(_ppathRD, _ppRect.topRight(), _pathUCenter, _pathCenter)
 _ppathLD = QPainterPath()
 hashMarkGen(_ppathLD, _ppRect.topLeft(), _pathUCenter, _pathCenter)
+#Look Up Table, indexed by 2*orientedLeft + onTopStrand
+_pathLUT = (_ppathRD, _ppathRU, _ppathLD, _ppathLU)
 
-class PreCrossoverHandle(QGraphicsItem):
+class PreCrossoverHandleGroup(QGraphicsItem):
+    """
+    The pre-crossover handles of a PathHelix: a hash mark and the number
+    of the neighbor for each potential crossover from the helix to one
+    of its neighbors, which installs the crossover when clicked.
+    The handles are rows of a few parallel lists sorted by index, which
+    a single item paints (only over the exposed bases) and hit-tests by
+    index arithmetic. A handle is hidden where its base already has a
+    crossover and grayed out where no new crossover could be formed;
+    both are refreshed only for the bases reported by basesModified or
+    basesPreviewed on the helix or its neighbors.
+    """
     scafpen = QPen(styles.pch_scaf_stroke, styles.PATH_STRAND_STROKE_WIDTH)
     scafpen.setCapStyle(Qt.FlatCap)  # or Qt.RoundCap
     scafpen.setJoinStyle(Qt.RoundJoin)
@@ -72,108 +87,190 @@ class PreCrossoverHandle(QGraphicsItem):
     disabpen = QPen(styles.pch_disab_stroke, styles.PATH_STRAND_STROKE_WIDTH)
     disabpen.setCapStyle(Qt.FlatCap)
     disabpen.setJoinStyle(Qt.RoundJoin)
-    disabbrush = QBrush(styles.pch_disab_stroke)  # For the helix number label
-    enabbrush = QBrush(Qt.SolidPattern)  # Also for the helix number label
     baseWidth = styles.PATH_BASE_WIDTH
-    rect = QRectF(0, 0, styles.PATH_BASE_WIDTH, styles.PATH_BASE_WIDTH)
     toHelixNumFont = styles.XOVER_LABEL_FONT
 
     # precalculate the height of a number font.  Assumes a fixed font
     # and that only numbers will be used for labels
     fm = QFontMetrics(toHelixNumFont)
-    
-    def __init__(self, parentPH, fromStrand, fromIdx, toVH, toIdx, orientedLeft):
-        super(PreCrossoverHandle, self).__init__(parentPH)
-        self.fromVH = parentPH.vhelix()
-        self.fromStrand = fromStrand
-        self.fromIdx = fromIdx
-        self.toVH = toVH
-        self.toIdx = toIdx
-        self.orientedLeft = orientedLeft
-
-        self.fromVH.basesModified.connect(self.updateVisibilityAndEnabledness)
-        self.toVH.basesModified.connect(self.updateVisibilityAndEnabledness)
-
-        x = self.baseWidth * self.fromIdx
-        y = (-1.25 if self.onTopStrand() else 2.25) * self.baseWidth
-        self.setPos(x, y)
-        halfLabelH = self.fm.tightBoundingRect(str(toVH.number())).height()/2
-        #halfLabelW = self.fm.boundingRect(str(toVH.number())).width()/2
-        labelX = 0
-        
-        if self.onTopStrand():
-            labelY = -1.05*halfLabelH - .5
-        else:
-            labelY = 1.05*halfLabelH + .5
-        self.labelRect = QRectF(labelX,\
-                                labelY,\
-                                self.baseWidth, self.baseWidth)
-        self._isLabelVisible = False
-        self.updateVisibilityAndEnabledness()
+
+    def __init__(self, parentPH):
+        super(PreCrossoverHandleGroup, self).__init__(parentPH)
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self._parentPH = parentPH
+        self.fromVH = fromVH = parentPH.vhelix()
+        bw = self.baseWidth
+        handles = []
+        for strandType, facingRight in\
+          product((StrandType.Scaffold, StrandType.Staple), (True, False)):
+            # Get potential crossovers in [neighborVirtualHelix, index] format
+            potentialXOvers = fromVH.potentialCrossoverList(facingRight, strandType)
+            numBases = fromVH.numBases()
+            assert(all(index < numBases for neighborVH, index in potentialXOvers))
+            for (neighborVH, fromIdx) in potentialXOvers:
+                handles.append((fromIdx, strandType, neighborVH, not facingRight))
+        # The sort is stable, so of the handles on one base the last one
+        # listed is drawn on top and takes the clicks
+        handles.sort(key=lambda h: h[0])
+        self._idx = [h[0] for h in handles]
+        self._strandType = [h[1] for h in handles]
+        self._toVH = [h[2] for h in handles]
+        self._orientedLeft = [h[3] for h in handles]
+        self._onTop = [parentPH.strandIsTop(st) for st in self._strandType]
+        self._labels = [str(vh.number()) for vh in self._toVH]
+        self._visible = bytearray(len(handles))
+        self._enabled = bytearray(len(handles))
+        # Positions of the hash marks and their labels relative to the
+        # hash marks, above the helix for the top strand and below it
+        # for the bottom one
+        halfLabelH = self.fm.tightBoundingRect("0").height() / 2
+        self._topY, self._bottomY = -1.25 * bw, 2.25 * bw
+        self._topLabelRect = QRectF(0, -1.05 * halfLabelH - .5, bw, bw)
+        self._bottomLabelRect = QRectF(0, 1.05 * halfLabelH + .5, bw, bw)
+        self._rect = QRectF(0, self._topY - bw, numBases * bw,\
+                            self._bottomY - self._topY + 3 * bw)
+        self._connections = []
+        for vh in set([fromVH] + self._toVH):
+            for signal, slot in ((vh.basesModified, self._basesModifiedSlot(vh)),\
+                                 (vh.basesPreviewed, self._basesPreviewed)):
+                signal.connect(slot)
+                self._connections.append((signal, slot))
+        self.refresh(0, numBases - 1)
     # end def
-        
-    def drawLabel(self, painter):
-        painter.setBrush(self.labelBrush)
-        painter.setFont(self.toHelixNumFont)
-        painter.drawText(self.labelRect, Qt.AlignCenter, str(self.toVH.number() ) )
+
+    def destroy(self):
+        for signal, slot in self._connections:
+            signal.disconnect(slot)
+        self._connections = []
+        if self.scene():
+            self.scene().removeItem(self)
+    # end def
+
+    def _basesModifiedSlot(self, vh):
+        def basesModified():
+            for strandType in (StrandType.Scaffold, StrandType.Staple):
+                for lo, hi in vh.modifiedRanges(strandType):
+                    self.refresh(lo, hi)
+        return basesModified
+    # end def
+
+    def _basesPreviewed(self, strandType, lo, hi):
+        self.refresh(lo, hi)
+
+    def handleCount(self):
+        return len(self._idx)
+
+    def handleIndexRange(self, lo, hi):
+        """The (first, last + 1) handle numbers of the handles on bases
+        lo...hi (inclusive)"""
+        return bisect_left(self._idx, lo), bisect_right(self._idx, hi)
+
+    def refresh(self, lo, hi):
+        """Updates whether the handles on bases lo...hi are visible and
+        enabled and redraws those that changed"""
+        fromVH = self.fromVH
+        first, last = self.handleIndexRange(lo, hi)
+        for i in xrange(first, last):
+            strandType, idx = self._strandType[i], self._idx[i]
+            visible = not fromVH.hasCrossoverAt(strandType, idx)
+            enabled = fromVH.possibleNewCrossoverAt(strandType, idx,\
+                                                    self._toVH[i], idx)
+            if visible != self._visible[i] or enabled != self._enabled[i]:
+                self._visible[i], self._enabled[i] = visible, enabled
+                self.update(self.handleRect(i))
     # end def
-        
-    def onTopStrand(self):
-        return self.fromVH.evenParity() and self.fromStrand==StrandType.Scaffold or\
-               not self.fromVH.evenParity() and self.fromStrand==StrandType.Staple
-
-    def couldFormNewCrossover(self):
-        return self.fromVH.possibleNewCrossoverAt(self.fromStrand, self.fromIdx, self.toVH, self.toIdx)
-
-    def crossoverExists(self):
-        return self.fromVH.hasCrossoverAt(self.fromStrand, self.fromIdx)
-
-    def is3pEndOfCrossover(self):
-        underlyingStrand5To3 = self.fromVH.directionOfStrandIs5to3(self.fromStrand)
-        return self.orientedLeft == underlyingStrand5To3
-
-    def updateVisibilityAndEnabledness(self):
-        shouldBeVisible = not self.crossoverExists()
-        self.setVisible(shouldBeVisible)
-        self._isLabelVisible = True
-        if self.couldFormNewCrossover():
-            self.labelBrush = self.enabbrush
+
+    def isHandleVisible(self, i):
+        return bool(self._visible[i])
+
+    def isHandleEnabled(self, i):
+        return bool(self._enabled[i])
+
+    def handlePos(self, i):
+        return (self.baseWidth * self._idx[i],\
+                self._topY if self._onTop[i] else self._bottomY)
+
+    def handleRect(self, i):
+        """The area handle i draws in, label included"""
+        x, y = self.handlePos(i)
+        bw = self.baseWidth
+        return QRectF(x, y - bw, bw, 3 * bw)
+
+    def handleAt(self, pos):
+        """The number of the visible handle whose hash mark contains pos,
+        or None"""
+        bw = self.baseWidth
+        idx = int(floor(pos.x() / bw))
+        if self._topY <= pos.y() < self._topY + bw:
+            onTop = True
+        elif self._bottomY <= pos.y() < self._bottomY + bw:
+            onTop = False
         else:
-            self.labelBrush = self.disabbrush
-        self.update()
+            return None
+        first, last = self.handleIndexRange(idx, idx)
+        for i in reversed(xrange(first, last)):
+            if self._onTop[i] == onTop and self._visible[i]:
+                return i
+        return None
+
+    def is3pEndOfCrossover(self, i):
+        underlyingStrand5To3 = self.fromVH.directionOfStrandIs5to3(self._strandType[i])
+        return self._orientedLeft[i] == underlyingStrand5To3
 
     def paint(self, painter, option, widget=None):
-        #Look Up Table
-        pathLUT = (_ppathRD, _ppathRU, _ppathLD, _ppathLU)
-        path = pathLUT[2*int(self.orientedLeft) + int(self.onTopStrand())]
-        pen = self.disabpen
-        if self.couldFormNewCrossover():
-            if self.fromStrand == StrandType.Scaffold:
-                pen = self.scafpen
-            else:
-                pen = self.stappen
-        painter.setPen(pen)
-        painter.drawPath(path)
-        if self._isLabelVisible == True:
-            self.drawLabel(painter)
-        
+        bw = self.baseWidth
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if self._parentPH.drawLevelsOfDetail and\
+           bw * lod < self._parentPH.farDetailBaseWidth:
+            return  # Too small to make out (see PathHelix.paint)
+        rect = option.exposedRect
+        first, last = self.handleIndexRange(int(floor(rect.left() / bw)) - 1,\
+                                            int(floor(rect.right() / bw)))
+        painter.setFont(self.toHelixNumFont)
+        painter.setBrush(Qt.NoBrush)
+        x0 = y0 = 0  # Where painter is translated to
+        for i in xrange(first, last):
+            if not self._visible[i]:
+                continue
+            x, y = self.handlePos(i)
+            painter.translate(x - x0, y - y0)
+            x0, y0 = x, y
+            onTop = self._onTop[i]
+            pen = self.disabpen
+            if self._enabled[i]:
+                if self._strandType[i] == StrandType.Scaffold:
+                    pen = self.scafpen
+                else:
+                    pen = self.stappen
+            painter.setPen(pen)
+            painter.drawPath(_pathLUT[2*int(self._orientedLeft[i]) + int(onTop)])
+            # The label takes the color of the hash mark
+            painter.drawText(self._topLabelRect if onTop else self._bottomLabelRect,\
+                             Qt.AlignCenter, self._labels[i])
+        painter.translate(-x0, -y0)
+
     def boundingRect(self):
-        return self.rect
+        return self._rect
+
+    def contains(self, pos):
+        return self.handleAt(pos) != None
 
     def mousePressEvent(self, event):
-        if event.button() != Qt.LeftButton:
+        i = self.handleAt(event.pos())
+        if event.button() != Qt.LeftButton or i == None:
             return QGraphicsItem.mousePressEvent(self, event)
-        if not self.couldFormNewCrossover():
+        if not self._enabled[i]:
             return
         # Determine upstream base
-        fromHelix, toHelix = self.fromVH, self.toVH
-        fromIdx, toIdx = self.fromIdx, self.toIdx
+        strandType = self._strandType[i]
+        fromHelix, toHelix = self.fromVH, self._toVH[i]
+        fromIdx = toIdx = self._idx[i]
         endToTakeColorFrom = 3
-        if not self.is3pEndOfCrossover():
+        if not self.is3pEndOfCrossover(i):
             fromHelix, toHelix = toHelix, fromHelix
             fromIdx, toIdx = toIdx, fromIdx
             endToTakeColorFrom = 5
         # Create XoverHandlePair and store references
-        fromHelix.installXoverFrom3To5(self.fromStrand, \
+        fromHelix.installXoverFrom3To5(strandType, \
                 fromIdx, toHelix, toIdx, endToTakeColorFrom=endToTakeColorFrom)
         fromHelix.palette().shuffle()
@@ -33,10 +33,10 @@ from model.virtualhelix import VirtualHelix
 from weakref import ref
 from handles.pathhelixhandle import PathHelixHandle
 from handles.loophandle import LoopItem, SkipItem
-from handles.precrossoverhandle import PreCrossoverHandle
+from handles.precrossoverhandle import PreCrossoverHandleGroup
 from math import floor, pi, ceil
+from bisect import bisect_left, bisect_right
 from cadnano import app
-from itertools import product
 from ui.svgbutton import SVGButton
 
 import util
@@ -49,7 +49,8 @@ util.qtWrapImport('QtGui', globals(), ['QBrush', 'QColor', 'QFont',\
                                        'QGraphicsSimpleTextItem',\
                                        'QPainter', 'QPainterPath', 'QPen',\
                                        'QDrag', 'QPolygonF', 'QUndoCommand',
-                                       'QInputDialog', 'QGraphicsItem'])
+                                       'QInputDialog', 'QGraphicsItem',\
+                                       'QStaticText', 'QTransform'])
 
 baseWidth = styles.PATH_BASE_WIDTH
 ppL5 = QPainterPath()  # Left 5' PainterPath
@@ -121,7 +122,17 @@ class PathHelix(QGraphicsObject):
     # The fraction of the loop that comes before the
     # first character and after the last character is
     # the padding, and the rest is divided evenly.
-    fractionLoopToPad = .10    
+    fractionLoopToPad = .10
+    # (top, number of characters) -> transforms, see loopGlyphTransforms
+    _loopGlyphTransforms = {}
+    # Bases of sequence text laid out together, see paintSequenceChunks
+    sequenceChunkSize = 32
+    # Levels of detail (see paint), by how many pixels wide a base is on
+    # screen: below farDetailBaseWidth segments are drawn as bars with no
+    # grid, ends, loops or text; below nearDetailBaseWidth there's no text
+    drawLevelsOfDetail = True
+    farDetailBaseWidth = styles.PATH_LOD_FAR_BASE_WIDTH
+    nearDetailBaseWidth = styles.PATH_LOD_NEAR_BASE_WIDTH
 
     def __init__(self, vhelix, pathHelixGroup):
         super(PathHelix, self).__init__()
@@ -135,6 +146,15 @@ class PathHelix(QGraphicsObject):
         self._XOverCacheEnvironment = None
         self._segmentPaths = None
         self._endptPaths = None
+        self._segmentBars = None
+        # strandType -> what the strand draws, see _strandItems
+        self._strandItemCache = {}
+        # strandType -> {segment / end key -> (pen / brush, path)}, see
+        # segmentAndEndptPaths
+        self._segmentCache = {}
+        self._endptCache = {}
+        # (strandType, chunk) -> (text, QStaticText), see paintSequenceChunks
+        self._sequenceTextCache = {}
         self._minorGridPainterPath = None
         self._majorGridPainterPath = None
         self.step = vhelix.part().crossSectionStep()
@@ -179,10 +199,12 @@ class PathHelix(QGraphicsObject):
     def setVHelix(self, newVH):
         if self._vhelix:
             self._vhelix.basesModified.disconnect(self.vhelixBasesModified)
+            self._vhelix.basesPreviewed.disconnect(self.vhelixBasesPreviewed)
             self._vhelix.vhelixDimensionsModified.disconnect(\
                                              self.vhelixDimensionsModified)
         self._vhelix = newVH
         newVH.basesModified.connect(self.vhelixBasesModified)
+        newVH.basesPreviewed.connect(self.vhelixBasesPreviewed)
         newVH.dimensionsModified.connect(self.vhelixDimensionsModified)
         self.vhelixDimensionsModified()
         self.vhelixBasesModified()
@@ -281,31 +303,23 @@ class PathHelix(QGraphicsObject):
     def setPreXOverHandlesVisible(self, shouldBeVisible):
         areVisible = self._preXOverHandles != None
         if areVisible and not shouldBeVisible:
-            for pch in self._preXOverHandles:
-                if pch.scene():
-                    pch.scene().removeItem(pch)
+            self._preXOverHandles.destroy()
             self._preXOverHandles = None
             self.vhelix().part().virtualHelixAtCoordsChanged.disconnect(\
                                                    self.updatePreXOverHandles)
+            self.vhelix().part().virtualHelicesAtCoordsChanged.disconnect(\
+                                                   self.updatePreXOverHandles)
         elif not areVisible and shouldBeVisible:
-            self._preXOverHandles = []
-            for strandType, facingRight in\
-              product((StrandType.Scaffold, StrandType.Staple), (True, False)):
-                # Get potential crossovers in [neighborVirtualHelix, index] format
-                potentialXOvers = self.vhelix().potentialCrossoverList(facingRight, strandType)
-                numBases = self.vhelix().numBases()
-                assert(all(index < numBases for neighborVH, index in potentialXOvers))
-                for (neighborVH, fromIdx) in potentialXOvers:
-                    pch = PreCrossoverHandle(self, strandType, fromIdx,\
-                                             neighborVH, fromIdx,\
-                                             not facingRight)
-                    self._preXOverHandles.append(pch)
+            self._preXOverHandles = PreCrossoverHandleGroup(self)
             self.vhelix().part().virtualHelixAtCoordsChanged.connect(self.updatePreXOverHandles)
-        self._XOverCacheEnvironment = (self.vhelix().neighbors(), self.vhelix().numBases())
+            self.vhelix().part().virtualHelicesAtCoordsChanged.connect(self.updatePreXOverHandles)
+        self._XOverCacheEnvironment = (self.vhelix().neighborsVersion(),\
+                                       self.vhelix().numBases())
 
     def updatePreXOverHandles(self):
         cacheConstructionEnvironment = self._XOverCacheEnvironment
-        currentEnvironment = (self.vhelix().neighbors(), self.vhelix().numBases())
+        currentEnvironment = (self.vhelix().neighborsVersion(),\
+                              self.vhelix().numBases())
         if cacheConstructionEnvironment != currentEnvironment:
             self.setPreXOverHandlesVisible(False)
             self.setPreXOverHandlesVisible(True)
@@ -315,13 +329,31 @@ class PathHelix(QGraphicsObject):
 
     ################# Loading and Updating State From VHelix #################
     def vhelixBasesModified(self):
-        self._endpoints = None  # Clear endpoint drawing cache
+        self._endptPaths = None  # Clear endpoint drawing cache
         self._segmentPaths = None  # Clear drawing cache of lines
+        self._segmentBars = None
+        self._strandItemCache = {}
         # Reset active helix if necessary
         if self.phgroup().getActiveHelix() == self:
             self.makeSelfActiveHelix()
         self.update()
 
+    def vhelixBasesPreviewed(self, strandType, lo, hi):
+        """A tool's live preview changed bases lo...hi of strandType;
+        only they (and the ends of the neighboring bases, plus the loops
+        drawn above and below them) need to be redrawn."""
+        items = self._strandItemCache.get(strandType)
+        if items != None:
+            # The neighbors' ends can change too
+            self._strandItemCache[strandType] = self._splicedStrandItems(\
+                                            strandType, items, lo - 2, hi + 2)
+        self._endptPaths = None
+        self._segmentPaths = None
+        self._segmentBars = None
+        x, y = self.baseLocation(strandType, lo - 1)
+        bw = self.baseWidth
+        self.update(QRectF(x, y - bw, (hi - lo + 3) * bw, 3 * bw))
+
     ############################# Drawing ##########################
     def paint(self, painter, option, widget=None):
         # Note that the methods that fetch the paths
@@ -330,7 +362,19 @@ class PathHelix(QGraphicsObject):
         # of updating after a change in vhelix's bases
         if not self.boundingRect().intersects(option.exposedRect):
             return
+        # How wide a base is on screen picks the level of detail
+        screenBaseWidth = self.baseWidth *\
+                  option.levelOfDetailFromTransform(painter.worldTransform())
+        if not self.drawLevelsOfDetail:
+            screenBaseWidth = self.nearDetailBaseWidth
         painter.save()
+        if screenBaseWidth < self.farDetailBaseWidth:
+            # Grid, ends, loops and text would be a blur
+            for brush, rect in self.segmentBars():
+                if rect.intersects(option.exposedRect):
+                    painter.fillRect(rect, brush)
+            painter.restore()
+            return
         painter.setBrush(self.nobrush)
         painter.setPen(self.minorGridPen)
         painter.drawPath(self.minorGridPainterPath())  # Minor grid lines
@@ -352,52 +396,94 @@ class PathHelix(QGraphicsObject):
                 continue
             painter.setBrush(brush)
             painter.drawPath(path)
-        self.paintLoopsAndSkips(painter)
-        self.paintHorizontalBaseText(painter)
+        withText = screenBaseWidth >= self.nearDetailBaseWidth
+        self.paintLoopsAndSkips(painter, option.exposedRect, withText)
+        if withText:
+            self.paintHorizontalBaseText(painter, option.exposedRect)
         painter.restore()
 
-    def paintLoopsAndSkips(self, painter):
+    def exposedBaseRange(self, rect, margin=0):
+        """The (lo, hi) indices (inclusive) of the bases whose columns
+        intersect rect, widened by margin bases on either side and clamped
+        to the helix. lo > hi when none do."""
+        bw = self.baseWidth
+        lo = int(floor(rect.left() / bw)) - margin
+        hi = int(floor(rect.right() / bw)) + margin
+        return max(lo, 0), min(hi, self.vhelix().numBases() - 1)
+
+    @classmethod
+    def loopGlyphTransforms(cls, top, numChars):
+        """The transforms that place each of numChars characters along
+        the loop path (in the path's own coordinates), computed once per
+        (top, numChars)"""
+        key = (top, numChars)
+        transforms = cls._loopGlyphTransforms.get(key)
+        if transforms != None:
+            return transforms
+        path = cls._loopitem.getLoop(top)
+        fractionArclenPerChar = (1. - 2 * cls.fractionLoopToPad) / (numChars + 1)
+        transforms = []
+        for i in range(numChars):
+            frac = cls.fractionLoopToPad + (i + 1) * fractionArclenPerChar
+            pt = path.pointAtPercent(frac)
+            t = QTransform()
+            t.translate(pt.x(), pt.y())
+            t.rotate(-path.angleAtPercent(frac))
+            t.translate(-cls.sequenceFontCharWidth / 2.,\
+                        -2 if top else cls.sequenceFontH)
+            transforms.append(t)
+        cls._loopGlyphTransforms[key] = transforms
+        return transforms
+
+    def paintLoopsAndSkips(self, painter, rect, withText=True):
         vh = self.vhelix()
+        # A loop reaches about a base to either side of its own
+        lo, hi = self.exposedBaseRange(rect, margin=2)
         for strandType in (StrandType.Scaffold, StrandType.Staple):
             top = self.strandIsTop(strandType)
-            for index, loopsize in vh._loop(strandType).iteritems():
+            loops = vh._loop(strandType)
+            if len(loops) < hi + 1 - lo:
+                indices = [i for i in loops if lo <= i <= hi]
+            else:
+                indices = [i for i in xrange(lo, hi + 1) if i in loops]
+            for index in indices:
+                loopsize = loops[index]
                 ul = self.baseLocation(strandType, index)
+                painter.save()
+                painter.translate(*ul)
                 if loopsize > 0:
-                    path = self._loopitem.getLoop(top)
-                    path = path.translated(*ul)
-                    painter.setPen(self._loopitem.getPen())
-                    painter.setPen(QPen(vh.colorOfBase(strandType, index), 2))
+                    painter.setPen(self.strandPen(\
+                                        vh.colorOfBase(strandType, index), 2))
                     painter.setBrush(Qt.NoBrush)
-                    painter.drawPath(path)
-                    baseText = vh.sequenceForLoopAt(strandType, index)
-                    if len(baseText) > 20:
-                        baseText = baseText[:17] + '...'
-                    fractionArclenPerChar = (1.-2*self.fractionLoopToPad)/(len(baseText)+1)
-                    painter.setPen(QPen(Qt.black))
-                    painter.setBrush(Qt.NoBrush)
-                    painter.setFont(self.sequenceFont)
-                    for i in range(len(baseText)):
-                        frac = self.fractionLoopToPad + (i+1)*fractionArclenPerChar
-                        pt = path.pointAtPercent(frac)
-                        tangAng = path.angleAtPercent(frac)
-                        painter.save()
-                        painter.translate(pt)
-                        painter.rotate(-tangAng)
-                        painter.translate(QPointF(-self.sequenceFontCharWidth/2.,
-                                                  -2 if top else self.sequenceFontH))
-                        painter.drawText(0, 0, baseText[i if top else -i-1])
-                        painter.restore()
+                    painter.drawPath(self._loopitem.getLoop(top))
+                    if withText:
+                        self.paintLoopText(painter, strandType, index, top)
                 else:  # loopsize < 0 (a skip)
-                    path = self._skipitem.getSkip()
-                    path = path.translated(*ul)
                     painter.setPen(self._skipitem.getPen())
-                    painter.drawPath(path)
-
-    def paintHorizontalBaseText(self, painter):
+                    painter.drawPath(self._skipitem.getSkip())
+                painter.restore()
+
+    def paintLoopText(self, painter, strandType, index, top):
+        """Draws the sequence of the loop at index along its path, with
+        painter translated to the loop's base"""
+        baseText = self.vhelix().sequenceForLoopAt(strandType, index)
+        if len(baseText) > 20:
+            baseText = baseText[:17] + '...'
+        painter.setPen(QPen(Qt.black))
+        painter.setFont(self.sequenceFont)
+        loopTransform = painter.worldTransform()
+        glyphTransforms = self.loopGlyphTransforms(top, len(baseText))
+        for i in range(len(baseText)):
+            painter.setWorldTransform(glyphTransforms[i] * loopTransform)
+            painter.drawText(0, 0, baseText[i if top else -i-1])
+        painter.setWorldTransform(loopTransform)
+
+    def paintHorizontalBaseText(self, painter, rect):
         vh = self.vhelix()
-        scafTxt = vh.sequenceForVirtualStrand(StrandType.Scaffold)
+        lo, hi = self.exposedBaseRange(rect)
+        if lo > hi:
+            return
         scafY = self.baseWidth*0 + self.sequenceTextYCenteringOffset
-        stapTxt = vh.sequenceForVirtualStrand(StrandType.Staple)
         stapY = self.baseWidth*1 + self.sequenceTextYCenteringOffset
         if self.strandIsTop(StrandType.Staple):
             # We assumed scaffold was on top. Correct that.
@@ -412,17 +498,40 @@ class PathHelix(QGraphicsObject):
         else:
             shouldVFlipScaf = True
             scafY = -scafY
-        scafX = stapX = self.sequenceTextXCenteringOffset
         painter.setPen(QPen(Qt.black))
         painter.setBrush(Qt.NoBrush)
         painter.setFont(self.sequenceFont)
         if shouldVFlipScaf:
             painter.scale(1, -1)
-        painter.drawText(scafX, scafY, self.baseWidth*vh.numBases(),\
-                         self.baseWidth/2., Qt.AlignVCenter, scafTxt)
+        self.paintSequenceChunks(painter, StrandType.Scaffold, scafY, lo, hi)
         painter.scale(1, -1)
-        painter.drawText(stapX, stapY, self.baseWidth*vh.numBases(),\
-                         self.baseWidth/2., Qt.AlignVCenter, stapTxt)
+        self.paintSequenceChunks(painter, StrandType.Staple, stapY, lo, hi)
+
+    def paintSequenceChunks(self, painter, strandType, y, lo, hi):
+        """Draws the sequence text of bases lo...hi of strandType as
+        QStaticTexts of sequenceChunkSize bases each, which keep their
+        layout from one paint to the next as long as their text stays
+        the same. y is the top of the text's band, which is half a base
+        tall."""
+        txt = self.vhelix().sequenceForVirtualStrand(strandType)
+        n = self.sequenceChunkSize
+        bw = self.baseWidth
+        # Vertically centered in the band, as drawText with AlignVCenter
+        # would have it
+        y += (bw / 2. - self.sequenceFontMetrics.height()) / 2.
+        for chunk in xrange(lo // n, hi // n + 1):
+            chunkTxt = txt[chunk * n:(chunk + 1) * n]
+            if not chunkTxt.strip():
+                continue
+            key = (strandType, chunk)
+            cached = self._sequenceTextCache.get(key)
+            if cached == None or cached[0] != chunkTxt:
+                staticText = QStaticText(chunkTxt)
+                staticText.setTextFormat(Qt.PlainText)
+                cached = (chunkTxt, staticText)
+                self._sequenceTextCache[key] = cached
+            x = self.sequenceTextXCenteringOffset + chunk * n * bw
+            painter.drawStaticText(QPointF(x, y), cached[1])
 
     def minorGridPainterPath(self):
         """
@@ -468,72 +577,188 @@ class PathHelix(QGraphicsObject):
 
     def segmentAndEndptPaths(self):
         """Returns an array of (pen, penPainterPath, brush, brushPainterPath)
-        for drawing segment lines and handles."""
-        if self._segmentPaths and self._endptPaths:
+        for drawing segment lines and handles. Each segment's and end's
+        (pen, path) or (brush, path) is cached under a key made of
+        everything that goes into drawing it, so after an edit only the
+        segments and ends that look different get new paths."""
+        if self._segmentPaths != None and self._endptPaths != None:
             return (self._segmentPaths, self._endptPaths)
         self._segmentPaths = []
         self._endptPaths = []
-        vh = self.vhelix()
         for strandType in (StrandType.Scaffold, StrandType.Staple):
-            top = self.strandIsTop(strandType)
-            segments, ends3, ends5 = self._vhelix.getSegmentsAndEndpoints(strandType)
-            # print "[%i:%s] "%(vh.number(), "scaf" if strandType==StrandType.Scaffold else "stap") + " ".join(str(b) for b in segments)
-            for (startIndex, endIndex) in segments:
-                numBasesInOligo = vh.numberOfBasesConnectedTo(strandType,\
-                                                              int(startIndex))
-                highlight = (numBasesInOligo > styles.oligoLenAboveWhichHighlight or\
-                             numBasesInOligo < styles.oligoLenBelowWhichHighlight) and\
-                             strandType == StrandType.Staple
-
-                startPt = self.baseLocation(strandType, startIndex, centerY=True)
-                endPt = self.baseLocation(strandType, endIndex, centerY=True)
-
-                # Only draw to the edge of breakpoints.
-                if self._vhelix.hasEndAt(strandType, startIndex):
-                    startPt = (startPt[0]+styles.PATH_BASE_WIDTH/2, startPt[1])
-                elif highlight and self._vhelix.hasCrossoverAt(strandType, startIndex):
-                    # compensate for width of stroke in crossover path
-                    startPt = (startPt[0]+styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH/2, startPt[1])
-                if self._vhelix.hasEndAt(strandType, endIndex):
-                    endPt = (endPt[0]-styles.PATH_BASE_WIDTH/2, endPt[1])
-                elif highlight and self._vhelix.hasCrossoverAt(strandType, endIndex):
-                    endPt = (endPt[0]-styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH/2, endPt[1])
-
-                pp = QPainterPath()
-                pp.moveTo(*startPt)
-                pp.lineTo(*endPt)
-                color = vh.colorOfBase(strandType, int(startIndex))
-                width = styles.PATH_STRAND_STROKE_WIDTH
-                if numBasesInOligo > styles.oligoLenAboveWhichHighlight or\
-                   numBasesInOligo < styles.oligoLenBelowWhichHighlight:
-                    if strandType == StrandType.Staple:
-                        color.setAlpha(128)
-                        width = styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH
-                else:
-                    color.setAlpha(255)
-                pen = QPen(color, width)
-                pen.setCapStyle(Qt.FlatCap)
-                self._segmentPaths.append((pen, pp))
-            for e3 in ends3:
-                upperLeft = self.baseLocation(strandType, e3)
-                bp = QPainterPath()
-                color = QColor(vh.colorOfBase(strandType, e3))
-                color.setAlpha(255)
-                brush = QBrush(color)
-                bp.addPath(ppR3.translated(*upperLeft) if top else\
-                                                    ppL3.translated(*upperLeft))
-                self._endptPaths.append((brush, bp))
-            for e5 in ends5:
-                upperLeft = self.baseLocation(strandType, e5)
-                bp = QPainterPath()
-                color = QColor(vh.colorOfBase(strandType, e5))
-                color.setAlpha(255)
-                brush = QBrush(color)
-                bp.addPath(ppL5.translated(*upperLeft) if top else\
-                                                    ppR5.translated(*upperLeft))
-                self._endptPaths.append((brush, bp))
+            items = self._strandItems(strandType)
+            self._segmentPaths.extend(items[1])
+            self._endptPaths.extend(items[3])
         return (self._segmentPaths, self._endptPaths)
 
+    def segmentBars(self):
+        """Returns a list of (brush, rect), a bar filling the middle half
+        of the bases under each segment, which stand in for the segments
+        at far zoom (see paint)"""
+        if self._segmentBars != None:
+            return self._segmentBars
+        self._segmentBars = []
+        for strandType in (StrandType.Scaffold, StrandType.Staple):
+            self._segmentBars.extend(self._strandItems(strandType)[4])
+        return self._segmentBars
+
+    def _strandItems(self, strandType):
+        """What strandType draws, as the tuple (segment extents, segment
+        (pen, path)s, end indices, end (brush, path)s, segment bars) of
+        parallel lists in ascending order. Kept until the bases are
+        modified; a preview splices in just the part it changes (see
+        vhelixBasesPreviewed)."""
+        items = self._strandItemCache.get(strandType)
+        if items == None:
+            items = self._buildStrandItems(strandType, None, None)
+            self._strandItemCache[strandType] = items
+        return items
+
+    def _splicedStrandItems(self, strandType, items, lo, hi):
+        """items (see _strandItems) with the segments through bases
+        lo...hi and the ends in lo...hi rebuilt"""
+        extents, segPaths, endIdxs, endPaths, bars = items
+        new = self._buildStrandItems(strandType, lo, hi)
+        # Segments are disjoint and sorted, so their ends ascend too
+        j = bisect_left(extents, (hi + 1,))
+        i = bisect_left(extents, (lo,))
+        while i > 0 and extents[i - 1][1] > lo:
+            i -= 1
+        k, l = bisect_left(endIdxs, lo), bisect_right(endIdxs, hi)
+        return (extents[:i] + new[0] + extents[j:],\
+                segPaths[:i] + new[1] + segPaths[j:],\
+                endIdxs[:k] + new[2] + endIdxs[l:],\
+                endPaths[:k] + new[3] + endPaths[l:],\
+                bars[:i] + new[4] + bars[j:])
+
+    def _buildStrandItems(self, strandType, lo, hi):
+        """The items (see _strandItems) of strandType, or only those of the
+        segments through bases lo...hi and the ends in lo...hi. Paths come
+        from the strand's key caches; building the whole strand leaves in
+        them only the paths it still draws."""
+        oldSegmentCache = self._segmentCache.get(strandType, {})
+        oldEndptCache = self._endptCache.get(strandType, {})
+        if lo == None:
+            segmentCache, endptCache = {}, {}
+            self._segmentCache[strandType] = segmentCache
+            self._endptCache[strandType] = endptCache
+        else:
+            segmentCache, endptCache = oldSegmentCache, oldEndptCache
+        vh = self.vhelix()
+        bw = self.baseWidth
+        top = self.strandIsTop(strandType)
+        segments, ends3, ends5 = vh.getSegmentsAndEndpoints(strandType,\
+                                                            lo, hi)
+        if lo != None:
+            segments = [seg for seg in segments\
+                        if seg[0] < hi + 1 and seg[1] > lo]
+        segPaths, bars = [], []
+        for (startIndex, endIndex) in segments:
+            highlight = False
+            if strandType == StrandType.Staple:
+                numBasesInOligo = vh.numberOfBasesConnectedTo(strandType,\
+                                                          int(startIndex))
+                highlight = numBasesInOligo > styles.oligoLenAboveWhichHighlight or\
+                            numBasesInOligo < styles.oligoLenBelowWhichHighlight
+            colorIdx = vh.colorIndexOfBase(strandType, int(startIndex))
+            key = (strandType, startIndex, endIndex, highlight, colorIdx,\
+                   vh.hasEndAt(strandType, startIndex),\
+                   vh.hasEndAt(strandType, endIndex),\
+                   highlight and vh.hasCrossoverAt(strandType, startIndex),\
+                   highlight and vh.hasCrossoverAt(strandType, endIndex))
+            sp = oldSegmentCache.get(key)
+            if sp == None:
+                sp = self._segmentPath(key)
+            segmentCache[key] = sp
+            segPaths.append(sp)
+            x, y = self.baseLocation(strandType, startIndex)
+            color = vh.colorOfBase(strandType, int(startIndex))
+            rect = QRectF(x, y + bw / 4.,\
+                          (endIndex - startIndex) * bw, bw / 2.)
+            bars.append((self.strandBrush(color), rect))
+        ends = sorted([(e, True) for e in ends3] + [(e, False) for e in ends5])
+        endPaths = []
+        for e, is3 in ends:
+            key = (strandType, e, is3, top, vh.colorIndexOfBase(strandType, e))
+            ep = oldEndptCache.get(key)
+            if ep == None:
+                ep = self._endptPath(key)
+            endptCache[key] = ep
+            endPaths.append(ep)
+        return (segments, segPaths, [e for e, is3 in ends], endPaths, bars)
+
+    def _segmentPath(self, key):
+        """The (pen, path) of a segment line (see segmentAndEndptPaths
+        for the key)"""
+        strandType, startIndex, endIndex, highlight = key[0:4]
+        startIsEnd, endIsEnd, startIsXover, endIsXover = key[5:9]
+        vh = self._vhelix
+        startPt = self.baseLocation(strandType, startIndex, centerY=True)
+        endPt = self.baseLocation(strandType, endIndex, centerY=True)
+
+        # Only draw to the edge of breakpoints.
+        if startIsEnd:
+            startPt = (startPt[0]+styles.PATH_BASE_WIDTH/2, startPt[1])
+        elif startIsXover:
+            # compensate for width of stroke in crossover path
+            startPt = (startPt[0]+styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH/2, startPt[1])
+        if endIsEnd:
+            endPt = (endPt[0]-styles.PATH_BASE_WIDTH/2, endPt[1])
+        elif endIsXover:
+            endPt = (endPt[0]-styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH/2, endPt[1])
+
+        pp = QPainterPath()
+        pp.moveTo(*startPt)
+        pp.lineTo(*endPt)
+        color = QColor(vh.colorOfBase(strandType, int(startIndex)))
+        width = styles.PATH_STRAND_STROKE_WIDTH
+        if highlight:
+            color.setAlpha(128)
+            width = styles.PATH_STRAND_HIGHLIGHT_STROKE_WIDTH
+        else:
+            color.setAlpha(255)
+        return (self.strandPen(color, width), pp)
+
+    def _endptPath(self, key):
+        """The (brush, path) of an end handle (see segmentAndEndptPaths
+        for the key)"""
+        strandType, idx, is3, top = key[0:4]
+        upperLeft = self.baseLocation(strandType, idx)
+        bp = QPainterPath()
+        color = QColor(self._vhelix.colorOfBase(strandType, idx))
+        color.setAlpha(255)
+        if is3:
+            bp.addPath(ppR3.translated(*upperLeft) if top else\
+                                                ppL3.translated(*upperLeft))
+        else:
+            bp.addPath(ppL5.translated(*upperLeft) if top else\
+                                                ppR5.translated(*upperLeft))
+        return (self.strandBrush(color), bp)
+
+    # Every PathHelix draws with the same few colors, so pens and brushes
+    # are shared (painters copy them on setPen / setBrush)
+    _strandPens = {}
+    _strandBrushes = {}
+
+    @classmethod
+    def strandPen(cls, color, width):
+        key = (color.rgba(), width)
+        pen = cls._strandPens.get(key)
+        if pen == None:
+            pen = QPen(color, width)
+            pen.setCapStyle(Qt.FlatCap)
+            cls._strandPens[key] = pen
+        return pen
+
+    @classmethod
+    def strandBrush(cls, color):
+        key = color.rgba()
+        brush = cls._strandBrushes.get(key)
+        if brush == None:
+            brush = QBrush(color)
+            cls._strandBrushes[key] = brush
+        return brush
+
     def strandIsTop(self, strandType):
         return self.evenParity() and strandType == StrandType.Scaffold\
            or not self.evenParity() and strandType == StrandType.Staple
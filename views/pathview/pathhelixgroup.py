@@ -33,9 +33,10 @@ from cadnano import app
 from handles.activeslicehandle import ActiveSliceHandle
 from handles.pathhelixhandle import PathHelixHandle
 from handles.pathhelixhandle import PathHelixHandle
-from handles.crossoverhandle import XoverHandlePair
+from handles.crossoverhandle import XoverHandlePair, XoverHandleGroup
 from handles.loophandle import LoopHandleGroup
 from model.enum import EndType, LatticeType, StrandType
+from bisect import bisect_right
 from .pathhelix import PathHelix
 from .pathselection import SelectionItemGroup
 from .pathselection import PathHelixHandleSelectionBox
@@ -47,7 +48,7 @@ from views import styles
 # import Qt stuff into the module namespace with PySide, PyQt4 independence
 util.qtWrapImport('QtCore', globals(), ['QObject', 'pyqtSignal', 'pyqtSlot',\
                                         'QRectF', 'QPointF', 'QEvent',\
-                                        'QObject', 'Qt'])
+                                        'QObject', 'Qt', 'QTimer'])
 util.qtWrapImport('QtGui', globals(), ['QBrush', 'QPen', 'qApp',\
                                        'QGraphicsTextItem', 'QFont',\
                                        'QColor', 'QGraphicsItem',\
@@ -72,10 +73,23 @@ class PathHelixGroup(QGraphicsObject):
         super(PathHelixGroup, self).__init__(parent)
         # Subviews, GraphicsItem business
         self.rect = QRectF()  # Set by _setPathHelixList
+        # Refits the view after _setPathHelixList changes self.rect, once
+        # per pass through the event loop
+        self._zoomToFitTimer = QTimer(self)
+        self._zoomToFitTimer.setSingleShot(True)
+        self._zoomToFitTimer.setInterval(0)
+        self._zoomToFitTimer.timeout.connect(self.zoomToFit)
         # self._label=None; self.label()  # Poke the cache so the label actually exists
         # Properties
         self._XOverLabels = None
         self._pathHelixes = []  # Primary property
+        # Kept by _setPathHelixList along with _pathHelixes: the y of the
+        # top of each PathHelix (ascending) and the PathHelix of each
+        # displayed VirtualHelix
+        self._pathHelixYs = []
+        self.vhToPathHelix = {}
+        # Draws the part's crossovers (see xoversChanged)
+        self.xoverGroup = XoverHandleGroup(self)
         self.activeHelix = None
         self._part = None
         self.phhSelectionGroup = SelectionItemGroup(\
@@ -88,9 +102,10 @@ class PathHelixGroup(QGraphicsObject):
         self._stapColor = QColor(0, 72, 0)
         self._stapPen = QPen(self._stapColor, 2)
         
+        # The force tool's crossover from a 3' end to the mouse. It
+        # exists only here, not in the model (see setFloatingXover).
         self.floatingXover = XoverHandlePair(self, None, None)
         self.loopHandleGroup = LoopHandleGroup(parent=self)
-        self.xovers = {}
         
         self.setZValue(styles.ZPATHHELIXGROUP)
         self.selectionLock = None
@@ -135,13 +150,11 @@ class PathHelixGroup(QGraphicsObject):
         if self._part:
             self._part.selectionWillChange.disconnect(self.selectionWillChange)
             self._part.dimensionsDidChange.disconnect(self.partDimensionsChanged)
-            self._part.createXover.disconnect(self.createXoverItem)
-            self._part.updateFloatingXover.disconnect(self.updateFloatingXoverItem)
+            self._part.xoversChanged.disconnect(self.xoversChanged)
         if newPart:
             newPart.selectionWillChange.connect(self.selectionWillChange)
             newPart.dimensionsDidChange.connect(self.partDimensionsChanged)
-            newPart.createXover.connect(self.createXoverItem)
-            newPart.updateFloatingXover.connect(self.updateFloatingXoverItem)
+            newPart.xoversChanged.connect(self.xoversChanged)
         self._part = newPart
         if newPart:
             self.selectionWillChange(newPart.selection())
@@ -166,35 +179,41 @@ class PathHelixGroup(QGraphicsObject):
     #     self._label = label
     #     return label
 
-    # @pyqtSlot(object, object, int)
-    def createXoverItem(self, Base3p, Base5p, strandtype):
+    def createXoverItem(self, fromBase, toBase):
         """
-        Base3p is the tuple (3 prime vhelix, index), 
-        Base5p is the (5 prime vhelix, index)
-        strandtype is Strandtype.Scaffold or Strandtype.Staple
+        fromBase is the tuple (3 prime vhelix, strandtype, index),
+        toBase is the (5 prime vhelix, strandtype, index)
         """
-        fromBase = (Base3p[0], strandtype, Base3p[1])
-        toBase = (Base5p[0], strandtype, Base5p[1])
-        key = (fromBase, toBase)
-        if not key in self.xovers:
-            self.xovers[key] = XoverHandlePair(self, fromBase, toBase)
-
-    def updateFloatingXoverItem(self, fromBase, toPt):
+        self.xoverGroup.xoversChanged([(fromBase, toBase)], [])
+
+    # @pyqtSlot(object, object)
+    def xoversChanged(self, added, removed):
+        """Applies a batch of crossover changes from the part's crossover
+        registry (see DNAPart.xoversChanged)"""
+        self.xoverGroup.xoversChanged(added, removed)
+
+    def setFloatingXover(self, fromBase=None, toPt=None):
+        """Draws the floating crossover from fromBase, a (3' vhelix,
+        strandType, index) tuple, to the scene point toPt, or hides it
+        if either is None. Only the crossover item is repainted."""
+        if fromBase == None or toPt == None:
+            fromBase = toPt = None
         self.floatingXover.setFromBase(fromBase)
         self.floatingXover.setToPoint(toPt)
 
     def pathHelixAtScenePos(self, pos):
-        for p in self._pathHelixes:
-            pt = p.mapFromScene(pos)
-            if p.boundingRect().contains(pt):
-                return p
+        # The PathHelix are stacked top to bottom, so the one starting
+        # last above pos is the only one that might contain it
+        i = bisect_right(self._pathHelixYs, self.mapFromScene(pos).y()) - 1
+        if i < 0:
+            return None
+        p = self._pathHelixes[i]
+        if p.boundingRect().contains(p.mapFromScene(pos)):
+            return p
         return None
 
     def pathHelixForVHelix(self, vh):
-        for p in self._pathHelixes:
-            if p.vhelix() == vh:
-                return p
-        return None
+        return self.vhToPathHelix.get(vh)
 
     def displayedVHs(self):
         """Returns the list (ordered top to bottom) of VirtualHelix
@@ -210,10 +229,9 @@ class PathHelixGroup(QGraphicsObject):
         if self.part() != None:
             assert(self.part())  # Can't display VirtualHelix that aren't there!
             new_pathHelixList = []
-            vhToPH = dict(((ph.vhelix(), ph) for ph in self._pathHelixes))
             for vhref in vhrefs:
                 vh = self.part().getVirtualHelix(vhref)
-                ph = vhToPH.get(vh, None)
+                ph = self.vhToPathHelix.get(vh, None)
                 if ph == None:
                     ph = PathHelix(vh, self)
                 new_pathHelixList.append(ph)
@@ -223,6 +241,11 @@ class PathHelixGroup(QGraphicsObject):
             self.displayedVHsChanged.emit()
 
     def partDimensionsChanged(self):
+        # The part resizes all of its helices at once without a
+        # dimensionsModified per helix
+        for ph in self._pathHelixList():
+            ph.vhelixDimensionsModified()
+            ph.updatePreXOverHandles()
         self._setPathHelixList(self._pathHelixList())
 
     def _pathHelixList(self):
@@ -236,56 +259,79 @@ class PathHelixGroup(QGraphicsObject):
     def _setPathHelixList(self, newList):
         """Give me a list of PathHelix and I'll parent them
         to myself if necessary, position them in a column, adopt
-        their handles, and position them as well."""
-        y = 0  # How far down from the top the next PH should be
-        leftmostExtent = 0
-        rightmostExtent = 0
-        # self.label().setVisible(True)
-        for ph in self._pathHelixes:
-            if not ph in newList:
+        their handles, and position them as well. Only the PathHelixes
+        that are new or whose place in the column changed get moved, so
+        reordering a few helices touches only those."""
+        oldList = self._pathHelixes
+        oldSet, newSet = set(oldList), set(newList)
+        movedVHs = []
+        for ph in oldList:
+            if not ph in newSet:
+                vh = ph.vhelix()
+                vh.basesModified.disconnect(ph.vhelixBasesModifiedCallbackObj)
+                ph.vhelixBasesModifiedCallbackObj = None
+                if self.vhToPathHelix.get(vh) == ph:
+                    del self.vhToPathHelix[vh]
+                movedVHs.append(vh)
                 scene = ph.scene()
                 handle = ph.handle()
                 if handle.focusRing:
                     scene.removeItem(handle.focusRing)
                 scene.removeItem(handle)
                 scene.removeItem(ph)
-        for ph in newList:
-            ph.setParentItem(self)
-            ph.setPos(0, y)
+        y = 0  # How far down from the top the next PH should be
+        ys = []
+        moved = []
+        for i, ph in enumerate(newList):
+            ys.append(y)
+            isNew = not ph in oldSet
             ph_height = ph.boundingRect().height()
-            step = ph_height + styles.PATH_HELIX_PADDING
-            phh = ph.handle()
-            if phh.parentItem() != self.phhSelectionGroup:
-                phh.setParentItem(self)
-            phhr = phh.boundingRect()
-            phh.setPos(-2 * phhr.width(), y + (ph_height - phhr.height()) / 2)
-            leftmostExtent = min(leftmostExtent, -2 * phhr.width())
-            rightmostExtent = max(rightmostExtent, ph.boundingRect().width())
-            y += step
-            ph.updatePreXOverHandles()
+            if isNew or i >= len(self._pathHelixYs) or\
+               oldList[i] != ph or self._pathHelixYs[i] != y:
+                if isNew:
+                    ph.setParentItem(self)
+                    def vhbmCallbackCreator(self, vh):
+                        def vhbmCallback():
+                            self.vhelixBasesModified(vh)
+                        return vhbmCallback
+                    vhbm = vhbmCallbackCreator(self, ph.vhelix())
+                    ph.vhelixBasesModifiedCallbackObj = vhbm
+                    ph.vhelix().basesModified.connect(vhbm)
+                    self.vhToPathHelix[ph.vhelix()] = ph
+                ph.setPos(0, y)
+                phh = ph.handle()
+                if phh.parentItem() != self.phhSelectionGroup:
+                    phh.setParentItem(self)
+                phhr = phh.boundingRect()
+                phh.setPos(-2 * phhr.width(), y + (ph_height - phhr.height()) / 2)
+                moved.append(ph)
+                movedVHs.append(ph.vhelix())
+            y += ph_height + styles.PATH_HELIX_PADDING
         # end for
-        self.prepareGeometryChange()
-        self.rect = QRectF(leftmostExtent,\
-                           -40,\
-                           -leftmostExtent + rightmostExtent,\
-                           y + 40)
-        self.geometryChanged.emit()
-        for ph in self._pathHelixes:
-            vhbm = getattr(ph, 'vhelixBasesModifiedCallbackObj', None)
-            if vhbm:
-                ph.vhelix().basesModified.disconnect(vhbm)
-        for ph in newList:
-            def vhbmCallbackCreator(self, vh):
-                def vhbmCallback():
-                    self.vhelixBasesModified(vh)
-                return vhbmCallback
-            vhbm = vhbmCallbackCreator(self, ph.vhelix())
-            ph.vhelix().basesModified.connect(vhbm)
         self._pathHelixes = newList
-        for ph in self._pathHelixes:
+        self._pathHelixYs = ys
+        # Every PathHelix (and every handle) has the same size
+        leftmostExtent = 0
+        rightmostExtent = 0
+        if newList:
+            leftmostExtent = -2 * newList[0].handle().boundingRect().width()
+            rightmostExtent = newList[0].boundingRect().width()
+        rect = QRectF(leftmostExtent,\
+                      -40,\
+                      -leftmostExtent + rightmostExtent,\
+                      y + 40)
+        if rect != self.rect:
+            self.prepareGeometryChange()
+            self.rect = rect
+            self.geometryChanged.emit()
+            # The overall bounds changed; refit once things settle
+            self._zoomToFitTimer.start()
+        # A PathHelix becomes (or stops being) the topmost one only by
+        # moving
+        for ph in moved:
             ph.positionInPhgChanged()
-        self.vhToPathHelix = dict(((ph.vhelix(), ph) for ph in newList))
-        self.scene().views()[0].zoomToFit()
+            ph.updatePreXOverHandles()
+        self.xoverGroup.helicesMoved(movedVHs)
 
     def paint(self, painter, option, widget=None):
         pass
@@ -326,13 +372,12 @@ class PathHelixGroup(QGraphicsObject):
         """Given the helix number, return a reference to the PathHelix."""
         if self.part() != None:
             vh = self.part().getVirtualHelix(vhref)
-            for ph in self._pathHelixes:
-                if ph.vhelix() == vh:
-                    return ph
+            return self.vhToPathHelix.get(vh)
         return None
 
     def vhelixBasesModified(self, vhelix):
         self.update()
+        self.xoverGroup.helixBasesModified(vhelix)
         ph = self.getPathHelix(vhelix)
         if ph != None:
             self.notifyLoopHandleGroupAfterUpdate(ph)
@@ -66,23 +66,22 @@ class EraseTool(AbstractPathTool):
         posItem = pathHelix.mapFromScene(posScene)
         strandType, idx = self.baseAtPoint(pathHelix, posItem)
         vh = pathHelix.vhelix()
-        vh.undoStack().beginMacro("Erase")
-        rightBreakIdx = leftBreakIdx = idx
-        while leftBreakIdx > 1:
-            if vh.hasCrossoverAt(strandType, leftBreakIdx-1):
-                if vh.hasStrandAt(strandType, idx):
-                    vh.removeXoversAt(strandType, leftBreakIdx-1)
-                break
-            if vh.hasEndAt(strandType, leftBreakIdx-1):
-                break
-            leftBreakIdx -= 1
-        while rightBreakIdx < vh.numBases():
-            if vh.hasCrossoverAt(strandType, rightBreakIdx):
-                if vh.hasStrandAt(strandType, idx):
-                    vh.removeXoversAt(strandType, rightBreakIdx)
-                break
-            if vh.hasEndAt(strandType, rightBreakIdx) and rightBreakIdx != idx:
-                break
-            rightBreakIdx += 1
-        vh.clearStrand(strandType, leftBreakIdx, rightBreakIdx)
-        vh.undoStack().endMacro()
\ No newline at end of file
+        with vh.part().transaction("Erase"):
+            rightBreakIdx = leftBreakIdx = idx
+            while leftBreakIdx > 1:
+                if vh.hasCrossoverAt(strandType, leftBreakIdx-1):
+                    if vh.hasStrandAt(strandType, idx):
+                        vh.removeXoversAt(strandType, leftBreakIdx-1)
+                    break
+                if vh.hasEndAt(strandType, leftBreakIdx-1):
+                    break
+                leftBreakIdx -= 1
+            while rightBreakIdx < vh.numBases():
+                if vh.hasCrossoverAt(strandType, rightBreakIdx):
+                    if vh.hasStrandAt(strandType, idx):
+                        vh.removeXoversAt(strandType, rightBreakIdx)
+                    break
+                if vh.hasEndAt(strandType, rightBreakIdx) and rightBreakIdx != idx:
+                    break
+                rightBreakIdx += 1
+            vh.clearStrand(strandType, leftBreakIdx, rightBreakIdx)
\ No newline at end of file
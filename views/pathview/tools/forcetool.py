@@ -35,6 +35,7 @@ from views import styles
 from views.pathview.pathhelix import PathHelix
 from views.pathview.pathhelixgroup import PathHelixGroup
 from abstractpathtool import AbstractPathTool
+from model.preview import Preview
 
 # from PyQt4.QtCore import QPointF, QRectF, Qt
 # from PyQt4.QtGui import QBrush, QFont
@@ -55,6 +56,10 @@ class ForceTool(AbstractPathTool):
         self.hide()
         self.setZValue(styles.ZPATHTOOL)
         self.base1 = None
+        # Shows the crossover that would be installed while dragging
+        # (separate from SelectTool's preview, see PencilTool)
+        self._xoverPreview = None
+        self._dragPHG = None  # Draws the floating crossover
         self.rightClickOnly = rightClickOnly
         self.setFlag(QGraphicsItem.ItemIsFocusable)
 
@@ -147,24 +152,14 @@ class ForceTool(AbstractPathTool):
         didEnd = False
         if self.base1==None and canStart and destBase:  # Start drag
             self.base1 = destBase
-            vh = destBase[0]
-            vh.setSandboxed(True)
+            self._xoverPreview = Preview(destBase[0].part())
+            self._dragPHG = phg
         elif not self.base1:
             return
         elif not ph or not event or\
              canEnd and not destBase==self.base1 or\
              mustEnd:  # End drag
             didEnd = True
-            vh = self.base1[0]
-            vh.undoStack().undo()
-            vh.setSandboxed(False)
-        else:  # In the middle of a drag
-            vh = self.base1[0]
-            sandboxUndoStack = vh.undoStack()
-            # Ensure sandboxing worked or we get mad popping of the
-            # document undo stack
-            assert(sandboxUndoStack != vh.part().undoStack())
-            sandboxUndoStack.undo()
         
         ### Shared footer
         # Can't connect a base to itself :)
@@ -182,19 +177,24 @@ class ForceTool(AbstractPathTool):
             # If we're hovering over thin air, we draw
             # a floatingXover (only 3' end connected to a
             # segment, 5' end is beneath the mouse)
-            vh, strandType, idx = self.base1
+            self._xoverPreview.clear()
             if didEnd:
-                vh.setFloatingXover(None)
+                self._dragPHG.setFloatingXover(None)
             else:
-                vh.setFloatingXover(strandType, idx, scenePos)
+                self._dragPHG.setFloatingXover(self.base1, scenePos)
         elif phg:
             # We're actually over a potential target base for
             # the 5' end of a force crossover, so we visualize
             # the change that would be committed if the user
-            # clicks
+            # clicks (and commit it if the drag ended here)
             vh1, strand1, idx1 = self.base1
             vh2, strand2, idx2 = destBase
-            vh1.setFloatingXover(None)
-            vh1.installXoverFrom3To5(strand1, idx1, vh2, idx2)
+            self._dragPHG.setFloatingXover(None)
+            self._xoverPreview.show(lambda: vh1.installXoverFrom3To5(strand1,\
+                                                            idx1, vh2, idx2))
+            if didEnd:
+                self._xoverPreview.commit()
         if didEnd:
             self.base1 = None
+            self._xoverPreview = None
+            self._dragPHG = None
@@ -28,6 +28,7 @@ Created by Nick Conway on 2011-05-30.
 """
 
 from abstractpathtool import AbstractPathTool
+from model.preview import Preview
 import util, os
 from cadnano import ignoreEnv
 
@@ -51,6 +52,7 @@ class SelectTool(AbstractPathTool):
         self._mouseDownBase = None
         self._mouseDownPH = None
         self._lastValidBase = None
+        self._preview = None
 
     NoOperation = 0
     ConnectStrand = 1
@@ -149,22 +151,23 @@ class SelectTool(AbstractPathTool):
         if not self._mouseDownBase:
             return
         vh = ph.vhelix()
-        vh.setSandboxed(True)
+        # The drag is shown live and only becomes an edit (one entry
+        # on the undo stack) when the mouse is released
+        self._preview = Preview(vh.part())
         self._lastValidBase = self._mouseDownBase
-        self.applyTool(vh, self._mouseDownBase, self._mouseDownBase)
+        self.previewTool(vh, self._mouseDownBase, self._mouseDownBase)
         ph.makeSelfActiveHelix()
 
     def finalizeMouseDrag(self):
         if self._mouseDownBase == None:
             return
         vh = self._mouseDownPH.vhelix()
-        vh.undoStack().undo()
-        vh.setSandboxed(False)
-        self.applyTool(vh, self._mouseDownBase, self._lastValidBase)
+        self._preview.commit()
         vh.palette().shuffle()
         self._mouseDownBase = None
         self._lastValidBase = None
         self._mouseDownPH = None
+        self._preview = None
 
     def mouseMovePathHelix(self, ph, event):
         if self._mouseDownBase == None:
@@ -176,8 +179,7 @@ class SelectTool(AbstractPathTool):
         if self._mouseDownBase and newBase:
             if self._lastValidBase != newBase:
                 self._lastValidBase = newBase
-                vh.undoStack().undo()
-                self.applyTool(vh, self._mouseDownBase, newBase)
+                self.previewTool(vh, self._mouseDownBase, newBase)
 
     def mouseReleasePathHelix(self, ph, event):
         self.finalizeMouseDrag()
@@ -198,22 +200,11 @@ class SelectTool(AbstractPathTool):
         maxBase = vh.numBases()-1
         if not self.limitEndptDragging:
             return (0, maxBase)
-        l, r = startIdx, startIdx
-        while l > 0:
-            proposedBaseHasLNeighbor = vh.hasNeighborL(strandType, l-1)
-            proposedBaseHasRNeighbor = vh.hasNeighborR(strandType, l-1)
-            if proposedBaseHasRNeighbor == proposedBaseHasLNeighbor:
-                l = l - 1
-            else:
-                break
-        maxBase = vh.numBases()-1
-        while r < maxBase:
-            proposedBaseHasLNeighbor = vh.hasNeighborL(strandType, r+1)
-            proposedBaseHasRNeighbor = vh.hasNeighborR(strandType, r+1)
-            if proposedBaseHasRNeighbor == proposedBaseHasLNeighbor:
-                r = r + 1
-            else:
-                break
+        # Drags stop short of the nearest end on either side
+        l = vh.nearestEndIndex(strandType, startIdx, -1)
+        l = 0 if l == None else l + 1
+        r = vh.nearestEndIndex(strandType, startIdx, 1)
+        r = maxBase if r == None else r - 1
         return (l, r)
 
     # Why add the layer of indirection between operationForDragging...
@@ -292,6 +283,11 @@ class SelectTool(AbstractPathTool):
             assert(False)
         assert(False)
 
+    def previewTool(self, vHelix, fr, to):
+        """Shows what applyTool(vHelix, fr, to) would do in the drag's
+        preview"""
+        self._preview.show(lambda: self.applyTool(vHelix, fr, to))
+
     def applyTool(self, vHelix, fr, to):
         """
         fr (from) and to take the format of (strandType, base)
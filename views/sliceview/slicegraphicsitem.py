@@ -75,10 +75,6 @@ class SliceGraphicsItem(QGraphicsItem):
         self._nrows, self._ncols = 0, 0
         self._rect = QRectF(0, 0, 0, 0)
         self.setPart(part)
-
-        # Cache of VHs that were active as of last call to activeSliceChanged
-        # If None, all slices will be redrawn and the cache will be filled.
-        self._previouslyActiveVHs = None
         # Connect destructor. This is for removing a part from scenes.
         self._part.partRemoved.connect(self.destroy)
     # end def
@@ -163,12 +159,14 @@ class SliceGraphicsItem(QGraphicsItem):
             self._part.selectionWillChange.disconnect(self.selectionWillChange)
             self._part.activeSliceWillChange.disconnect(self.activeSliceChanged)
             self._part.virtualHelixAtCoordsChanged.disconnect(self.vhAtCoordsChanged)
+            self._part.virtualHelicesAtCoordsChanged.disconnect(self.vhsAtCoordsChanged)
         if newPart != None:
             self._setDimensions(newPart.dimensions())
             newPart.dimensionsWillChange.connect(self._setDimensions)
             newPart.selectionWillChange.connect(self.selectionWillChange)
             newPart.activeSliceWillChange.connect(self.activeSliceChanged)
             newPart.virtualHelixAtCoordsChanged.connect(self.vhAtCoordsChanged)
+            newPart.virtualHelicesAtCoordsChanged.connect(self.vhsAtCoordsChanged)
         self._part = newPart
 
     def getSliceHelixByCoord(self, row, column):
@@ -186,26 +184,22 @@ class SliceGraphicsItem(QGraphicsItem):
             sh.setSelected(sh.virtualHelix() in newSel)
 
     def activeSliceChanged(self, newActiveSliceZIndex):
-        newlyActiveVHs = set()
+        # Sent before the part's activeSlice changes. Only the helices
+        # that have a scaffold base at one of the old and new slices but
+        # not the other change appearance.
         part = self.part()
-        activeSlice = part.activeSlice()
-        if self._previouslyActiveVHs:
-            for vh in part.getVirtualHelices():
-                isActiveNow = vh.hasBaseAt(StrandType.Scaffold, activeSlice)
-                if isActiveNow != (vh in self._previouslyActiveVHs):
-                    self._helixhash[vh.coords()].update()
-                if isActiveNow:
-                    newlyActiveVHs.add(vh)
-        else:
-            for vh in part.getVirtualHelices():
-                isActiveNow = vh.hasBaseAt(StrandType.Scaffold, activeSlice)
-                if isActiveNow:
-                    newlyActiveVHs.add(vh)
-            self.update()
+        for vh in part.helicesChangedBetweenSlices(StrandType.Scaffold,\
+                                                   part.activeSlice(),\
+                                                   newActiveSliceZIndex):
+            self._helixhash[vh.coord()].update()
 
     def vhAtCoordsChanged(self, row, col):
         self._helixhash[(row, col)].update()
 
+    def vhsAtCoordsChanged(self, coordsList):
+        for coord in coordsList:
+            self._helixhash[tuple(coord)].update()
+
     class Deselector(QGraphicsItem):
         """The deselector lives behind all the slices and observes mouse press
         events that miss slices, emptying the selection when they do"""
@@ -59,6 +59,8 @@ PATHHELIXHANDLE_STROKE_WIDTH = 2
 PATH_BASE_WIDTH = 20  # used to size bases (grid squares, handles, etc)
 PATH_HELIX_HEIGHT = 2 * PATH_BASE_WIDTH  # staple + scaffold
 PATH_HELIX_PADDING = 50 # gap between PathHelix objects in path view
+PATH_LOD_FAR_BASE_WIDTH = 4  # on-screen px per base below which bars stand in for strands
+PATH_LOD_NEAR_BASE_WIDTH = 12  # on-screen px per base below which text is left out
 PATH_GRID_STROKE_WIDTH = 0.5
 SLICE_HANDLE_STROKE_WIDTH = 1
 PATH_STRAND_STROKE_WIDTH = 2